@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for satTracker's hot paths.
+
+Every run uses the same synthetic TLE fixtures, a frozen tracking time and a
+throwaway data directory, so no network access is needed and runs on the same
+machine are comparable. Results are written as JSON; pass an earlier result
+file with --compare to fail on regressions.
+
+The cold start benchmarks also fail the run if a one-shot command takes more
+than COLD_START_BUDGET beyond the ephem import.
+
+Usage:
+    ./benchmark.py [--output results.json] [--compare baseline.json]
+                   [--threshold 0.2] [--only name,...]
+"""
+
+#######################################
+## Import modules
+#######################################
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import sattrack as st
+from tests.fixtures import FROZEN_TIME, install_fixtures
+
+## Global 'constants'
+CATALOG_SIZE = 10000
+MIN_TIME = 0.2 # seconds spent on each benchmark, at least
+REPEATS = 5
+COLD_START_BUDGET = 0.1 # seconds a one-shot command may add to importing ephem
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'satTracker.py')
+
+#######################################
+## Benchmarks
+#######################################
+
+def bench_set_satellite_exact():
+    st.set_satellite(st.ISS_FULL_NAME, st.ISS_NICKNAME)
+
+def bench_set_satellite_prefix():
+    st.set_satellite('ISS', st.ISS_NICKNAME)
+
+def bench_all_stations():
+    st.all_stations()
+
+def bench_update_sat_tick():
+    """The work the background thread does when an event wakes it up"""
+    st.sync_time()
+    st.sat.compute(st.grnd.observer)
+    st.grnd.in_pass(st.grnd.next_pass(st.sat))
+
+def bench_next_pass_cached():
+    st.grnd.next_pass(st.sat)
+
+def bench_next_pass_search():
+    st.get_pass_cache().invalidate()
+    st.grnd.next_pass(st.sat)
+
+def bench_output_sat():
+    with contextlib.redirect_stdout(io.StringIO()):
+        st.output_sat()
+
+def bench_catalog_build():
+    st.build_catalog()
+
+def bench_catalog_lookup():
+    cat = st.get_catalog()
+    for name in ('OBJECT 04242', 'OBJECT 0999', '39999', 'NO SUCH THING'):
+        idx = cat.find(name)
+        if idx is not None:
+            cat.tle(idx)
+
+def bench_catalog_browse():
+    """Builds the bodies of 1000 satellites through the catalog's cache"""
+    cat = st.get_catalog()
+    for idx in range(0, len(cat), len(cat) // 1000):
+        cat.body(idx)
+
+def bench_batch_observe():
+    batch = catalog_batch()
+    batch.observe(st.grnd.observer, FROZEN_TIME)
+
+def bench_archive_nearest():
+    """Finds the element set nearest the tracked time for 100 satellites"""
+    archive = st.get_archive()
+    jd = st.julian_date(FROZEN_TIME)
+    for norad in range(0, 10000, 100):
+        archive.nearest(norad, jd)
+
+def bench_conjunctions():
+    """Screens the whole catalog against the ISS for an hour"""
+    screen = st.ConjunctionScreen(catalog_batch())
+    screen.screen(st.ephem.Date(FROZEN_TIME), 1 / 24.0, primary=0)
+
+pass_cache = dict()
+def pass_ephemeris():
+    """Fits the ISS's next pass, the first time it is asked for"""
+    if 'ephemeris' not in pass_cache:
+        window = st.grnd.next_pass(st.sat)
+        pass_cache['ephemeris'] = st.PassEphemeris(
+            st.ephem.readtle(*st.get_catalog().tle(0)), st.grnd.observer,
+            window[0], window[4])
+    return pass_cache['ephemeris']
+
+def bench_pass_ephemeris_fit():
+    """Fits a Chebyshev ephemeris to the ISS's next pass"""
+    window = st.grnd.next_pass(st.sat)
+    st.PassEphemeris(st.ephem.readtle(*st.get_catalog().tle(0)),
+                     st.grnd.observer, window[0], window[4])
+
+def bench_pass_ephemeris_stream():
+    """One second of 50 Hz pointing and Doppler from a fitted pass"""
+    eph = pass_ephemeris()
+    eph.block([eph.start + k * 0.02 * st.ephem.second for k in range(50)])
+
+def bench_is_night():
+    st.is_night(st.grnd.next_pass(st.sat))
+
+def catalog_passes(count=1000):
+    """Finds the next pass of the first count satellites once per catalog"""
+    cat = st.get_catalog()
+    key = (st.TLE_FILE, count)
+    if key not in pass_cache:
+        tles = list()
+        windows = list()
+        observer = st.grnd.observer.copy()
+        for idx in range(len(cat)):
+            tle = cat.tle(idx)
+            observer.date = FROZEN_TIME
+            try:
+                window = observer.next_pass(st.ephem.readtle(*tle))
+            except ValueError:
+                continue
+            if window[0] is None or window[4] is None:
+                continue
+            tles.append(tle)
+            windows.append(window)
+            if len(tles) == count:
+                break
+        pass_cache[key] = (tles, windows)
+    return pass_cache[key]
+
+def bench_pass_visibility():
+    """Classifies 1000 passes as night or day and by satellite sunlight"""
+    tles, windows = catalog_passes()
+    st.get_daylight().visibility(tles, windows, st.grnd.observer)
+
+def bench_pass_scan():
+    """Finds a day of passes of 1000 satellites in one batched search"""
+    batch = catalog_batch().subset(list(range(1000)))
+    observer = st.grnd.observer
+    grid = st.GroundGrid([st.grnd.latitude()], [st.grnd.longitude()],
+                         [st.grnd.elevation()], float(observer.horizon))
+    grid.batch_passes(batch, st.ephem.Date(FROZEN_TIME), 1.0, st.REPLAY_STEP)
+
+def bench_export():
+    """Exports 10 minutes of tracks of 1000 satellites at 10 s steps"""
+    out_dir = os.path.join(st.DATA_DIR, 'export')
+    os.makedirs(out_dir, exist_ok=True)
+    batch = catalog_batch().subset(list(range(1000)))
+    st.export_tracks(batch, st.ephem.Date(FROZEN_TIME), 600 / 86400.0,
+                     st.EXPORT_STEP, out_dir)
+
+telemetry_cache = dict()
+def telemetry_log():
+    """Fills a telemetry log with a day of samples a second, once"""
+    if 'log' not in telemetry_cache:
+        log = st.get_telemetry()
+        start = FROZEN_TIME.timestamp() - 86400
+        for k in range(86400):
+            log.append(start + k, 25544, (51.6 * math.sin(k / 900.0),
+                                          k % 360 - 180.0, 420.0,
+                                          k % 360, k % 90, 1000.0 + k % 900))
+        telemetry_cache['log'] = log
+        telemetry_cache['next'] = FROZEN_TIME.timestamp()
+    return telemetry_cache['log']
+
+def bench_telemetry_append():
+    log = telemetry_log()
+    telemetry_cache['next'] = telemetry_cache['next'] + 1
+    log.append(telemetry_cache['next'], 25544, (0.0, 0.0, 420.0, 0.0, 0.0,
+                                                1000.0))
+
+def bench_telemetry_query():
+    """Reads back 6 hours of samples a second from the telemetry log"""
+    end = FROZEN_TIME.timestamp()
+    telemetry_log().query(end - 6 * 3600, end, 25544)
+
+state_cache = dict()
+def state_table():
+    """
+    Builds a state table of the whole catalog once per catalog, with the
+    values one publish of every satellite would write
+    """
+    key = st.TLE_FILE
+    if key not in state_cache:
+        batch = catalog_batch()
+        table = st.StateTable(st.STATE_FILE, [
+            (st.norad_number(tle[1][2:7]), tle[0]) for tle in batch.tles])
+        state = batch.observe(st.grnd.observer, FROZEN_TIME)
+        now = FROZEN_TIME.timestamp()
+        columns = [st.np.full(len(batch), now), st.np.full(len(batch), now)]
+        columns += [st.np.degrees(state[k])
+                    for k in ('sublat', 'sublong', 'az', 'alt')]
+        columns += [state['range'] / 1000.0, st.np.full(len(batch), now),
+                    st.np.full(len(batch), now + 600)]
+        table.write_many(0, columns)
+        state_cache[key] = (table, columns, st.StateReader(st.STATE_FILE))
+    return state_cache[key]
+
+def bench_state_write():
+    """Publishes every satellite's state into a shared state table"""
+    table, columns, _reader = state_table()
+    table.write_many(0, columns)
+
+def bench_state_read():
+    """Reads one satellite's consistent state from a state table"""
+    _table, _columns, reader = state_table()
+    reader.read(st.ISS_FULL_NAME)
+
+def run_command(*args):
+    """
+    Runs satTracker.py in a fresh interpreter against the fixture data
+    directory, which is ~/.satTracker of a throwaway home directory. The
+    bytecode cache is written even if the environment turns it off, as an
+    ordinary install has it after the first run.
+    """
+    env = dict(os.environ, HOME=os.path.dirname(st.DATA_DIR))
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    subprocess.run([sys.executable] + list(args), env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+def bench_cold_start_ephem():
+    """The floor for every cold start: the interpreter plus pyephem"""
+    run_command('-c', 'import ephem')
+
+def bench_cold_start_now():
+    run_command(LAUNCHER, 'now', st.ISS_NICKNAME, '--time',
+                FROZEN_TIME.strftime('%Y/%m/%d %H:%M'))
+
+def bench_cold_start_list():
+    run_command(LAUNCHER, 'list', st.ISS_NICKNAME)
+
+batch_cache = dict()
+def catalog_batch():
+    """Builds the whole-catalog SatelliteBatch once per catalog"""
+    cat = st.get_catalog()
+    key = (st.TLE_FILE, len(cat))
+    if key not in batch_cache:
+        batch_cache[key] = st.SatelliteBatch(
+            [cat.tle(idx) for idx in range(len(cat))])
+    return batch_cache[key]
+
+# (name, function, catalog size)
+BENCHMARKS = [
+    ('set_satellite_exact', bench_set_satellite_exact, 'small'),
+    ('set_satellite_prefix', bench_set_satellite_prefix, 'small'),
+    ('all_stations', bench_all_stations, 'small'),
+    ('update_sat_tick', bench_update_sat_tick, 'small'),
+    ('next_pass_cached', bench_next_pass_cached, 'small'),
+    ('next_pass_search', bench_next_pass_search, 'small'),
+    ('output_sat', bench_output_sat, 'small'),
+    ('is_night', bench_is_night, 'small'),
+    ('pass_ephemeris_fit', bench_pass_ephemeris_fit, 'small'),
+    ('pass_ephemeris_stream', bench_pass_ephemeris_stream, 'small'),
+    ('cold_start_ephem', bench_cold_start_ephem, 'small'),
+    ('cold_start_now', bench_cold_start_now, 'small'),
+    ('cold_start_list', bench_cold_start_list, 'small'),
+    ('state_table_read', bench_state_read, 'small'),
+    ('telemetry_append', bench_telemetry_append, 'small'),
+    ('telemetry_query_6h', bench_telemetry_query, 'small'),
+    ('catalog_10k_build', bench_catalog_build, 'large'),
+    ('catalog_10k_lookup', bench_catalog_lookup, 'large'),
+    ('catalog_10k_browse', bench_catalog_browse, 'large'),
+    ('catalog_10k_all_stations', bench_all_stations, 'large'),
+    ('catalog_10k_set_satellite', bench_set_satellite_prefix, 'large'),
+    ('catalog_10k_batch_observe', bench_batch_observe, 'large'),
+    ('catalog_10k_pass_visibility', bench_pass_visibility, 'large'),
+    ('catalog_10k_archive_nearest', bench_archive_nearest, 'large'),
+    ('catalog_10k_conjunctions', bench_conjunctions, 'large'),
+    ('catalog_10k_pass_scan', bench_pass_scan, 'large'),
+    ('catalog_10k_state_write', bench_state_write, 'large'),
+    ('catalog_10k_state_read', bench_state_read, 'large'),
+    ('catalog_10k_export', bench_export, 'large'),
+    ('catalog_10k_cold_start_now', bench_cold_start_now, 'large'),
+    ('catalog_10k_cold_start_list', bench_cold_start_list, 'large'),
+]
+
+#######################################
+## Functions
+#######################################
+
+def measure(func):
+    """
+    Times func, calibrating the loop count so each repeat takes about
+    MIN_TIME / REPEATS. Returns seconds per call for every repeat.
+    """
+    func() # warm up caches, e.g. the catalog index
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _k in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME / REPEATS:
+            break
+        loops = loops * 2
+    timings = [elapsed / loops]
+    for _k in range(REPEATS - 1):
+        start = time.perf_counter()
+        for _k in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops)
+    return timings, loops
+
+def catalog_memory():
+    """
+    Returns the bytes per satellite held by a freshly built catalog, and the
+    growth after building a body for every one of them
+    """
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        cat = st.Catalog.build(st.TLE_FILE)
+        list(cat.bounds())
+        built = tracemalloc.get_traced_memory()[0]
+        for idx in range(len(cat)):
+            cat.body(idx)
+        browsed = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return {'catalog_bytes_per_object': (built - before) / len(cat),
+            'browse_growth_bytes': browsed - built,
+            'bodies_built': len(cat.bodies)}
+
+def pass_cache_bytes(cache):
+    """Returns the bytes held by a pass cache's keys and windows"""
+    total = sys.getsizeof(cache.entries)
+    for key, (start, windows) in cache.entries.items():
+        total = total + sys.getsizeof(key) + sum(map(sys.getsizeof, key))
+        total = total + sys.getsizeof(start) + sys.getsizeof(windows)
+        for window in windows:
+            total = total + sys.getsizeof(window) + sum(
+                map(sys.getsizeof, window))
+    return total
+
+def pass_browse_memory(size=256, browsed=768):
+    """
+    Returns the bytes a pass cache of size entries holds once full, and
+    after looking up the next pass of browsed satellites spread over the
+    catalog, which should be about the same: only the mix of windows kept
+    differs. The cache is sized directly, as
+    tracemalloc would also count what pyephem's next_pass() itself leaks
+    (a few hundred bytes a search in 4.2).
+    """
+    cat = st.get_catalog()
+    saved = st.pass_cache
+    st.pass_cache = st.PassCache(size=size)
+    rows = range(0, len(cat), len(cat) // browsed)
+    try:
+        for count, idx in enumerate(rows):
+            if count == size:
+                full = pass_cache_bytes(st.pass_cache)
+            try:
+                st.grnd.next_pass(cat.body(idx))
+            except ValueError:
+                pass # never passes
+        done = pass_cache_bytes(st.pass_cache)
+    finally:
+        st.pass_cache = saved
+    return {'pass_cache_full_bytes': full, 'pass_cache_browsed_bytes': done,
+            'pass_cache_entries': size, 'pass_browse_satellites': len(rows)}
+
+def run(only=None):
+    """Runs the benchmarks and returns the result document"""
+    results = dict()
+    memory = None
+    work_dir = tempfile.mkdtemp(prefix='satTracker-bench-')
+    try:
+        for size_name, size in (('small', 30), ('large', CATALOG_SIZE)):
+            todo = [k for k in BENCHMARKS if k[2] == size_name and
+                    (only is None or k[0] in only)]
+            if not todo:
+                continue
+            install_fixtures(os.path.join(work_dir, size_name, '.satTracker'),
+                             size)
+            for name, func, _size in todo:
+                if (name.endswith(('batch_observe', 'conjunctions',
+                                    'ephemeris_stream', 'pass_scan',
+                                    'state_write', 'state_read',
+                                    'state_table_read', 'export',
+                                    'telemetry_append',
+                                    'telemetry_query_6h')) and
+                        st.load_numpy() is None):
+                    continue
+                timings, loops = measure(func)
+                results[name] = {'median': statistics.median(timings),
+                                 'min': min(timings), 'loops': loops,
+                                 'repeats': REPEATS}
+                print('%-28s %12.1f us' % (name, results[name]['median'] *
+                                           1e6))
+            if size_name == 'large':
+                memory = catalog_memory()
+                print('%-28s %12.1f B' % ('catalog_10k_bytes_per_object',
+                                          memory['catalog_bytes_per_object']))
+                memory.update(pass_browse_memory())
+                print('%-28s %12d B after %d satellites, %d B when full' %
+                      ('catalog_10k_pass_cache',
+                       memory['pass_cache_browsed_bytes'],
+                       memory['pass_browse_satellites'],
+                       memory['pass_cache_full_bytes']))
+    finally:
+        shutil.rmtree(work_dir)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'ephem': getattr(st.ephem, '__version__', 'unknown'),
+            'numpy': (None if st.load_numpy() is None else
+                      st.np.__version__),
+            'frozen_time': FROZEN_TIME.isoformat(),
+            'catalog_size': CATALOG_SIZE,
+            'date': datetime.datetime.now(datetime.UTC).isoformat(),
+        },
+        'results': results,
+        'memory': memory,
+    }
+
+def compare(current, baseline, threshold):
+    """
+    Prints the change of every benchmark against baseline. Returns the
+    names of those whose median got slower by more than threshold.
+    """
+    regressions = list()
+    for name, result in sorted(current['results'].items()):
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        change = result['median'] / old['median'] - 1.0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = st.COL_RED + '  REGRESSION' + st.COL_NORMAL
+        print('%-28s %+8.1f%%%s' % (name, change * 100, flag))
+    return regressions
+
+def cold_start_overruns(current):
+    """
+    Prints how long each cold start took beyond the ephem import. Returns
+    the names of those over COLD_START_BUDGET.
+    """
+    results = current['results']
+    if 'cold_start_ephem' not in results:
+        return list()
+    floor = results['cold_start_ephem']['median']
+    overruns = list()
+    for name, result in sorted(results.items()):
+        if 'cold_start' not in name or name == 'cold_start_ephem':
+            continue
+        extra = result['median'] - floor
+        flag = ''
+        if extra > COLD_START_BUDGET:
+            overruns.append(name)
+            flag = st.COL_RED + '  OVER BUDGET' + st.COL_NORMAL
+        print('%-28s %+9.1f ms beyond ephem%s' % (name, extra * 1e3, flag))
+    return overruns
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark satTracker's hot paths")
+    parser.add_argument('--output', default=None,
+                        help='write results to this JSON file')
+    parser.add_argument('--compare', default=None,
+                        help='baseline JSON file from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown before failing (default 0.2, '
+                             'i.e. 20%%)')
+    parser.add_argument('--only', default=None,
+                        help='comma separated benchmark names to run')
+    args = parser.parse_args()
+
+    only = None if args.only is None else set(args.only.split(','))
+    current = run(only)
+    if args.output is not None:
+        with open(args.output, 'w') as fname:
+            json.dump(current, fname, indent=2)
+            fname.write('\n')
+    status = 0
+    overruns = cold_start_overruns(current)
+    if overruns:
+        print('%d cold start(s) took more than %d ms beyond the ephem import' %
+              (len(overruns), COLD_START_BUDGET * 1e3))
+        status = 1
+    if args.compare is not None:
+        with open(args.compare, 'r') as fname:
+            baseline = json.load(fname)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print('%d benchmark(s) regressed by more than %d%%' %
+                  (len(regressions), args.threshold * 100))
+            status = 1
+    return status
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+"""
+Load test for `satTracker.py serve`.
+
+Starts a server on the tests' synthetic catalog in a throwaway data
+directory (or targets a running one with --url), then keeps --connections
+keep-alive clients busy for --duration seconds. Each asks for /now, /passes
+or /catalog about one of --satellites satellites, at a tracked time moving
+one second per second from the fixtures' frozen time, as dashboards
+polling the server would. Prints the requests per second, latency
+percentiles, errors and the server's cache hit rate.
+
+Usage:
+    ./loadtest.py [--connections 32] [--processes 2] [--duration 10]
+                  [--satellites 50] [--catalog-size 10000]
+                  [--url http://127.0.0.1:8765] [--output results.json]
+"""
+
+#######################################
+## Import modules
+#######################################
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from tests import fixtures
+
+## Global 'constants'
+START_TIME = int(fixtures.FROZEN_TIME.timestamp())
+# share of requests going to each endpoint
+MIX = [('now', 0.7), ('passes', 0.2), ('catalog', 0.1)]
+SERVER_START_TIMEOUT = 30 # seconds
+
+#######################################
+## Server
+#######################################
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(work_dir, size):
+    """
+    Installs the fixtures under work_dir and starts `satTracker.py serve`
+    with work_dir as its home. Returns (process, port).
+    """
+    fixtures.install_fixtures(os.path.join(work_dir, '.satTracker'), size)
+    port = free_port()
+    env = dict(os.environ, HOME=work_dir)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'satTracker.py')
+    proc = subprocess.Popen([sys.executable, script, 'serve', '--port',
+                             str(port)], env=env, stderr=subprocess.PIPE,
+                            text=True)
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return proc, port
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError('Server exited: %s' % proc.stderr.read())
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError('Server did not start within %d seconds' %
+                       SERVER_START_TIMEOUT)
+
+def stop_server(proc):
+    """Stops the server and returns what it printed"""
+    proc.terminate()
+    try:
+        _out, err = proc.communicate(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        _out, err = proc.communicate()
+    return err
+
+#######################################
+## Clients
+#######################################
+
+def request_path(rand, names, second):
+    """Returns a request path from the MIX"""
+    pick = rand.random()
+    for endpoint, share in MIX:
+        if pick < share:
+            break
+        pick = pick - share
+    if endpoint == 'catalog':
+        query = {'q': rand.choice(names)[:rand.randint(1, 8)], 'limit': 20}
+    else:
+        query = {'sat': rand.choice(names), 'time': second}
+        if endpoint == 'passes':
+            query['count'] = 3
+    return '/%s?%s' % (endpoint, urllib.parse.urlencode(query))
+
+async def fetch(reader, writer, host, path):
+    """Sends one GET on a kept-alive connection. Returns (status, body)."""
+    writer.write(('GET %s HTTP/1.1\r\nHost: %s\r\n\r\n' %
+                  (path, host)).encode('latin-1'))
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    length = 0
+    for line in lines[1:]:
+        name, _sep, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return int(lines[0].split(' ')[1]), await reader.readexactly(length)
+
+async def client(host, port, names, seed, origin, deadline, latencies,
+                 errors):
+    """
+    One keep-alive connection sending requests until deadline, about
+    START_TIME plus the seconds since origin
+    """
+    rand = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            now = time.time()
+            if now >= deadline:
+                break
+            path = request_path(rand, names,
+                                START_TIME + int(now - origin))
+            start = time.perf_counter()
+            status, _body = await fetch(reader, writer, host, path)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+def client_process(host, port, names, connections, seed, origin, deadline):
+    """
+    Runs connections clients in this process. Returns (latencies, errors,
+    start, end), where the load ran from start to end.
+    """
+    latencies = list()
+    errors = list()
+
+    async def run():
+        await asyncio.gather(*[
+            client(host, port, names, seed * 1000 + k, origin, deadline,
+                   latencies, errors) for k in range(connections)])
+    start = time.time()
+    asyncio.run(run())
+    return latencies, errors, start, time.time()
+
+def get_json(host, port, path):
+    import http.client
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        conn.request('GET', path)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+def run(host, port, connections, processes, duration, satellites):
+    """Runs the load and returns the result document"""
+    listing = get_json(host, port, '/catalog?limit=%d' % satellites)
+    names = [k['name'] for k in listing]
+    before = get_json(host, port, '/stats')
+    origin = time.time()
+    # the client processes take a moment to start
+    deadline = origin + 1.0 + duration
+    shares = [connections // processes + (k < connections % processes)
+              for k in range(processes)]
+    jobs = [(host, port, names, share, k, origin, deadline)
+            for k, share in enumerate(shares) if share]
+    with multiprocessing.Pool(len(jobs)) as pool:
+        done = pool.starmap(client_process, jobs)
+    elapsed = max(k[3] for k in done) - min(k[2] for k in done)
+    after = get_json(host, port, '/stats')
+    latencies = sorted(k for lat, _err, _s, _e in done for k in lat)
+    errors = [k for _lat, err, _s, _e in done for k in err]
+    requests = after['requests'] - before['requests']
+    hits = after['cache_hits'] - before['cache_hits']
+
+    def percentile(fraction):
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1,
+                             int(fraction * len(latencies)))]
+    return {
+        'connections': connections, 'processes': len(jobs),
+        'duration': round(elapsed, 2), 'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'errors': len(errors), 'satellites': len(names),
+        'p50_ms': round(percentile(0.5) * 1e3, 3) if latencies else None,
+        'p99_ms': round(percentile(0.99) * 1e3, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1e3, 3) if latencies else None,
+        'server_hit_rate': round(hits / max(1, requests), 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test the satTracker HTTP/JSON server')
+    parser.add_argument('--connections', type=int, default=32,
+                        help='concurrent keep-alive clients (default 32)')
+    parser.add_argument('--processes', type=int, default=2,
+                        help='client processes to spread them over '
+                             '(default 2)')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds of load (default 10)')
+    parser.add_argument('--satellites', type=int, default=50,
+                        help='distinct satellites asked about (default 50)')
+    parser.add_argument('--catalog-size', type=int, default=10000,
+                        help='satellites in the fixture catalog '
+                             '(default 10000)')
+    parser.add_argument('--url', default=None,
+                        help='load a running server instead of starting one '
+                             'on the fixtures; its TLEs must be valid at the '
+                             "fixtures' frozen time")
+    parser.add_argument('--output', default=None,
+                        help='write results to this JSON file')
+    args = parser.parse_args()
+
+    proc = None
+    work_dir = None
+    if args.url is None:
+        work_dir = tempfile.mkdtemp(prefix='satTracker-load-')
+        proc, port = start_server(work_dir, args.catalog_size)
+        host = '127.0.0.1'
+    else:
+        parts = urllib.parse.urlsplit(args.url)
+        host = parts.hostname
+        port = parts.port or 80
+    try:
+        result = run(host, port, args.connections,
+                     max(1, args.processes), args.duration, args.satellites)
+    finally:
+        if proc is not None:
+            err = stop_server(proc)
+            if proc.returncode not in (0, -15):
+                print(err, file=sys.stderr)
+        if work_dir is not None:
+            shutil.rmtree(work_dir)
+    for name, value in result.items():
+        print('%-22s %s' % (name, value))
+    if args.output is not None:
+        with open(args.output, 'w') as fname:
+            json.dump(result, fname, indent=2)
+            fname.write('\n')
+    return 0 if result['errors'] == 0 else 1
+
+if __name__ == '__main__':
+    exit(main())
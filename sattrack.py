@@ -0,0 +1,7140 @@
+#!/usr/bin/env python3
+
+
+#######################################
+## Import modules
+#######################################
+
+import array
+import bisect
+import collections
+import datetime
+import heapq
+import io
+import itertools
+import json
+import math
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+import zlib
+try:
+    import ephem
+except ImportError:
+    print('Error: you must install the ephem python module')
+    print('Install with `pip3 install ephem` or `sudo apt install python3-ephem`')
+    exit(1)
+
+# dbus, numpy, asyncio and the networking and command line modules
+# (urllib.error among them, which pulls in tempfile) are imported on first
+# use, so that one-shot commands start quickly
+
+## Global 'constants'
+REFRESH_TIME = 1 # in seconds
+PASS_CACHE_WINDOWS = 4 # passes predicted per cache fill
+PASS_CACHE_SIZE = 1024 # satellite-observers whose passes are kept
+TLE_MAX_AGE = datetime.timedelta(days=3)
+CRON_PASS_SEARCH = 50 # passes examined when looking for e.g. a night pass
+GRID_STEP = 10 # seconds between samples when finding passes over a grid
+GRID_CHUNK = 360 # samples propagated per array operation
+SCAN_SPAN = 600 # seconds of a batch pass scan ruled out at once per satellite
+SCAN_CHUNK = 20000 # satellite positions per array operation in a batch scan
+EPHEM_DEGREE = 10 # Chebyshev terms per pass ephemeris segment, less one
+EPHEM_SEGMENT = 60 # seconds per pass ephemeris segment, before splitting
+EPHEM_MIN_SEGMENT = 2 # seconds; segments are not split below this
+EPHEM_TOLERANCE = (1e-5, 1.0, 0.01) # radians pointing, m range, m/s rate
+STREAM_RATE = 10 # samples per second streamed during a pass
+SPEED_OF_LIGHT = 299792458.0 # m/s
+OVERHEAD_ALT = 30 # degrees above the horizon for the overhead query
+OVERHEAD_MARGIN = 0.02 # radians (~1°) of slack in the overhead query's cull
+OVERHEAD_STEP = 30 # seconds between samples of the satellites left after it
+OVERHEAD_SLACK = 5 # degrees below the altitude at which a sample is "near"
+CONJ_THRESHOLD = 10 # km; closer approaches are reported as conjunctions
+CONJ_STEP = 20 # seconds between samples when screening for conjunctions
+CONJ_REFINE = 1 # seconds between samples around a candidate conjunction
+CONJ_SHELL_MARGIN = 25 # km the perigee and apogee may drift in a screening
+CONJ_SLACK = 1 # km allowed for the curve in relative motion over a step
+CONJ_CHUNK = 200000 # object positions propagated per array operation
+METRICS_BUCKETS = 28 # power-of-two microsecond buckets, up to ~2 minutes
+SUN_CACHE_DAYS = 64 # observer-days of sunrise and sunset times kept
+BODY_CACHE_SIZE = 256 # pyephem bodies the catalog keeps built
+SUN_HORIZON = '-0:34' # the sun's upper limb on the horizon, unrefracted
+SUNLIT_SAMPLES = 21 # samples per pass when checking a satellite's sunlight
+ARCHIVE_RECORD = 165 # bytes per archived TLE: 24 name + 2*69 lines + 3 newlines
+ARCHIVE_KEY = struct.Struct('<IdQ') # NORAD id, epoch (JD), record number
+CATALOG_MAGIC = b'SATCATLG' # first bytes of a catalog index
+# magic, version, TLE file mtime and size, entries, NORAD and name text bytes
+CATALOG_HEADER = struct.Struct('<8sIdqIII')
+# the catalog's array columns, in the order the index file stores them
+CATALOG_ARRAYS = (('offsets', 'q'), ('name_ends', 'I'), ('sorted_names', 'I'),
+                  ('name_hashes', 'I'), ('name_index', 'I'),
+                  ('norad_hashes', 'I'), ('norad_index', 'I'))
+TLE_URL_FORMAT = 'https://celestrak.org/NORAD/elements/gp.php?GROUP={}&FORMAT=tle'
+TLE_GROUPS = ['stations'] # default when there is no groups file
+TLE_FETCH_WORKERS = 8
+SHUTDOWN_TIMEOUT = 3 # seconds to let notifications and downloads finish
+NOTIFY_QUEUE_SIZE = 1000 # alerts waiting for delivery before some are dropped
+NOTIFY_COALESCE = 0.5 # seconds; alerts this close together are sent as one
+NOTIFY_BATCH = 50 # most alerts coalesced into one notification
+SERVER_PORT = 8765 # default port of `satTracker.py serve`
+SERVER_CACHE_SIZE = 4096 # responses the server keeps
+SERVER_MAX_PASSES = 20 # most passes one /passes request returns
+SERVER_MAX_BODY = 65536 # largest request body read and discarded
+UNIX_EPOCH = 25567.5 # ephem date of 1970/1/1 00:00 UTC
+DASH_RATE = 4 # dashboard frames per second
+TIME_WARP_MAX = 100000 # fastest `time warp`, times real time
+REPLAY_STEP = 30 # seconds between samples of a replay's batched pass search
+REPLAY_LOOKAHEAD = 1 # days of passes found beyond the end of a replay
+STATE_MAGIC = b'SATSTATE' # first bytes of a state table
+STATE_VERSION = 1 # layout version of the state table
+STATE_HEADER = struct.Struct('<8sIIII') # magic, version, retired, slots, slot size
+STATE_OFFSET = 64 # bytes before the first slot of the state table
+STATE_SLOT = 128 # bytes per slot: a STATE_SEQ, a STATE_RECORD and padding
+STATE_SEQ = struct.Struct('<Q') # slot version, odd while it is rewritten
+STATE_RECORD = struct.Struct('<I28s9d') # NORAD id, name, then STATE_FIELDS
+STATE_FIELDS = ('time', 'stamp', 'lat', 'long', 'az', 'alt', 'range', 'aos',
+                'los')
+STATE_RETRIES = 1000 # attempts at a consistent read of a slot
+STATE_INTERVAL = 1 # default seconds between state table updates
+STATE_LOOKAHEAD = 1 # days of tracked satellites' passes found at once
+EXPORT_STEP = 10 # default seconds between exported samples
+EXPORT_CHUNK = 100000 # satellite positions per array operation in an export
+TELEMETRY_MAGIC = b'SATTELEM' # first bytes of a telemetry log
+TELEMETRY_VERSION = 2 # layout version of the telemetry log
+TELEMETRY_HEADER = struct.Struct('<8sII') # magic, version, tiers
+TELEMETRY_OFFSET = 512 # bytes of header before the first column
+# (seconds per sample, days kept) of each tier of the telemetry log
+TELEMETRY_TIERS = [(1, 2), (10, 30), (120, 365)]
+# columns of the telemetry log: unix time, NORAD id, then degrees and km
+TELEMETRY_COLUMNS = [('time', '<f8'), ('norad', '<u4'), ('lat', '<f4'),
+                     ('long', '<f4'), ('height', '<f4'), ('az', '<f4'),
+                     ('alt', '<f4'), ('range', '<f4')]
+# exported arrays: (file name, look angle, scale, unit)
+EXPORT_COLUMNS = [('lat', 'sublat', 180 / math.pi, 'degrees, geocentric'),
+                  ('long', 'sublong', 180 / math.pi, 'degrees east'),
+                  ('height', 'elevation', 0.001, 'km above the ellipsoid'),
+                  ('az', 'az', 180 / math.pi, 'degrees'),
+                  ('alt', 'alt', 180 / math.pi, 'degrees'),
+                  ('range', 'range', 0.001, 'km')]
+HTTP_REASONS = {200: b'OK', 400: b'Bad Request', 404: b'Not Found',
+                405: b'Method Not Allowed'}
+GRND_QUESTIONS = ['Latitude (°N), use (-) for °S: ',
+                  'Longitude (°E), use (-) for °W: ',
+                  'Elevation (meters): ',
+                  'Timezone offset from UTC (+/-): ']
+ISS_FULL_NAME = 'ISS (ZARYA)'
+ISS_NICKNAME = 'ISS'
+
+DATA_DIR = os.path.join(os.path.expanduser('~'), '.satTracker')
+TLE_FILE = os.path.join(DATA_DIR, 'tles.txt')
+GRND_FILE = os.path.join(DATA_DIR, 'grnd.txt')
+CRON_FILE = os.path.join(DATA_DIR, 'cron.txt')
+PASS_LOG_FILE = os.path.join(DATA_DIR, 'passes.log')
+TLE_GROUPS_FILE = os.path.join(DATA_DIR, 'groups.txt')
+TLE_GROUPS_DIR = os.path.join(DATA_DIR, 'groups')
+TLE_META_FILE = os.path.join(DATA_DIR, 'groups.json')
+CURRENT_SAT_FILE = os.path.join(DATA_DIR, 'current.txt')
+CATALOG_FILE = os.path.join(DATA_DIR, 'catalog.idx')
+METRICS_FILE = os.path.join(DATA_DIR, 'metrics.json')
+NOTIFY_FILE = os.path.join(DATA_DIR, 'notify.txt')
+ALERT_LOG_FILE = os.path.join(DATA_DIR, 'alerts.log')
+ARCHIVE_FILE = os.path.join(DATA_DIR, 'archive.tle')
+ARCHIVE_INDEX_FILE = os.path.join(DATA_DIR, 'archive.idx')
+STATE_FILE = os.path.join(DATA_DIR, 'state.bin')
+TELEMETRY_FILE = os.path.join(DATA_DIR, 'telemetry.bin')
+CATALOG_VERSION = 2
+
+## SGP4 (WGS-72) and geodesy (WGS-84) constants
+DEG2RAD = math.pi / 180.0
+SGP4_RADIUS = 6378.135 # km
+SGP4_MU = 398600.8 # km^3/s^2
+SGP4_XKE = 60.0 / math.sqrt(SGP4_RADIUS ** 3 / SGP4_MU)
+SGP4_J2 = 0.001082616
+SGP4_J3OJ2 = -0.00000253881 / SGP4_J2
+SGP4_J4 = -0.00000165597
+EARTH_ROTATION = 7.292115e-5 # rad/s
+WGS84_A = 6378.137 # km
+WGS84_E2 = 0.00669437999014
+REFRACTION_TOLERANCE = 0.1 / 3600 * DEG2RAD # how closely refract() inverts
+
+## Colors
+COL_NORMAL = '\033[0m'
+COL_GREY = '\033[90m'
+COL_RED = '\033[91m'
+COL_GREEN = '\033[92m'
+COL_YELLOW = '\033[93m'
+COL_BLUE = '\033[94m'
+COL_PURPLE = '\033[95m'
+COL_CYAN = '\033[96m'
+COL_WHITE = '\033[97m'
+
+## Global variables
+grnd = None
+sat = None
+displacement = None
+is_frozen = None
+p_time = None
+sim_clock = None
+catalog = None
+tracked = None
+tracked_state = None
+pass_cache = None
+daylight = None
+scheduler = None
+last_pass_notice = None
+crontab = None
+tle_fetcher = None
+archive = None
+sat_span = None
+notifier = None
+state_publisher = None
+telemetry = None
+dbus = None
+dbus_checked = False
+np = None
+np_checked = False
+event_loop = None
+tasks = set()
+stdin_reader = None
+stdin_transport = None
+
+class Histogram(object):
+    """Latency histogram with power-of-two microsecond buckets"""
+    def __init__(self):
+        self.buckets = [0] * METRICS_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), METRICS_BUCKETS - 1)] += 1
+        self.count = self.count + 1
+        self.total = self.total + seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Upper bound, in seconds, of the bucket holding the percentile"""
+        target = fraction * self.count
+        seen = 0
+        for idx, bucket in enumerate(self.buckets):
+            seen = seen + bucket
+            if bucket and seen >= target:
+                return min((1 << idx) / 1e6, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {'count': self.count, 'total': self.total,
+                'mean': self.total / self.count if self.count else 0.0,
+                'p50': self.percentile(0.5), 'p99': self.percentile(0.99),
+                'max': self.max, 'buckets_us': self.buckets}
+
+class Metrics(object):
+    """
+    Timings and counters for the tracker's hot paths. Everything is a no-op
+    until enabled, so the instrumented code pays one attribute check.
+    Usage:
+        start = metrics.start()
+        ...
+        metrics.stop('next_pass', start)
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = dict()
+            self.counters = dict()
+            self.since = time.time()
+
+    def start(self):
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, name, start):
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.add(elapsed)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return {'since': self.since, 'now': time.time(),
+                    'enabled': self.enabled,
+                    'counters': dict(self.counters),
+                    'histograms': dict((name, hist.snapshot()) for name, hist
+                                       in self.histograms.items())}
+
+    def dump(self, path):
+        """Writes a snapshot to path as JSON, atomically"""
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w') as fname:
+            json.dump(self.snapshot(), fname, indent=1)
+        os.replace(tmp_file, path)
+
+# shared by every thread; created here so hot paths needn't check for None
+metrics = Metrics()
+
+class Ground(object):
+    """Wrapper class for the pyephem ground observer object"""
+    def __init__(self, latitude, longitude, elevation, offset=0):
+        self.observer = ephem.Observer()
+        deg180 = 180 * ephem.degree
+        deg90 = 90 * ephem.degree
+        if latitude > deg90 or latitude < -1 * deg90:
+            raise ValueError('Invalid latitude')
+        if longitude > deg180 or longitude < -1 * deg180:
+            raise ValueError('Invalid longitude')
+        if elevation < 0 or elevation > 8848: # height of Mt. Everest
+            raise ValueError('Invalid elevation')
+
+        self.offset = offset
+        self.observer.lat = latitude
+        self.observer.long = longitude
+        self.observer.elev = elevation
+
+    # Accessors
+    def latitude(self):
+        return self.observer.lat
+    def longitude(self):
+        return self.observer.long
+    def elevation(self):
+        return self.observer.elev
+
+    def set_date(self, date):
+        self.observer.date = date
+
+    def next_pass(self, sat):
+        """
+        Returns the pass in progress, or else the next pass, as a next_pass()
+        tuple. Served from the pass cache.
+        """
+        start = metrics.start()
+        try:
+            return get_pass_cache().next_pass(sat, self.observer)
+        finally:
+            metrics.stop('next_pass', start)
+
+    def in_pass(self, pass_tuple):
+        """returns True if the observer's date falls within pass_tuple"""
+        return pass_tuple[0] <= self.observer.date < pass_tuple[4]
+
+    def sunrise_sunset(self, date=None):
+        """
+        Returns the (sunrise, sunset) ephem dates on the UTC day of date
+        (default: the observer's date), from the shared daylight cache
+        """
+        date = self.observer.date if date is None else date
+        return get_daylight().sunrise_sunset(self.observer, date)
+
+    def is_dark(self, date=None):
+        """returns True if the sun is down at date (default: now)"""
+        date = self.observer.date if date is None else date
+        return get_daylight().is_dark(self.observer, date)
+
+class PassCache(object):
+    """
+    Cache of upcoming pass windows, keyed by satellite, observer and TLE
+    epoch. Windows have the same shape as pyephem's next_pass() tuple:
+    (rise_time, rise_az, max_time, max_alt, set_time, set_az). A pass that
+    is already in progress when the cache is filled has its rise time
+    clipped to the fill time. The most recently used size entries are kept.
+    The lock guards only the dict; searches run outside it, so a fill for
+    one satellite never holds up lookups of another.
+    """
+    def __init__(self, windows=PASS_CACHE_WINDOWS, size=PASS_CACHE_SIZE):
+        self.windows = windows
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        # counts invalidations, so users can tell when to plan again
+        self.generation = 0
+
+    @staticmethod
+    def key(sat, observer):
+        return (sat.catalog_number, float(sat.epoch),
+                float(observer.lat), float(observer.long),
+                float(observer.elev), float(observer.horizon))
+
+    def invalidate(self):
+        """Forgets every cached window"""
+        with self.lock:
+            self.entries.clear()
+            self.generation = self.generation + 1
+
+    def seed(self, sat, observer, start, windows):
+        """
+        Stores windows found by other means, e.g. a batched search (see
+        prefill_passes()), as if the cache had been filled at ephem date
+        start. With no windows, the satellite is taken never to pass.
+        """
+        self.store(self.key(sat, observer), (ephem.Date(start),
+                                             list(windows)))
+
+    def store(self, key, entry):
+        """Keeps entry for key, forgetting the least recently used"""
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def _fill(self, sat, observer, when):
+        """
+        Runs the pass search for the next few windows starting at when. The
+        search moves sat around, so it is recomputed for the observer's own
+        date afterwards.
+        """
+        metrics.count('pass_cache.fill')
+        obs = observer.copy()
+        obs.date = when
+        windows = list()
+        try:
+            sat.compute(obs)
+            if sat.alt > obs.horizon:
+                # already in a pass; pyephem would skip to the next one
+                _rise, _raz, max_time, max_alt, set_time, set_az = \
+                    obs.next_pass(sat, singlepass=False)
+                if set_time is None:
+                    # never sets, e.g. a geostationary satellite
+                    return (ephem.Date(when), windows)
+                if set_time > when:
+                    windows.append((ephem.Date(when), sat.az, max_time,
+                                    max_alt, set_time, set_az))
+                    obs.date = set_time + ephem.second
+                # else pyephem lost the pass in progress, as it can for slow
+                # orbits; start from the next one
+            while len(windows) < self.windows:
+                window = obs.next_pass(sat)
+                if window[0] is None or window[4] is None:
+                    break
+                windows.append(window)
+                obs.date = window[4] + ephem.second
+        finally:
+            sat.compute(observer)
+        return (ephem.Date(when), windows)
+
+    def next_pass(self, sat, observer, when=None):
+        """
+        Returns the window of the pass in progress at when (default: the
+        observer's date), or of the next one. Lookups further ahead than the
+        cached windows extend them rather than starting over, so the tracker
+        and scheduled jobs can share an entry.
+        @throws ValueError if the satellite never passes
+        """
+        when = ephem.Date(observer.date if when is None else when)
+        key = self.key(sat, observer)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None or when < entry[0]:
+            # May throw ValueError if the satellite never rises or sets
+            entry = self._fill(sat, observer, when)
+            if not entry[1]:
+                raise ValueError('Satellite never passes')
+            self.store(key, entry)
+        start, windows = entry
+        if not windows:
+            # seeded by a search that found no pass
+            raise ValueError('Satellite never passes')
+        for window in windows:
+            if window[4] > when:
+                return window
+        more = self._fill(sat, observer,
+                          ephem.Date(max(when, windows[-1][4] +
+                                         ephem.second)))[1]
+        if not more:
+            raise ValueError('Satellite never passes')
+        # forget the windows over by the observer's date, but not those
+        # other lookups (e.g. another job) may still be behind this one on
+        dropped = bisect.bisect_right(windows, min(when, observer.date),
+                                      key=lambda k: k[4])
+        if dropped:
+            start = ephem.Date(windows[dropped - 1][4])
+        windows = windows[dropped:] + more
+        self.store(key, (start, windows))
+        for window in windows:
+            if window[4] > when:
+                return window
+        raise ValueError('Satellite never passes')
+
+class Daylight(object):
+    """
+    Day and night at a ground station, and sunlight on satellites. Sunrise
+    and sunset are memoized per observer and UTC day, keeping the most
+    recently used SUN_CACHE_DAYS of them, so classifying a pass is a binary
+    search. A satellite is sunlit outside the cylinder of Earth's shadow.
+    """
+    def __init__(self, size=SUN_CACHE_DAYS):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.sun_cache = dict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(observer, day):
+        return (float(observer.lat), float(observer.long),
+                float(observer.elev), day)
+
+    @staticmethod
+    def _fill(observer, day):
+        """
+        Returns (dark, events) for the UTC day starting at day: whether the
+        sun is down at its start, and the times the sun rises or sets during
+        it in order
+        """
+        metrics.count('daylight.fill')
+        obs = ephem.Observer()
+        obs.lat = observer.lat
+        obs.long = observer.long
+        obs.elev = observer.elev
+        obs.pressure = 0
+        obs.horizon = SUN_HORIZON
+        obs.date = day
+        sun = ephem.Sun(obs)
+        dark = sun.alt + sun.radius < obs.horizon
+        events = list()
+        for search in (obs.next_rising, obs.next_setting):
+            try:
+                when = search(sun)
+            except (ephem.AlwaysUpError, ephem.NeverUpError):
+                continue # polar day or night
+            if when < day + 1:
+                events.append(float(when))
+        events.sort()
+        return (dark, events)
+
+    def events(self, observer, date):
+        """
+        Returns (day, dark, events) for the UTC day holding date, as _fill()
+        """
+        # ephem dates count days from noon, so UTC days start at x.5
+        day = math.floor(date + 0.5) - 0.5
+        key = self.key(observer, day)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+        entry = (day,) + self._fill(observer, day)
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def is_dark(self, observer, date):
+        """returns True if the sun is down at the observer at date"""
+        _day, dark, events = self.events(observer, date)
+        flips = bisect.bisect_right(events, float(date))
+        return dark != (flips % 2 == 1)
+
+    def sunrise_sunset(self, observer, date):
+        """
+        Returns the (sunrise, sunset) ephem dates on the UTC day of date;
+        either is None if the sun does not rise or set that day
+        """
+        _day, dark, events = self.events(observer, date)
+        rise = None
+        sunset = None
+        for when in events:
+            if dark:
+                rise = ephem.Date(when)
+            else:
+                sunset = ephem.Date(when)
+            dark = not dark
+        return (rise, sunset)
+
+    def sun_direction(self, date):
+        """
+        Returns the unit vector towards the sun, in TEME, at date. The sun
+        moves about 0.01 degrees in the quarter hour each value is kept for.
+        """
+        key = int(date * 96)
+        ret = self.sun_cache.get(key)
+        if ret is None:
+            sun = ephem.Sun(ephem.Date((key + 0.5) / 96))
+            cos_dec = math.cos(sun.g_dec)
+            ret = (cos_dec * math.cos(sun.g_ra),
+                   cos_dec * math.sin(sun.g_ra), math.sin(sun.g_dec))
+            if len(self.sun_cache) >= self.size * 96:
+                self.sun_cache.clear()
+            self.sun_cache[key] = ret
+        return ret
+
+    @staticmethod
+    def sample_times(window, samples=SUNLIT_SAMPLES):
+        """Returns samples ephem dates spread evenly from rise to set"""
+        step = (window[4] - window[0]) / max(samples - 1, 1)
+        return [window[0] + k * step for k in range(samples)]
+
+    def sunlit_fraction(self, body, window, samples=SUNLIT_SAMPLES):
+        """
+        Returns the fraction of the pass window body spends in sunlight,
+        computing the pyephem body once per sample. Moves body.
+        """
+        lit = 0
+        for date in self.sample_times(window, samples):
+            body.compute(ephem.Date(date))
+            if not body.eclipsed:
+                lit = lit + 1
+        return lit / float(samples)
+
+    def visibility(self, tles, windows, observer, samples=SUNLIT_SAMPLES):
+        """
+        Classifies many passes at once: windows[i] is a next_pass() tuple
+        for the element set tles[i]. Returns a list of (night, sunlit)
+        pairs, night if the ground is dark when the pass starts and sunlit
+        the fraction of the pass the satellite is in sunlight. Near-earth
+        orbits are propagated together with NumPy; others use pyephem.
+        """
+        night = [self.is_dark(observer, window[0]) for window in windows]
+        sunlit = [None] * len(windows)
+        if windows and load_numpy() is not None:
+            batch = SatelliteBatch(tles)
+            times = np.array([self.sample_times(window, samples)
+                              for window in windows]).T
+            sun = np.array([self.sun_direction((window[0] + window[4]) / 2)
+                            for window in windows])
+            with np.errstate(all='ignore'):
+                pos, _vel = batch.propagate(times + 2415020.0)
+                along = (pos * sun).sum(axis=-1)
+                across = (pos * pos).sum(axis=-1) - along * along
+                lit = (along > 0) | (across > WGS84_A * WGS84_A)
+            fraction = lit.mean(axis=0)
+            for idx in np.flatnonzero(~batch.deep):
+                if not np.isnan(pos[:, idx]).any():
+                    sunlit[idx] = float(fraction[idx])
+        for idx, window in enumerate(windows):
+            if sunlit[idx] is None:
+                try:
+                    sunlit[idx] = self.sunlit_fraction(ephem.readtle(
+                        *tles[idx]), window, samples)
+                except ValueError:
+                    sunlit[idx] = 0.0 # too far from the element set's epoch
+        return list(zip(night, sunlit))
+
+class PassEphemeris(object):
+    """
+    Chebyshev fit of one satellite's pass over an observer: azimuth,
+    altitude, range and range rate as functions of time, plus their
+    rates. The pass is split into segments, each fitted from pyephem at
+    Chebyshev nodes and then checked against pyephem at points between the
+    nodes. A segment that misses EPHEM_TOLERANCE is halved until it
+    doesn't (or reaches EPHEM_MIN_SEGMENT). self.error bounds the
+    difference from pyephem over the whole pass: the worst of the checks
+    or of the series' dropped tail, plus pyephem's own single-precision
+    rounding, as (pointing radians, range m, range rate m/s).
+    Fitting moves body (pyephem's copy() of a satellite isn't safe to free,
+    so pass one that may move); evaluating the fit doesn't touch it, so any
+    number of threads can share it.
+    """
+    def __init__(self, body, observer, start, end, degree=EPHEM_DEGREE,
+                 segment=EPHEM_SEGMENT):
+        begin = time.perf_counter()
+        self.name = body.name
+        self.start = ephem.Date(start)
+        self.end = ephem.Date(end)
+        self.degree = degree
+        self.body = body
+        self.observer = observer.copy()
+        self.samples = 0
+        self.error = [0.0, 0.0, 0.0]
+        count = degree + 1
+        self.nodes = [math.cos(math.pi * (k + 0.5) / count)
+                      for k in range(count)]
+        self.basis = [[math.cos(math.pi * j * (k + 0.5) / count)
+                       for k in range(count)] for j in range(count)]
+        self.segments = list()
+        span = segment * ephem.second
+        pieces = max(1, int(math.ceil((self.end - self.start) / span)))
+        span = (self.end - self.start) / pieces
+        for piece in range(pieces):
+            self.fit(self.start + piece * span, self.start + (piece + 1) * span)
+        self.starts = [k[0] for k in self.segments]
+        # pyephem is not needed once fitted
+        self.body = None
+        self.observer = None
+        self.fit_seconds = time.perf_counter() - begin
+
+    def sample(self, date):
+        """Returns (az, alt, range, range rate) from pyephem at date"""
+        self.samples = self.samples + 1
+        self.observer.date = date
+        self.body.compute(self.observer)
+        return (float(self.body.az), float(self.body.alt),
+                float(self.body.range), float(self.body.range_velocity))
+
+    def fit(self, t0, t1):
+        """Fits [t0, t1], splitting it until it meets the tolerance"""
+        half = (t1 - t0) / 2.0
+        mid = (t1 + t0) / 2.0
+        values = [self.sample(mid + half * x) for x in self.nodes]
+        # unwrap azimuth relative to the first node, in time order
+        prev = None
+        for k in range(len(values) - 1, -1, -1):
+            az = values[k][0]
+            if prev is not None:
+                az = az + 2 * math.pi * round((prev - az) / (2 * math.pi))
+            values[k] = (az,) + values[k][1:]
+            prev = az
+        count = len(self.nodes)
+        coeffs = list()
+        for field in range(4):
+            row = [2.0 / count * sum(b * v[field] for b, v in
+                                     zip(self.basis[j], values))
+                   for j in range(count)]
+            row[0] = row[0] / 2.0
+            coeffs.append(row)
+        segment = (t0, t1, coeffs, [cheb_derivative(k, half / ephem.second)
+                                    for k in coeffs])
+
+        # between the nodes, and the ends, is where the fit is worst
+        checks = [1.0, -1.0] + [(a + b) / 2.0 for a, b in
+                                zip(self.nodes, self.nodes[1:])]
+        error = [abs(row[-1]) + abs(row[-2]) for row in coeffs[1:]]
+        error[0] = error[0] + abs(coeffs[0][-1]) + abs(coeffs[0][-2])
+        for x in checks:
+            true = self.sample(mid + half * x)
+            fitted = [clenshaw(row, x) for row in coeffs]
+            daz = (true[0] - fitted[0] + math.pi) % (2 * math.pi) - math.pi
+            pointing = math.hypot(true[1] - fitted[1],
+                                  daz * math.cos(true[1]))
+            error[0] = max(error[0], pointing)
+            error[1] = max(error[1], abs(true[2] - fitted[2]))
+            error[2] = max(error[2], abs(true[3] - fitted[3]))
+        # pyephem works in single precision, so it is only known to a unit
+        # in the last place of a float32
+        error[0] = error[0] + 2 * math.pi * 2.0 ** -23
+        error[1] = error[1] + max(abs(v[2]) for v in values) * 2.0 ** -23
+        error[2] = error[2] + max(abs(v[3]) for v in values) * 2.0 ** -23
+        if (any(e > tol for e, tol in zip(error, EPHEM_TOLERANCE)) and
+                (t1 - t0) / 2.0 >= EPHEM_MIN_SEGMENT * ephem.second):
+            self.fit(t0, mid)
+            self.fit(mid, t1)
+            return
+        self.error = [max(a, b) for a, b in zip(self.error, error)]
+        self.segments.append(segment)
+
+    def segment(self, date):
+        pos = bisect.bisect_right(self.starts, date) - 1
+        return self.segments[min(max(pos, 0), len(self.segments) - 1)]
+
+    def state(self, date):
+        """
+        Returns (az, alt, range, range_rate, az_rate, alt_rate) at ephem date
+        date, in radians, meters and seconds, like pyephem. Dates outside
+        the pass are extrapolated.
+        """
+        t0, t1, coeffs, rates = self.segment(date)
+        x = (2.0 * date - t0 - t1) / (t1 - t0)
+        return (clenshaw(coeffs[0], x) % (2 * math.pi),
+                clenshaw(coeffs[1], x), clenshaw(coeffs[2], x),
+                clenshaw(coeffs[3], x), clenshaw(rates[0], x),
+                clenshaw(rates[1], x))
+
+    def block(self, dates):
+        """
+        state() for an array of ephem dates at once with numpy. Returns an
+        array with one row per date.
+        """
+        dates = np.asarray(dates, dtype=float)
+        out = np.empty((len(dates), 6))
+        pos = np.clip(np.searchsorted(self.starts, dates, side='right') - 1,
+                      0, len(self.segments) - 1)
+        for seg in np.unique(pos):
+            rows = pos == seg
+            t0, t1, coeffs, rates = self.segments[seg]
+            x = (2.0 * dates[rows] - t0 - t1) / (t1 - t0)
+            table = np.zeros((len(coeffs[0]), 6))
+            for col, row in enumerate(coeffs + rates[:2]):
+                table[:len(row), col] = row
+            out[rows] = np.polynomial.chebyshev.chebval(x, table).T
+        out[:, 0] = np.mod(out[:, 0], 2 * np.pi)
+        return out
+
+class SimClock(object):
+    """
+    The tracked time for `time warp` and replays. It runs rate times as
+    fast as the wall clock from tracked unix time start. With rate None the
+    clock is virtual: it stands still until advance() moves it, and the
+    scheduler runs on it instead of the wall clock, so a replay jumps from
+    one event to the next and does the same thing every time it is run.
+    """
+    def __init__(self, start, rate=None):
+        self.start = start
+        self.rate = rate
+        self.virtual = rate is None
+        self.wall = time.time()
+        self.now = start
+
+    def time(self):
+        """Returns the tracked unix time"""
+        if self.virtual:
+            return self.now
+        return self.start + (time.time() - self.wall) * self.rate
+
+    def wall_time(self, when):
+        """Returns the scheduler's unix time when tracked time reaches when"""
+        if self.virtual:
+            return when
+        return self.wall + (when - self.start) / self.rate
+
+    def shift(self, seconds):
+        """Moves the tracked time by seconds"""
+        self.start = self.start + seconds
+        self.now = self.now + seconds
+
+    def advance(self, when):
+        """Moves a virtual clock forward to unix time when"""
+        self.now = max(self.now, when)
+
+class Event(object):
+    """A callback scheduled on the Scheduler at a unix time on its clock"""
+    def __init__(self, when, name, callback, interval=None, tag=None):
+        self.when = when
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.tag = tag
+        self.cancelled = False
+
+class Scheduler(object):
+    """
+    Timer heap driving the event loop's background work. Instead of waking
+    every REFRESH_TIME seconds, run() sleeps until the earliest pending
+    event. Planners are functions that (re)create events; they run again
+    whenever reschedule() is called, e.g. after a change of satellite,
+    ground station or tracked time. Callbacks may return a coroutine, which
+    is run as a task of its own. The clock is the wall clock, or a replay's
+    virtual one (see SimClock).
+    """
+    def __init__(self):
+        self.heap = list()
+        self.lock = threading.RLock()
+        self.seq = itertools.count()
+        self.planners = list()
+        self.dirty = True
+        self.started = clock_time()
+        self.wakeups = 0
+        self.fired = 0
+        self.loop = None
+        self.wake = None
+        self.trace = None
+
+    def notify(self):
+        """Wakes run() to look at the heap again; safe from any thread"""
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.wake.set)
+
+    def schedule(self, when, name, callback, interval=None, tag=None):
+        """Adds an event firing at unix time when, repeating every interval"""
+        event = Event(when, name, callback, interval, tag)
+        with self.lock:
+            heapq.heappush(self.heap, (when, next(self.seq), event))
+        self.notify()
+        return event
+
+    def cancel(self, event):
+        event.cancelled = True
+
+    def cancel_tag(self, tag):
+        """Cancels every pending event created with the given tag"""
+        with self.lock:
+            for _when, _seq, event in self.heap:
+                if event.tag == tag:
+                    event.cancelled = True
+
+    def add_planner(self, planner):
+        with self.lock:
+            self.planners.append(planner)
+            self.dirty = True
+        self.notify()
+
+    def reschedule(self):
+        """Asks the planners to rebuild their events"""
+        with self.lock:
+            self.dirty = True
+        self.notify()
+
+    def pending(self):
+        """Returns the pending events, earliest first"""
+        with self.lock:
+            return [k[2] for k in sorted(self.heap) if not k[2].cancelled]
+
+    def saved_wakeups(self):
+        """Number of wakeups avoided compared with polling every REFRESH_TIME"""
+        polls = int((clock_time() - self.started) / REFRESH_TIME)
+        return max(0, polls - self.wakeups)
+
+    def run_pending(self):
+        """
+        Runs planners if needed and every event that is due. Returns the
+        number of seconds until the next event, or None if there is none.
+        """
+        with self.lock:
+            planners = list()
+            if self.dirty:
+                self.dirty = False
+                planners = list(self.planners)
+        # planners may search for passes, so don't hold the lock meanwhile
+        for planner in planners:
+            planner(self)
+        with self.lock:
+            due = list()
+            now = clock_time()
+            while self.heap and (self.heap[0][2].cancelled or
+                                 self.heap[0][0] <= now):
+                _when, _seq, event = heapq.heappop(self.heap)
+                if not event.cancelled:
+                    due.append(event)
+        for event in due:
+            self.fired = self.fired + 1
+            if self.trace is not None:
+                self.trace(event)
+            result = event.callback()
+            if result is not None:
+                spawn(result, event.name)
+            if event.interval is not None and not event.cancelled:
+                event.when = max(event.when + event.interval, clock_time())
+                with self.lock:
+                    heapq.heappush(self.heap,
+                                   (event.when, next(self.seq), event))
+        with self.lock:
+            if self.dirty:
+                return 0
+            if not self.heap:
+                return None
+            return max(0, self.heap[0][0] - clock_time())
+
+    async def run(self):
+        """Sleeps until each event is due and runs it, until cancelled"""
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+        try:
+            while True:
+                self.wake.clear()
+                timeout = self.run_pending()
+                if timeout == 0:
+                    await asyncio.sleep(0)
+                    continue
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeups = self.wakeups + 1
+        finally:
+            self.loop = None
+
+class Job(object):
+    """
+    A scheduled job, one per line of the cron file. Specs look like:
+        every <duration> update
+        pass [night|visible] [<lead-duration>] notify|log
+             <satellite>|<prefix>*|all
+    e.g. 'pass night 5m notify ISS (ZARYA)' or 'pass log STARLINK*'. Visible
+    passes are night passes with the satellite in sunlight.
+    """
+    def __init__(self, job_id, spec):
+        self.id = job_id
+        self.spec = ' '.join(spec.split())
+        words = self.spec.split(' ')
+        self.night = False
+        self.visible = False
+        self.lead = 0
+        self.interval = None
+        self.query = None
+        if len(words) == 3 and words[0] == 'every' and words[2] == 'update':
+            self.kind = 'every'
+            self.interval = parse_duration(words[1])
+            if self.interval <= 0:
+                raise ValueError('Job interval must be positive')
+            self.action = words[2]
+            return
+        if len(words) < 3 or words[0] != 'pass':
+            raise ValueError('Unknown job: %s' % self.spec)
+        self.kind = 'pass'
+        words.pop(0)
+        if words[0] == 'night':
+            self.night = True
+            words.pop(0)
+        elif words[0] == 'visible':
+            self.night = True
+            self.visible = True
+            words.pop(0)
+        if words and words[0] not in ('notify', 'log'):
+            self.lead = parse_duration(words.pop(0))
+        if len(words) < 2 or words[0] not in ('notify', 'log'):
+            raise ValueError('Unknown job: %s' % self.spec)
+        self.action = words[0]
+        self.query = ' '.join(words[1:])
+
+    def __str__(self):
+        return '%d %s' % (self.id, self.spec)
+
+class CronTable(object):
+    """
+    The jobs saved in the cron file, scheduled on the shared Scheduler. Each
+    job keeps one pending event per satellite it watches, with its fire time
+    taken from the pass cache. A fired event schedules that satellite's next
+    pass, so nothing polls. Adding or removing a job only touches that job's
+    events.
+    """
+    def __init__(self, cron_file):
+        self.cron_file = cron_file
+        self.jobs = dict()
+        self.events = dict()
+        # (job id, satellite) -> rise time of the pass last acted on
+        self.done = dict()
+        # entries in done after it was last pruned
+        self.kept = 0
+        self.sched = None
+        self.generation = None
+        # (job id, satellite) pairs whose next pass wasn't found
+        self.unplanned = set()
+
+    def load(self):
+        """Reads the cron file, skipping (and reporting) malformed lines"""
+        self.jobs.clear()
+        if not os.path.exists(self.cron_file):
+            return
+        with open(self.cron_file, 'r') as fname:
+            for line in fname:
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+                try:
+                    job_id, spec = line.split(None, 1)
+                    job = Job(int(job_id), spec)
+                except ValueError:
+                    print('Ignoring malformed cron job: %s' % line)
+                    continue
+                self.jobs[job.id] = job
+
+    def save(self):
+        """Writes every job back to the cron file atomically"""
+        tmp_file = self.cron_file + '.tmp'
+        with open(tmp_file, 'w') as fname:
+            for job_id in sorted(self.jobs):
+                fname.write(str(self.jobs[job_id]) + '\n')
+        os.replace(tmp_file, self.cron_file)
+
+    def add(self, spec):
+        """
+        Parses, saves and schedules a new job.
+        @throws ValueError if spec is not a valid job
+        """
+        job = Job(max(self.jobs, default=0) + 1, spec)
+        self.jobs[job.id] = job
+        self.save()
+        if self.sched is not None:
+            self.plan_job(job)
+        return job
+
+    def remove(self, job_id):
+        """Removes a job and cancels its pending events"""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            raise ValueError('No job with id %d' % job_id)
+        for event in self.events.pop(job_id, dict()).values():
+            event.cancelled = True
+        for key in [k for k in self.done if k[0] == job_id]:
+            del self.done[key]
+        self.save()
+        return job
+
+    def prune(self, after):
+        """
+        Forgets the passes acted on that rose by ephem date after, the start
+        of the planning window: plan_pass() never picks those again anyway
+        """
+        self.done = dict((key, rise) for key, rise in self.done.items()
+                         if rise > after)
+        self.kept = len(self.done)
+
+    def plan(self, sched):
+        """
+        Planner: schedules every job from scratch, unless nothing the jobs
+        depend on has changed since the last time. The ground station, the
+        tracked time and the TLEs all invalidate the pass cache when they
+        change; the tracked satellite's passes don't matter here.
+        """
+        generation = get_pass_cache().generation
+        if sched is self.sched and generation == self.generation:
+            # but search again for the passes no search has found yet
+            if self.unplanned and not is_frozen:
+                after = ephem.Date(sync_time())
+                for job_id, name in list(self.unplanned):
+                    if job_id in self.jobs:
+                        self.plan_pass(self.jobs[job_id], name, after)
+                    else:
+                        self.unplanned.discard((job_id, name))
+            return
+        self.sched = sched
+        self.generation = generation
+        self.unplanned.clear()
+        if not is_frozen:
+            self.prune(ephem.Date(sync_time()))
+        for job_events in self.events.values():
+            for event in job_events.values():
+                event.cancelled = True
+        self.events.clear()
+        for job in list(self.jobs.values()):
+            self.plan_job(job)
+
+    def plan_job(self, job):
+        self.events[job.id] = dict()
+        if job.kind == 'every':
+            now = clock_time()
+            first = (math.floor(now / job.interval) + 1) * job.interval
+            self.events[job.id][None] = self.sched.schedule(
+                first, str(job), lambda: self.fire(job, None, None),
+                interval=job.interval, tag='job')
+            return
+        if is_frozen:
+            return
+        after = ephem.Date(sync_time())
+        for name in self.targets(job):
+            self.plan_pass(job, name, after)
+
+    def targets(self, job):
+        """Returns the names of the satellites a pass job watches"""
+        cat = get_catalog()
+        if job.query == 'all':
+            return cat.names()
+        if job.query.endswith('*'):
+            prefix = job.query[:-1].upper()
+            return [cat.name(k) for k in cat.search(job.query[:-1])
+                    if cat.name(k).upper().startswith(prefix)]
+        idx = cat.find(job.query)
+        return list() if idx is None else [cat.name(idx)]
+
+    def plan_pass(self, job, name, after):
+        """Schedules job for the first suitable pass of name after after"""
+        cat = get_catalog()
+        idx = cat.exact(name)
+        if idx is None:
+            # gone from the TLE file since the job was planned
+            self.unplanned.discard((job.id, name))
+            return
+        body = cat.body(idx)
+        cache = get_pass_cache()
+        try:
+            window = cache.next_pass(body, grnd.observer, after)
+            for _k in range(CRON_PASS_SEARCH):
+                if (window[0] > after and
+                        window[0] != self.done.get((job.id, name)) and
+                        (not job.night or is_night(window)) and
+                        (not job.visible or is_visible(body, window))):
+                    break
+                window = cache.next_pass(body, grnd.observer,
+                                         window[4] + ephem.second)
+            else:
+                self.unplanned.add((job.id, name))
+                return
+        except ValueError:
+            # satellite never passes, or pyephem lost it for now
+            self.unplanned.add((job.id, name))
+            return
+        self.unplanned.discard((job.id, name))
+        fire = wall_time(window[0]) - job.lead
+        self.events[job.id][name] = self.sched.schedule(
+            fire, '%s %s' % (job.action, name),
+            lambda: self.fire(job, name, window), tag='job')
+
+    def fire(self, job, name, window):
+        """Runs a job's action, then schedules the next one"""
+        if job.id not in self.jobs:
+            return
+        if job.action == 'update':
+            if sim_clock is not None and sim_clock.virtual:
+                # replays run offline
+                return
+            if event_loop is not None:
+                # downloaded by a task of its own
+                return refresh_tle()
+            try:
+                update_tle()
+            except (ValueError, IOError):
+                print('Unable to update TLE. Check your network connection')
+            return
+        # replanning mustn't act on this pass again
+        self.done[(job.id, name)] = window[0]
+        if len(self.done) > 2 * self.kept and not is_frozen:
+            self.prune(ephem.Date(sync_time()))
+        aos = ephem.localtime(window[0]).replace(microsecond=0)
+        if job.action == 'notify':
+            alert('%s passes overhead at %s' % (name, aos))
+        elif job.action == 'log':
+            log_pass(name, window)
+        self.plan_pass(job, name, ephem.Date(window[4] + ephem.second))
+
+class Catalog(object):
+    """
+    On-disk index of the TLE file, keyed by exact name, name prefix and NORAD
+    catalog number. Each entry records the byte offset of its three-line
+    element set, so a lookup seeks straight to it instead of re-parsing the
+    whole TLE file. Entries are held column-wise, every name in one string
+    and everything else in flat arrays, so an entry costs a few dozen bytes
+    rather than a few hundred of Python objects. pyephem bodies are built
+    from it on demand, keeping the BODY_CACHE_SIZE most recently used. The
+    index file holds these columns byte for byte (see save()), so loading
+    it is a few copies rather than a parse.
+    """
+    def __init__(self, tle_file, entries, tle_mtime=None, tle_size=None,
+                 cache_size=BODY_CACHE_SIZE):
+        self.tle_file = tle_file
+        self.tle_mtime = tle_mtime
+        self.tle_size = tle_size
+        # entries are (name, norad, offset), in file order
+        names = [k[0] for k in entries]
+        norads = [k[1] for k in entries]
+        self.offsets = array.array('q', [k[2] for k in entries])
+        self.name_text = ''.join(names)
+        self.name_ends = array.array('I', itertools.accumulate(map(len, names)))
+        # NORAD ids are at most five characters, so they pack to width 5
+        self.norad_text = ''.join(k.rjust(5) for k in norads)
+        # entry indices sorted by upper case name for prefix searches, and
+        # hash tables of exact names and NORAD ids: sorted (hash, index)
+        # pairs, so the first of a run of equal keys comes first in the file
+        # (sorted() is stable, so ties stay in index order)
+        self.sorted_names = array.array('I', sorted(
+            range(len(names)), key=[k.upper() for k in names].__getitem__))
+        self.name_hashes, self.name_index = self.hash_table(names)
+        self.norad_hashes, self.norad_index = self.hash_table(norads)
+        self.orbit_bounds = None
+        self.cache_size = cache_size
+        self.bodies = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, tle_file):
+        """Scans the TLE file once and returns a fresh Catalog"""
+        entries = list()
+        metrics.count('read.tles.txt')
+        with open(tle_file, 'rb') as fname:
+            prev_line = None
+            prev_offset = 0
+            offset = 0
+            for raw in fname:
+                line = raw.decode('utf-8').strip()
+                if line.startswith('1 ') and prev_line is not None:
+                    norad = line[2:7].strip()
+                    entries.append((prev_line, norad, prev_offset))
+                    prev_line = None
+                elif line.startswith('2 ') or line == '':
+                    prev_line = None
+                else:
+                    prev_line = line
+                    prev_offset = offset
+                offset = offset + len(raw)
+        stat = os.stat(tle_file)
+        return cls(tle_file, entries, stat.st_mtime, stat.st_size)
+
+    @classmethod
+    def load(cls, index_file, tle_file):
+        """
+        Loads a previously saved index.
+        @throws ValueError if the index is missing, corrupt or out of date
+        """
+        metrics.count('read.catalog.idx')
+        try:
+            with open(index_file, 'rb') as fname:
+                data = fname.read()
+            stat = os.stat(tle_file)
+            (magic, version, tle_mtime, tle_size, count, norad_bytes,
+             name_bytes) = CATALOG_HEADER.unpack_from(data)
+        except (IOError, OSError, struct.error):
+            raise ValueError('Unable to read catalog index')
+        if (magic != CATALOG_MAGIC or version != CATALOG_VERSION or
+                tle_mtime != stat.st_mtime or tle_size != stat.st_size):
+            raise ValueError('Catalog index is out of date')
+        catalog = cls(tle_file, [], tle_mtime, tle_size)
+        view = memoryview(data)
+        pos = CATALOG_HEADER.size
+        for attr, typecode in CATALOG_ARRAYS:
+            column = array.array(typecode)
+            end = pos + count * column.itemsize
+            column.frombytes(view[pos:end])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            setattr(catalog, attr, column)
+            pos = end
+        if len(data) != pos + norad_bytes + name_bytes:
+            raise ValueError('Unable to read catalog index')
+        try:
+            catalog.norad_text = data[pos:pos + norad_bytes].decode('utf-8')
+            catalog.name_text = data[pos + norad_bytes:].decode('utf-8')
+        except UnicodeDecodeError:
+            raise ValueError('Unable to read catalog index')
+        ends = catalog.name_ends
+        if (len(catalog.norad_text) != 5 * count or
+                (ends[-1] if count else 0) != len(catalog.name_text)):
+            raise ValueError('Unable to read catalog index')
+        return catalog
+
+    def save(self, index_file):
+        """
+        Writes the index to disk atomically: a CATALOG_HEADER, each of
+        CATALOG_ARRAYS little-endian, then the NORAD and name text as UTF-8
+        """
+        norad_data = self.norad_text.encode('utf-8')
+        name_data = self.name_text.encode('utf-8')
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file, 'wb') as fname:
+            fname.write(CATALOG_HEADER.pack(
+                CATALOG_MAGIC, CATALOG_VERSION, self.tle_mtime,
+                self.tle_size, len(self), len(norad_data), len(name_data)))
+            for attr, _typecode in CATALOG_ARRAYS:
+                column = getattr(self, attr)
+                if sys.byteorder == 'big':
+                    column = array.array(column.typecode, column)
+                    column.byteswap()
+                fname.write(column.tobytes())
+            fname.write(norad_data)
+            fname.write(name_data)
+        os.replace(tmp_file, index_file)
+
+    def names(self):
+        """Returns all satellite names in file order"""
+        return [self.name(k) for k in range(len(self))]
+
+    @staticmethod
+    def key_hash(key):
+        """
+        Returns the CRC-32 of key. Unlike hash(), it is the same in every
+        process, so the hash tables can be saved with the index.
+        """
+        return zlib.crc32(key.encode('utf-8'))
+
+    @classmethod
+    def hash_table(cls, keys):
+        """Returns (hashes, indices) of keys, sorted by hash then index"""
+        hashes = [cls.key_hash(k) for k in keys]
+        order = sorted(range(len(keys)), key=hashes.__getitem__)
+        return (array.array('I', [hashes[k] for k in order]),
+                array.array('I', order))
+
+    @classmethod
+    def lookup(cls, hashes, index, key, value):
+        """Returns the first entry index whose key() is value, or None"""
+        target = cls.key_hash(value)
+        pos = bisect.bisect_left(hashes, target)
+        while pos < len(hashes) and hashes[pos] == target:
+            if key(index[pos]) == value:
+                return index[pos]
+            pos = pos + 1
+        return None
+
+    def upper(self, idx):
+        return self.name(idx).upper()
+
+    def exact_name(self, name):
+        """Returns the first entry index named exactly name, or None"""
+        return self.lookup(self.name_hashes, self.name_index, self.name, name)
+
+    def exact(self, name):
+        """Returns the entry index for an exact name or NORAD id, or None"""
+        idx = self.exact_name(name)
+        if idx is None:
+            idx = self.lookup(self.norad_hashes, self.norad_index,
+                              self.norad, name.strip())
+        return idx
+
+    def search(self, query, limit=None):
+        """
+        Returns entry indices matching query, best match first. Ranking is:
+        exact name or NORAD id, case-insensitive exact name, names starting
+        with query (case-sensitive first), then names that are a prefix of
+        query. Ties go to the shorter name, then to file order.
+        """
+        if query == '':
+            return list()
+        ranked = dict()
+        idx = self.exact(query)
+        if idx is not None:
+            ranked[idx] = 0
+        upper = query.upper()
+        pos = bisect.bisect_left(self.sorted_names, upper, key=self.upper)
+        while pos < len(self.sorted_names):
+            idx = self.sorted_names[pos]
+            name = self.name(idx)
+            key = name.upper()
+            if not key.startswith(upper):
+                break
+            if key == upper:
+                rank = 1
+            elif name.startswith(query):
+                rank = 2
+            else:
+                rank = 3
+            ranked[idx] = min(rank, ranked.get(idx, rank))
+            pos = pos + 1
+        # names which are themselves a prefix of the query
+        hashes = self.name_hashes
+        for end in range(len(query) - 1, 0, -1):
+            prefix = query[:end]
+            # most prefixes aren't names, which the hashes alone rule out
+            target = self.key_hash(prefix)
+            pos = bisect.bisect_left(hashes, target)
+            if pos == len(hashes) or hashes[pos] != target:
+                continue
+            idx = self.exact_name(prefix)
+            if idx is not None and idx not in ranked:
+                ranked[idx] = 4
+        ret = sorted(ranked, key=lambda k: (ranked[k], len(self.name(k)), k))
+        return ret if limit is None else ret[:limit]
+
+    def find(self, query):
+        """Returns the best matching entry index, or None"""
+        found = self.search(query, limit=1)
+        return found[0] if found else None
+
+    def name(self, idx):
+        ends = self.name_ends
+        return self.name_text[ends[idx - 1] if idx else 0:ends[idx]]
+
+    def norad(self, idx):
+        return self.norad_text[5 * idx:5 * idx + 5].strip()
+
+    def tle(self, idx):
+        """Reads the three TLE lines for an entry directly from its offset"""
+        metrics.count('read.tles.txt')
+        with open(self.tle_file, 'rb') as fname:
+            fname.seek(self.offsets[idx])
+            lines = [fname.readline().decode('utf-8').strip()
+                     for _k in range(3)]
+        if not (lines[1].startswith('1 ') and lines[2].startswith('2 ')):
+            raise ValueError('Catalog index does not match TLE file')
+        return lines
+
+    def tles(self):
+        """Reads every entry's three TLE lines in one pass over the file"""
+        metrics.count('read.tles.txt')
+        with open(self.tle_file, 'rb') as fname:
+            data = fname.read()
+        ret = list()
+        for offset in self.offsets:
+            end = offset
+            for _k in range(3):
+                end = data.find(b'\n', end) + 1 or len(data)
+            lines = [k.strip() for k in
+                     data[offset:end].decode('utf-8').splitlines()]
+            if not (len(lines) == 3 and lines[1].startswith('1 ') and
+                    lines[2].startswith('2 ')):
+                raise ValueError('Catalog index does not match TLE file')
+            ret.append(lines)
+        return ret
+
+    def bounds(self):
+        """
+        Yields orbit_bounds() of every entry, worked out once per catalog
+        and packed seven doubles to an entry. Entries that can't be parsed
+        get None.
+        """
+        if self.orbit_bounds is None:
+            packed = array.array('d')
+            for _name, line1, line2 in self.tles():
+                try:
+                    packed.extend(orbit_bounds(line1, line2))
+                except ValueError:
+                    packed.extend([math.nan] * 7)
+            self.orbit_bounds = packed
+        packed = self.orbit_bounds
+        for pos in range(0, len(packed), 7):
+            bound = tuple(packed[pos:pos + 7])
+            yield None if math.isnan(bound[0]) else bound
+
+    def body(self, idx):
+        """
+        Returns a pyephem body for an entry, built from its TLE the first
+        time and shared until it falls out of the cache, so compute() it
+        before reading it
+        @throws ValueError
+        """
+        with self.lock:
+            body = self.bodies.get(idx)
+            if body is not None:
+                self.bodies.move_to_end(idx)
+                return body
+        metrics.count('catalog.body')
+        body = ephem.readtle(*self.tle(idx))
+        with self.lock:
+            self.bodies[idx] = body
+            while len(self.bodies) > self.cache_size:
+                self.bodies.popitem(last=False)
+        return body
+
+    def memory(self):
+        """
+        Returns (bytes, bodies): the bytes the entries take, and how many
+        bodies are built
+        """
+        used = sum(sys.getsizeof(k) for k in (
+            self.name_text, self.norad_text, self.name_ends, self.offsets,
+            self.sorted_names, self.name_hashes, self.name_index,
+            self.norad_hashes, self.norad_index))
+        if self.orbit_bounds is not None:
+            used = used + sys.getsizeof(self.orbit_bounds)
+        return (used, len(self.bodies))
+
+class TleArchive(object):
+    """
+    Append-only history of every element set ever fetched. The data file
+    holds fixed-width TLE records (still readable as a TLE file) and never
+    changes once written. A separate index of (NORAD id, epoch, record)
+    keys, sorted by NORAD id then epoch, is memory-mapped and searched in
+    place, so finding the element set nearest a date costs a couple of dozen
+    reads however many years of history the archive holds. The index can
+    always be rebuilt from the data file.
+    """
+    def __init__(self, data_file, index_file):
+        self.data_file = data_file
+        self.index_file = index_file
+        # readers search the maps while an append swaps them
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.data = None
+        self.index = None
+        self.records = 0
+        self.keys = 0
+        self.open()
+
+    def __len__(self):
+        return self.keys
+
+    def open(self):
+        """(Re)maps both files, rebuilding the index if it doesn't match"""
+        import mmap
+        self.close()
+        try:
+            size = os.path.getsize(self.data_file)
+        except OSError:
+            size = 0
+        self.records = size // ARCHIVE_RECORD
+        if not self.records:
+            # nothing archived yet; the first append writes the index
+            self.keys = 0
+            return
+        try:
+            index_size = os.path.getsize(self.index_file)
+        except OSError:
+            index_size = -1
+        if index_size != self.records * ARCHIVE_KEY.size:
+            # lost, torn or out of date: the data file is the source of truth
+            self.rebuild()
+            index_size = os.path.getsize(self.index_file)
+        self.keys = index_size // ARCHIVE_KEY.size
+        with open(self.data_file, 'rb') as fname:
+            self.data = mmap.mmap(fname.fileno(),
+                                  self.records * ARCHIVE_RECORD,
+                                  access=mmap.ACCESS_READ)
+        if self.keys:
+            with open(self.index_file, 'rb') as fname:
+                self.index = mmap.mmap(fname.fileno(), index_size,
+                                       access=mmap.ACCESS_READ)
+
+    def close(self):
+        for mapped in (self.data, self.index):
+            if mapped is not None:
+                mapped.close()
+        self.data = None
+        self.index = None
+
+    def rebuild(self):
+        """Re-indexes every whole record in the data file"""
+        metrics.count('archive.rebuild')
+        keys = list()
+        if self.records:
+            with open(self.data_file, 'rb') as fname:
+                for recno in range(self.records):
+                    try:
+                        entry = self.decode(fname.read(ARCHIVE_RECORD))
+                        keys.append(self.entry_key(entry) + (recno,))
+                    except ValueError:
+                        # damaged on disk; unreachable but left in place
+                        continue
+        keys.sort()
+        self.write_index(keys)
+
+    def write_index(self, keys):
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'wb') as fname:
+            for key in keys:
+                fname.write(ARCHIVE_KEY.pack(*key))
+        os.replace(tmp_file, self.index_file)
+
+    @staticmethod
+    def encode(entry):
+        """Packs (name, line1, line2) into one fixed-width record"""
+        name, line1, line2 = entry
+        text = '%-24.24s\n%-69.69s\n%-69.69s\n' % (name, line1, line2)
+        return text.encode('ascii', 'replace')
+
+    @staticmethod
+    def decode(record):
+        name, line1, line2 = record.decode('ascii').split('\n')[:3]
+        return (name.rstrip(), line1.rstrip(), line2.rstrip())
+
+    @staticmethod
+    def entry_key(entry):
+        """
+        Returns (norad, epoch) for a TLE entry
+        @throws ValueError
+        """
+        return (norad_number(entry[1][2:7]), tle_epoch(entry[1]))
+
+    def key_at(self, pos):
+        return ARCHIVE_KEY.unpack_from(self.index, pos * ARCHIVE_KEY.size)
+
+    def lower_bound(self, norad, epoch):
+        """Returns the first index position whose key is >= (norad, epoch)"""
+        low, high = 0, self.keys
+        while low < high:
+            mid = (low + high) // 2
+            if self.key_at(mid)[:2] < (norad, epoch):
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def epochs(self, norad):
+        """Returns the archived epochs of norad as Julian dates, oldest first"""
+        norad = norad_number(str(norad))
+        with self.lock:
+            pos = self.lower_bound(norad, float('-inf'))
+            ret = list()
+            while pos < self.keys:
+                key = self.key_at(pos)
+                if key[0] != norad:
+                    break
+                ret.append(key[1])
+                pos = pos + 1
+        return ret
+
+    def nearest(self, norad, jd):
+        """
+        Returns (entry, low, high): the (name, line1, line2) of norad whose
+        epoch is nearest the Julian date jd, and the span of Julian dates
+        [low, high) over which it stays the nearest. Returns None if norad
+        was never archived.
+        """
+        norad = norad_number(str(norad))
+        with self.lock:
+            pos = self.lower_bound(norad, jd)
+            best = None
+            for cand in (pos - 1, pos):
+                if 0 <= cand < self.keys:
+                    key = self.key_at(cand)
+                    if key[0] == norad and (best is None or
+                                            abs(key[1] - jd) < abs(best[1][1] - jd)):
+                        best = (cand, key)
+            if best is None:
+                return None
+            cand, (_norad, epoch, recno) = best
+            low = float('-inf')
+            high = float('inf')
+            if cand > 0:
+                prev = self.key_at(cand - 1)
+                if prev[0] == norad:
+                    low = (prev[1] + epoch) / 2.0
+            if cand + 1 < self.keys:
+                nxt = self.key_at(cand + 1)
+                if nxt[0] == norad:
+                    high = (epoch + nxt[1]) / 2.0
+            start = recno * ARCHIVE_RECORD
+            entry = self.decode(self.data[start:start + ARCHIVE_RECORD])
+        return entry, low, high
+
+    def contains(self, key):
+        pos = self.lower_bound(*key)
+        return pos < self.keys and self.key_at(pos)[:2] == key
+
+    def append(self, entries):
+        """
+        Archives every (name, line1, line2) in entries that isn't already
+        there (same NORAD id and epoch) and re-indexes. Returns the number
+        of element sets added. Malformed entries are skipped.
+        """
+        new_keys = dict()
+        for entry in entries:
+            try:
+                key = self.entry_key(entry)
+            except ValueError:
+                continue
+            if key not in new_keys:
+                new_keys[key] = entry
+        with self.write_lock:
+            # only appends change the maps, so they can be read unlocked here
+            fresh = [key for key in new_keys if not self.contains(key)]
+            if not fresh:
+                return 0
+            with open(self.data_file, 'ab') as fname:
+                recno = fname.tell() // ARCHIVE_RECORD
+                if fname.tell() % ARCHIVE_RECORD:
+                    # a torn record from an interrupted append
+                    fname.truncate(recno * ARCHIVE_RECORD)
+                    fname.seek(recno * ARCHIVE_RECORD)
+                added = list()
+                for key in fresh:
+                    fname.write(self.encode(new_keys[key]))
+                    added.append(key + (recno,))
+                    recno = recno + 1
+            added.sort()
+            # readers keep searching the old index until it is swapped in
+            self.merge_index(added)
+            with self.lock:
+                self.open()
+        return len(added)
+
+    def merge_index(self, added):
+        """Writes the index with the sorted keys in added merged in"""
+        if self.index is None:
+            self.write_index(added)
+            return
+        if load_numpy() is not None:
+            dtype = np.dtype([('norad', '<u4'), ('epoch', '<f8'),
+                              ('recno', '<u8')])
+            new = np.array(added, dtype=dtype)
+            # concatenate copies, so no view of the map outlives it
+            both = np.concatenate((np.frombuffer(self.index, dtype=dtype),
+                                   new))
+            # stable, so the old keys' order is kept and the merge is cheap
+            both = both[np.lexsort((both['epoch'], both['norad']))]
+            tmp_file = self.index_file + '.tmp'
+            both.tofile(tmp_file)
+            os.replace(tmp_file, self.index_file)
+            return
+        self.write_index(heapq.merge(ARCHIVE_KEY.iter_unpack(self.index),
+                                     added))
+
+    def size(self):
+        """Returns the bytes used on disk by the data and the index"""
+        return ((self.records * ARCHIVE_RECORD) +
+                (self.keys * ARCHIVE_KEY.size))
+
+class StateTable(object):
+    """
+    Live state of the satellite and the tracked ones, shared with other
+    processes on the host (a rotator controller, a logger, a status bar)
+    through a memory-mapped file of fixed layout: a STATE_HEADER, then from
+    byte STATE_OFFSET one STATE_SLOT per satellite holding a STATE_SEQ
+    version and a STATE_RECORD. Angles are in degrees, range in km and
+    times in unix seconds; 'time' is the tracked time, 'stamp' the wall
+    clock at the write, and 'aos' and 'los' are NaN if there is no pass.
+
+    Every slot is a seqlock for the one writer: it makes the version odd,
+    rewrites the record and makes the version even again. A reader that
+    sees the same even version before and after unpacking a record has a
+    consistent one (StateReader), and never holds up the writer. The layout
+    never changes; a table for another set of satellites replaces the file,
+    and the one it replaced is marked retired so its readers reopen.
+    """
+    def __init__(self, path, entries):
+        """entries holds the (NORAD id, name) of each slot"""
+        import mmap
+        self.path = path
+        self.entries = list(entries)
+        self.names = [name.encode('ascii', 'replace')[:28]
+                      for _norad, name in self.entries]
+        self.slots = None
+        size = STATE_OFFSET + STATE_SLOT * len(self.entries)
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w+b') as fname:
+            fname.truncate(size)
+            self.map = mmap.mmap(fname.fileno(), size)
+        STATE_HEADER.pack_into(self.map, 0, STATE_MAGIC, STATE_VERSION, 0,
+                               len(self.entries), STATE_SLOT)
+        nothing = [math.nan] * len(STATE_FIELDS)
+        for slot, (norad, _name) in enumerate(self.entries):
+            # version 0: nothing published yet
+            STATE_RECORD.pack_into(self.map, self.offset(slot) + STATE_SEQ.size,
+                                   norad, self.names[slot], *nothing)
+        old = StateTable.map_header(path)
+        os.replace(tmp_file, path)
+        if old is not None:
+            # readers of the old file reopen the path and find this one
+            fields = list(STATE_HEADER.unpack_from(old))
+            fields[2] = 1
+            STATE_HEADER.pack_into(old, 0, *fields)
+            old.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def offset(slot):
+        return STATE_OFFSET + slot * STATE_SLOT
+
+    @staticmethod
+    def map_header(path):
+        """Returns a writable map of the header of the table at path, if any"""
+        import mmap
+        try:
+            with open(path, 'r+b') as fname:
+                mapped = mmap.mmap(fname.fileno(), STATE_OFFSET)
+        except (OSError, ValueError):
+            return None
+        if mapped[:len(STATE_MAGIC)] != STATE_MAGIC:
+            mapped.close()
+            return None
+        return mapped
+
+    def write(self, slot, values):
+        """Publishes one slot's STATE_FIELDS values"""
+        offset = self.offset(slot)
+        version = STATE_SEQ.unpack_from(self.map, offset)[0] | 1
+        STATE_SEQ.pack_into(self.map, offset, version)
+        STATE_RECORD.pack_into(self.map, offset + STATE_SEQ.size,
+                               self.entries[slot][0], self.names[slot],
+                               *values)
+        STATE_SEQ.pack_into(self.map, offset, version + 1)
+
+    def write_many(self, first, columns):
+        """
+        Publishes consecutive slots from first on, with one array per
+        STATE_FIELDS value, through a structured array over the map
+        """
+        if self.slots is None:
+            fields = [('version', '<u8'), ('norad', '<u4'), ('name', 'S28')]
+            fields += [(name, '<f8') for name in STATE_FIELDS]
+            pad = STATE_SLOT - STATE_SEQ.size - STATE_RECORD.size
+            self.slots = np.frombuffer(self.map,
+                                       dtype=fields + [('pad', 'V%d' % pad)],
+                                       count=len(self.entries),
+                                       offset=STATE_OFFSET)
+        view = self.slots[first:first + len(columns[0])]
+        view['version'] |= 1
+        for name, column in zip(STATE_FIELDS, columns):
+            view[name] = column
+        view['version'] += 1
+
+    def close(self):
+        # the structured array is a view of the map, which can't close under it
+        self.slots = None
+        self.map.close()
+
+class StateReader(object):
+    """
+    Reads the state table another process publishes (see StateTable). Each
+    record is unpacked straight from the shared map and read again if the
+    writer changed it meanwhile, so reads take microseconds and never block
+    the writer. A retired table is swapped for the one that replaced it.
+    """
+    def __init__(self, path=None):
+        self.path = STATE_FILE if path is None else path
+        self.map = None
+        self.names = list()
+        self.slots = dict()
+        self.retries = 0
+        self.open()
+
+    def open(self):
+        """
+        (Re)maps the table and reads its names
+
+        @throws OSError, ValueError
+        """
+        import mmap
+        self.close()
+        with open(self.path, 'rb') as fname:
+            self.map = mmap.mmap(fname.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _retired, count, slot_size = \
+            STATE_HEADER.unpack_from(self.map)
+        if (magic != STATE_MAGIC or version != STATE_VERSION or
+                slot_size != STATE_SLOT or
+                len(self.map) < StateTable.offset(count)):
+            self.close()
+            raise ValueError('Not a state table: %s' % self.path)
+        self.names = list()
+        self.slots = dict()
+        for slot in range(count):
+            # names never change once a table is written
+            norad, name = STATE_RECORD.unpack_from(
+                self.map, StateTable.offset(slot) + STATE_SEQ.size)[:2]
+            name = name.rstrip(b'\0').decode('ascii', 'replace')
+            self.names.append(name)
+            self.slots.setdefault(name, slot)
+            self.slots.setdefault(norad, slot)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.map = None
+
+    def retired(self):
+        return STATE_HEADER.unpack_from(self.map)[2] != 0
+
+    def read_slot(self, slot):
+        """
+        Returns a consistent (version, record) of one slot
+
+        @throws TimeoutError
+        """
+        offset = StateTable.offset(slot)
+        for _k in range(STATE_RETRIES):
+            version = STATE_SEQ.unpack_from(self.map, offset)[0]
+            if not version & 1:
+                record = STATE_RECORD.unpack_from(self.map,
+                                                  offset + STATE_SEQ.size)
+                if STATE_SEQ.unpack_from(self.map, offset)[0] == version:
+                    return version, record
+            # the writer is midway through this slot
+            self.retries = self.retries + 1
+            time.sleep(0)
+        raise TimeoutError('State table slot %d is not being updated' % slot)
+
+    def read(self, key):
+        """
+        Returns the latest state of the satellite named key (or with NORAD
+        id key) as a dict, or None if none has been published
+        """
+        if self.retired():
+            self.open()
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        version, record = self.read_slot(slot)
+        if version == 0:
+            return None
+        return self.to_dict(slot, record)
+
+    def read_all(self):
+        """Returns the latest state of every published satellite"""
+        if self.retired():
+            self.open()
+        found = list()
+        for slot in range(len(self.names)):
+            version, record = self.read_slot(slot)
+            if version != 0:
+                found.append(self.to_dict(slot, record))
+        return found
+
+    def to_dict(self, slot, record):
+        state = {'name': self.names[slot], 'norad': record[0]}
+        for name, value in zip(STATE_FIELDS, record[2:]):
+            state[name] = None if math.isnan(value) else value
+        return state
+
+class TelemetryLog(object):
+    """
+    Rolling history of the satellite's state, appended every second by the
+    scheduler (see plan_telemetry_events()). The file has a fixed size: a
+    ring buffer per tier of TELEMETRY_TIERS, the finest keeping a sample a
+    second for a couple of days and coarser ones a sample per step for
+    longer. A tier takes the first sample of each step-long bucket of time,
+    which is how older data is downsampled, so an append writes at most one
+    fixed-width row per tier. Samples from before a tier's latest bucket,
+    e.g. after the system clock was set back, can't be inserted and are
+    counted as dropped in the tier's header instead. Each tier holds its
+    TELEMETRY_COLUMNS one after another in the memory map, so a range query
+    is a binary search of the time column and a slice of the others, with
+    nothing to parse.
+    """
+    def __init__(self, path):
+        if load_numpy() is None:
+            raise ValueError('The telemetry log requires numpy')
+        self.path = path
+        if not os.path.exists(path):
+            self.create(path)
+        self.open()
+
+    @staticmethod
+    def layout(tiers):
+        """
+        Returns the file size and, per tier, the offset of each column for
+        tiers of (step, capacity)
+        """
+        if load_numpy() is None:
+            raise ValueError('The telemetry log requires numpy')
+        offset = TELEMETRY_OFFSET
+        offsets = list()
+        for _step, capacity in tiers:
+            columns = dict()
+            for name, dtype in TELEMETRY_COLUMNS:
+                columns[name] = offset
+                offset = offset + capacity * np.dtype(dtype).itemsize
+                # keep every column aligned for its type
+                offset = (offset + 7) // 8 * 8
+            offsets.append(columns)
+        return offset, offsets
+
+    @staticmethod
+    def tier_dtype():
+        return np.dtype([('step', '<f8'), ('capacity', '<u8'), ('head', '<u8'),
+                         ('count', '<u8'), ('last', '<i8'),
+                         ('dropped', '<u8')])
+
+    @staticmethod
+    def create(path):
+        """Writes an empty log with TELEMETRY_TIERS; it is sparse until used"""
+        if load_numpy() is None:
+            raise ValueError('The telemetry log requires numpy')
+        tiers = [(step, int(days * 86400 / step))
+                 for step, days in TELEMETRY_TIERS]
+        size, _offsets = TelemetryLog.layout(tiers)
+        header = np.zeros(len(tiers), dtype=TelemetryLog.tier_dtype())
+        header['step'] = [k[0] for k in tiers]
+        header['capacity'] = [k[1] for k in tiers]
+        header['last'] = -1
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'wb') as fname:
+            fname.write(TELEMETRY_HEADER.pack(TELEMETRY_MAGIC,
+                                              TELEMETRY_VERSION, len(tiers)))
+            fname.write(header.tobytes())
+            fname.truncate(size)
+        os.replace(tmp_file, path)
+
+    def open(self):
+        """
+        Maps the log, whose tiers are read from its own header
+
+        @throws ValueError
+        """
+        self.map = np.memmap(self.path, mode='r+', dtype='u1')
+        magic, version, count = TELEMETRY_HEADER.unpack_from(self.map)
+        if magic != TELEMETRY_MAGIC or version != TELEMETRY_VERSION:
+            raise ValueError('Not a telemetry log: %s' % self.path)
+        self.tiers = np.ndarray(count, dtype=self.tier_dtype(),
+                                buffer=self.map, offset=TELEMETRY_HEADER.size)
+        self.steps = [float(k) for k in self.tiers['step']]
+        self.capacities = [int(k) for k in self.tiers['capacity']]
+        size, offsets = self.layout(zip(self.steps, self.capacities))
+        if len(self.map) < size:
+            raise ValueError('Truncated telemetry log: %s' % self.path)
+        self.columns = list()
+        for capacity, tier_offsets in zip(self.capacities, offsets):
+            self.columns.append(dict(
+                (name, np.ndarray(capacity, dtype=dtype, buffer=self.map,
+                                  offset=tier_offsets[name]))
+                for name, dtype in TELEMETRY_COLUMNS))
+
+    def append(self, when, norad, values):
+        """
+        Logs a sample at unix time when: the NORAD id and the values of the
+        columns after it. Returns the number of tiers that dropped it for
+        being older than their latest bucket.
+        """
+        dropped = 0
+        for tier, columns in enumerate(self.columns):
+            info = self.tiers[tier]
+            bucket = int(math.floor(when / self.steps[tier]))
+            if bucket <= info['last']:
+                if bucket < info['last']:
+                    info['dropped'] = int(info['dropped']) + 1
+                    dropped = dropped + 1
+                # else downsampled: the bucket has its sample
+                continue
+            slot = int(info['head'])
+            columns['time'][slot] = when
+            columns['norad'][slot] = norad
+            for (name, _dtype), value in zip(TELEMETRY_COLUMNS[2:], values):
+                columns[name][slot] = value
+            # the row is complete before readers can see it
+            info['head'] = (slot + 1) % self.capacities[tier]
+            info['count'] = min(int(info['count']) + 1,
+                                self.capacities[tier])
+            info['last'] = bucket
+        return dropped
+
+    def segments(self, tier):
+        """Returns the (first, end) slot ranges of a tier, oldest first"""
+        head = int(self.tiers[tier]['head'])
+        count = int(self.tiers[tier]['count'])
+        if count < self.capacities[tier]:
+            return [(0, count)]
+        return [(head, self.capacities[tier]), (0, head)]
+
+    def oldest(self, tier):
+        """Returns the time of a tier's oldest sample, or None"""
+        first, end = self.segments(tier)[0]
+        if first == end:
+            return None
+        return float(self.columns[tier]['time'][first])
+
+    def spans(self):
+        """
+        Returns (step, samples, oldest, newest, dropped) for every tier
+        """
+        found = list()
+        for tier in range(len(self.columns)):
+            count = int(self.tiers[tier]['count'])
+            newest = None
+            if count:
+                slot = int(self.tiers[tier]['head']) - 1
+                newest = float(self.columns[tier]['time'][slot])
+            found.append((self.steps[tier], count, self.oldest(tier), newest,
+                          int(self.tiers[tier]['dropped'])))
+        return found
+
+    def pick(self, start, step=None):
+        """
+        Returns the finest tier, no finer than step seconds, that still
+        holds unix time start; else the one reaching furthest back
+        """
+        tiers = [k for k in range(len(self.columns))
+                 if step is None or self.steps[k] >= step]
+        if not tiers:
+            tiers = [len(self.columns) - 1]
+        reach = list()
+        for tier in tiers:
+            oldest = self.oldest(tier)
+            if oldest is not None and oldest <= start:
+                return tier
+            reach.append((math.inf if oldest is None else oldest, tier))
+        return min(reach)[1]
+
+    def query(self, start, end, norad=None, step=None):
+        """
+        Returns the samples from unix time start to end (of one NORAD id,
+        if given) as a dict of column arrays, plus the 'step' of the tier
+        they come from (see pick())
+        """
+        tier = self.pick(start, step)
+        columns = self.columns[tier]
+        ranges = list()
+        for first, end_slot in self.segments(tier):
+            times = columns['time'][first:end_slot]
+            lo = first + int(np.searchsorted(times, start, 'left'))
+            hi = first + int(np.searchsorted(times, end, 'right'))
+            if lo < hi:
+                ranges.append((lo, hi))
+        found = dict()
+        for name, dtype in TELEMETRY_COLUMNS:
+            found[name] = np.concatenate(
+                [columns[name][lo:hi] for lo, hi in ranges] +
+                [np.zeros(0, dtype=dtype)])
+        # the writer may have wrapped onto the oldest rows meanwhile
+        keep = (found['time'] >= start) & (found['time'] <= end)
+        if norad is not None:
+            keep = keep & (found['norad'] == norad)
+        if not keep.all():
+            found = dict((name, value[keep]) for name, value in found.items())
+        found['step'] = self.steps[tier]
+        return found
+
+    def close(self):
+        self.columns = list()
+        self.tiers = None
+        self.map = None
+
+class SatelliteBatch(object):
+    """
+    A set of satellites propagated together with a NumPy implementation of
+    near-earth SGP4 (WGS-72, as in Spacetrack Report #3). Every tick is one
+    pass of array math over the whole set. Deep-space objects (period of
+    225 minutes or more) are not covered by this model and fall back to
+    pyephem, one compute() call each. Altitudes are refracted like the
+    observer's (see refract()); against pyephem they agree to within 0.01
+    degrees down to the horizon, and ranges to within 0.2 km (see
+    tests/test_satellite_batch.py).
+    """
+    def __init__(self, tles):
+        if load_numpy() is None:
+            raise ValueError('Tracking many satellites requires numpy')
+        self.names = [k[0] for k in tles]
+        self.tles = list(tles)
+        count = len(tles)
+        elem = np.zeros((7, count))
+        epoch = np.zeros(count)
+        for idx, (_name, line1, line2) in enumerate(tles):
+            elem[:, idx], epoch[idx] = parse_elements(line1, line2)
+        self.epoch = epoch
+        ecco, argpo, inclo, mo, no_kozai, nodeo, bstar = elem
+        self.deep = (2 * np.pi / no_kozai) >= 225.0
+        self.deep_bodies = dict((idx, ephem.readtle(*tles[idx]))
+                                for idx in np.flatnonzero(self.deep))
+        self._init_sgp4(ecco, argpo, inclo, mo, no_kozai, nodeo, bstar)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _init_sgp4(self, ecco, argpo, inclo, mo, no_kozai, nodeo, bstar):
+        """Precomputes the per-satellite SGP4 constants (sgp4init)"""
+        x2o3 = 2.0 / 3.0
+        eccsq = ecco * ecco
+        omeosq = 1.0 - eccsq
+        rteosq = np.sqrt(omeosq)
+        cosio = np.cos(inclo)
+        cosio2 = cosio * cosio
+
+        # un-kozai the mean motion
+        ak = (SGP4_XKE / no_kozai) ** x2o3
+        d1 = 0.75 * SGP4_J2 * (3.0 * cosio2 - 1.0) / (rteosq * omeosq)
+        delta = d1 / (ak * ak)
+        adel = ak * (1.0 - delta * delta - delta *
+                     (1.0 / 3.0 + 134.0 * delta * delta / 81.0))
+        delta = d1 / (adel * adel)
+        no = no_kozai / (1.0 + delta)
+
+        ao = (SGP4_XKE / no) ** x2o3
+        sinio = np.sin(inclo)
+        po = ao * omeosq
+        con42 = 1.0 - 5.0 * cosio2
+        con41 = -con42 - cosio2 - cosio2
+        posq = po * po
+        rp = ao * (1.0 - ecco)
+
+        ss = 78.0 / SGP4_RADIUS + 1.0
+        qzms2t = ((120.0 - 78.0) / SGP4_RADIUS) ** 4
+        perige = (rp - 1.0) * SGP4_RADIUS
+        sfour = np.where(perige < 98.0, 20.0, perige - 78.0)
+        qzms24 = np.where(perige < 156.0,
+                          ((120.0 - sfour) / SGP4_RADIUS) ** 4, qzms2t)
+        sfour = np.where(perige < 156.0, sfour / SGP4_RADIUS + 1.0, ss)
+        isimp = rp < (220.0 / SGP4_RADIUS + 1.0)
+
+        pinvsq = 1.0 / posq
+        tsi = 1.0 / (ao - sfour)
+        eta = ao * ecco * tsi
+        etasq = eta * eta
+        eeta = ecco * eta
+        psisq = np.abs(1.0 - etasq)
+        coef = qzms24 * tsi ** 4
+        coef1 = coef / psisq ** 3.5
+        cc2 = coef1 * no * (ao * (1.0 + 1.5 * etasq + eeta * (4.0 + etasq)) +
+                            0.375 * SGP4_J2 * tsi / psisq * con41 *
+                            (8.0 + 3.0 * etasq * (8.0 + etasq)))
+        cc1 = bstar * cc2
+        big_ecc = ecco > 1.0e-4
+        safe_ecc = np.where(big_ecc, ecco, 1.0)
+        cc3 = np.where(big_ecc, -2.0 * coef * tsi * SGP4_J3OJ2 * no *
+                       sinio / safe_ecc, 0.0)
+        x1mth2 = 1.0 - cosio2
+        cc4 = 2.0 * no * coef1 * ao * omeosq * (
+            eta * (2.0 + 0.5 * etasq) + ecco * (0.5 + 2.0 * etasq) -
+            SGP4_J2 * tsi / (ao * psisq) * (
+                -3.0 * con41 * (1.0 - 2.0 * eeta + etasq * (1.5 - 0.5 * eeta)) +
+                0.75 * x1mth2 * (2.0 * etasq - eeta * (1.0 + etasq)) *
+                np.cos(2.0 * argpo)))
+        cc5 = 2.0 * coef1 * ao * omeosq * (1.0 + 2.75 * (etasq + eeta) +
+                                            eeta * etasq)
+        cosio4 = cosio2 * cosio2
+        temp1 = 1.5 * SGP4_J2 * pinvsq * no
+        temp2 = 0.5 * temp1 * SGP4_J2 * pinvsq
+        temp3 = -0.46875 * SGP4_J4 * pinvsq * pinvsq * no
+        mdot = (no + 0.5 * temp1 * rteosq * con41 + 0.0625 * temp2 * rteosq *
+                (13.0 - 78.0 * cosio2 + 137.0 * cosio4))
+        argpdot = (-0.5 * temp1 * con42 + 0.0625 * temp2 *
+                   (7.0 - 114.0 * cosio2 + 395.0 * cosio4) +
+                   temp3 * (3.0 - 36.0 * cosio2 + 49.0 * cosio4))
+        xhdot1 = -temp1 * cosio
+        nodedot = xhdot1 + (0.5 * temp2 * (4.0 - 19.0 * cosio2) +
+                            2.0 * temp3 * (3.0 - 7.0 * cosio2)) * cosio
+        safe_eeta = np.where(big_ecc, eeta, 1.0)
+        xmcof = np.where(big_ecc, -x2o3 * coef * bstar / safe_eeta, 0.0)
+        denom = np.where(np.abs(cosio + 1.0) > 1.5e-12, 1.0 + cosio, 1.5e-12)
+
+        cc1sq = cc1 * cc1
+        d2 = 4.0 * ao * tsi * cc1sq
+        temp = d2 * tsi * cc1 / 3.0
+        d3 = (17.0 * ao + sfour) * temp
+        d4 = 0.5 * temp * ao * tsi * (221.0 * ao + 31.0 * sfour) * cc1
+        simple = np.where(isimp, 0.0, 1.0)
+
+        self.k = {
+            'ecco': ecco, 'argpo': argpo, 'inclo': inclo, 'mo': mo,
+            'nodeo': nodeo, 'bstar': bstar, 'no': no, 'eta': eta,
+            'con41': con41, 'x1mth2': x1mth2, 'x7thm1': 7.0 * cosio2 - 1.0,
+            'cc1': cc1, 'cc4': cc4, 'cc5': cc5 * simple,
+            'mdot': mdot, 'argpdot': argpdot, 'nodedot': nodedot,
+            'omgcof': bstar * cc3 * np.cos(argpo) * simple,
+            'xmcof': xmcof * simple,
+            'nodecf': 3.5 * omeosq * xhdot1 * cc1,
+            't2cof': 1.5 * cc1,
+            'xlcof': -0.25 * SGP4_J3OJ2 * sinio * (3.0 + 5.0 * cosio) / denom,
+            'aycof': -0.5 * SGP4_J3OJ2 * sinio,
+            'delmo': (1.0 + eta * np.cos(mo)) ** 3,
+            'sinmao': np.sin(mo),
+            'd2': d2 * simple, 'd3': d3 * simple, 'd4': d4 * simple,
+            't3cof': (d2 + 2.0 * cc1sq) * simple,
+            't4cof': 0.25 * (3.0 * d3 + cc1 * (12.0 * d2 + 10.0 * cc1sq)) *
+                     simple,
+            't5cof': 0.2 * (3.0 * d4 + 12.0 * cc1 * d3 + 6.0 * d2 * d2 +
+                            15.0 * cc1sq * (2.0 * d2 + cc1sq)) * simple,
+        }
+
+    def propagate(self, jd):
+        """
+        Returns TEME position (km) and velocity (km/s) arrays of shape (n, 3)
+        at Julian date jd, which may be a scalar or an array of length n.
+        Rows for deep-space or decayed objects are NaN.
+        """
+        k = self.k
+        twopi = 2.0 * np.pi
+        t = (np.asarray(jd, dtype=float) - self.epoch) * 1440.0
+
+        xmdf = k['mo'] + k['mdot'] * t
+        argpdf = k['argpo'] + k['argpdot'] * t
+        nodedf = k['nodeo'] + k['nodedot'] * t
+        t2 = t * t
+        nodem = nodedf + k['nodecf'] * t2
+        delomg = k['omgcof'] * t
+        delm = k['xmcof'] * ((1.0 + k['eta'] * np.cos(xmdf)) ** 3 - k['delmo'])
+        mm = xmdf + delomg + delm
+        argpm = argpdf - delomg - delm
+        t3 = t2 * t
+        t4 = t3 * t
+        tempa = 1.0 - k['cc1'] * t - k['d2'] * t2 - k['d3'] * t3 - k['d4'] * t4
+        tempe = (k['bstar'] * k['cc4'] * t +
+                 k['bstar'] * k['cc5'] * (np.sin(mm) - k['sinmao']))
+        templ = (k['t2cof'] * t2 + k['t3cof'] * t3 +
+                 t4 * (k['t4cof'] + t * k['t5cof']))
+
+        am = (SGP4_XKE / k['no']) ** (2.0 / 3.0) * tempa * tempa
+        nm = SGP4_XKE / am ** 1.5
+        em = k['ecco'] - tempe
+        bad = (em >= 1.0) | (em < -0.001) | (am < 0.95) | self.deep
+        em = np.clip(em, 1.0e-6, 0.999)
+        am = np.where(am < 0.95, 0.95, am)
+
+        mm = mm + k['no'] * templ
+        xlm = mm + argpm + nodem
+        nodem = np.fmod(nodem, twopi)
+        argpm = np.fmod(argpm, twopi)
+        xlm = np.fmod(xlm, twopi)
+        mm = np.fmod(xlm - argpm - nodem, twopi)
+
+        inclm = k['inclo']
+        sinim = np.sin(inclm)
+        cosim = np.cos(inclm)
+
+        # long period periodics
+        axnl = em * np.cos(argpm)
+        temp = 1.0 / (am * (1.0 - em * em))
+        aynl = em * np.sin(argpm) + temp * k['aycof']
+        xl = mm + argpm + nodem + temp * k['xlcof'] * axnl
+
+        # solve kepler's equation
+        u = np.fmod(xl - nodem, twopi)
+        eo1 = u.copy()
+        for _k in range(10):
+            sineo1 = np.sin(eo1)
+            coseo1 = np.cos(eo1)
+            tem5 = ((u - aynl * coseo1 + axnl * sineo1 - eo1) /
+                    (1.0 - coseo1 * axnl - sineo1 * aynl))
+            tem5 = np.clip(tem5, -0.95, 0.95)
+            eo1 = eo1 + tem5
+            if np.all(np.abs(tem5) < 1.0e-12):
+                break
+        sineo1 = np.sin(eo1)
+        coseo1 = np.cos(eo1)
+
+        # short period preliminary quantities
+        ecose = axnl * coseo1 + aynl * sineo1
+        esine = axnl * sineo1 - aynl * coseo1
+        el2 = axnl * axnl + aynl * aynl
+        pl = am * (1.0 - el2)
+        bad = bad | (pl < 0.0)
+        pl = np.abs(pl)
+        rl = am * (1.0 - ecose)
+        rdotl = np.sqrt(am) * esine / rl
+        rvdotl = np.sqrt(pl) / rl
+        betal = np.sqrt(1.0 - el2)
+        temp = esine / (1.0 + betal)
+        sinu = am / rl * (sineo1 - aynl - axnl * temp)
+        cosu = am / rl * (coseo1 - axnl + aynl * temp)
+        su = np.arctan2(sinu, cosu)
+        sin2u = (cosu + cosu) * sinu
+        cos2u = 1.0 - 2.0 * sinu * sinu
+        temp = 1.0 / pl
+        temp1 = 0.5 * SGP4_J2 * temp
+        temp2 = temp1 * temp
+
+        # update for short period periodics
+        mrt = (rl * (1.0 - 1.5 * temp2 * betal * k['con41']) +
+               0.5 * temp1 * k['x1mth2'] * cos2u)
+        su = su - 0.25 * temp2 * k['x7thm1'] * sin2u
+        xnode = nodem + 1.5 * temp2 * cosim * sin2u
+        xinc = inclm + 1.5 * temp2 * cosim * sinim * cos2u
+        mvt = rdotl - nm * temp1 * k['x1mth2'] * sin2u / SGP4_XKE
+        rvdot = rvdotl + nm * temp1 * (k['x1mth2'] * cos2u +
+                                       1.5 * k['con41']) / SGP4_XKE
+        bad = bad | (mrt < 1.0)
+
+        # orientation vectors
+        sinsu = np.sin(su)
+        cossu = np.cos(su)
+        snod = np.sin(xnode)
+        cnod = np.cos(xnode)
+        sini = np.sin(xinc)
+        cosi = np.cos(xinc)
+        xmx = -snod * cosi
+        xmy = cnod * cosi
+        ux = xmx * sinsu + cnod * cossu
+        uy = xmy * sinsu + snod * cossu
+        uz = sini * sinsu
+        vx = xmx * cossu - cnod * sinsu
+        vy = xmy * cossu - snod * sinsu
+        vz = sini * cossu
+
+        vkmpersec = SGP4_RADIUS * SGP4_XKE / 60.0
+        pos = np.stack([ux, uy, uz], axis=-1) * (mrt * SGP4_RADIUS)[..., None]
+        vel = (np.stack([ux, uy, uz], axis=-1) * mvt[..., None] +
+               np.stack([vx, vy, vz], axis=-1) * rvdot[..., None]) * vkmpersec
+        pos[bad] = np.nan
+        vel[bad] = np.nan
+        return pos, vel
+
+    def subset(self, rows):
+        """
+        Returns a batch of just the given rows (repeats allowed), sharing
+        the precomputed SGP4 constants instead of parsing the TLEs again
+        """
+        rows = np.asarray(rows, dtype=int)
+        sub = SatelliteBatch.__new__(SatelliteBatch)
+        sub.names = [self.names[k] for k in rows]
+        sub.tles = [self.tles[k] for k in rows]
+        sub.epoch = self.epoch[rows]
+        sub.deep = self.deep[rows]
+        sub.deep_bodies = dict((new, self.deep_bodies[old])
+                               for new, old in enumerate(rows)
+                               if old in self.deep_bodies)
+        sub.k = dict((key, value[rows]) for key, value in self.k.items())
+        return sub
+
+    def observe(self, observer, when):
+        """
+        Computes sublat, sublong, elevation, az, alt and range for every
+        satellite at datetime 'when', as seen from a pyephem observer. Units
+        follow pyephem: radians for angles, meters for elevation and range.
+        Returns a dict of arrays.
+        """
+        jd = julian_date(when)
+        with np.errstate(all='ignore'):
+            pos, _vel = self.propagate(jd)
+            ret = teme_look_angles(pos, jd, observer.lat, observer.long,
+                                   observer.elev, observer.pressure,
+                                   observer.temp)
+        if self.deep_bodies:
+            observer = observer.copy()
+            observer.date = ephem.Date(when)
+        for idx, body in self.deep_bodies.items():
+            try:
+                body.compute(observer)
+            except ValueError:
+                # the element set is too far from its epoch
+                continue
+            ret['sublat'][idx] = body.sublat
+            ret['sublong'][idx] = body.sublong
+            ret['elevation'][idx] = body.elevation
+            ret['az'][idx] = body.az
+            ret['alt'][idx] = body.alt
+            ret['range'][idx] = body.range
+        return ret
+
+    def throughput(self, observer, duration=1.0):
+        """
+        Measures observe() throughput in satellites per second on the calling
+        thread (NumPy runs this single-threaded, so this is per core)
+        """
+        when = datetime.datetime.now(datetime.UTC)
+        ticks = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < duration:
+            self.observe(observer, when)
+            ticks = ticks + 1
+            elapsed = time.perf_counter() - start
+        return ticks * len(self) / elapsed
+
+class GroundGrid(object):
+    """
+    Many ground observers at once, e.g. a grid of sites for coverage
+    analysis. Positions are in the same units as Ground (radians and
+    meters). Look angles and pass windows for every site come out of
+    batched array math rather than one Ground per site. A single Ground is
+    the size-1 case. Altitudes, and the horizon they are held to, are
+    refracted like a pyephem observer's for pressure (mBar) and
+    temperature (C); the default of no pressure means geometric ones.
+    """
+    def __init__(self, latitude, longitude, elevation, horizon=0.0,
+                 pressure=0.0, temperature=15.0):
+        if load_numpy() is None:
+            raise ValueError('Ground grids require numpy')
+        self.lat = np.atleast_1d(np.asarray(latitude, dtype=float))
+        self.long = np.atleast_1d(np.asarray(longitude, dtype=float))
+        self.elev = np.broadcast_to(np.asarray(elevation, dtype=float),
+                                    self.lat.shape).copy()
+        if self.lat.shape != self.long.shape:
+            raise ValueError('Latitude and longitude arrays differ in size')
+        if np.any(np.abs(self.lat) > 90 * ephem.degree):
+            raise ValueError('Invalid latitude')
+        if np.any(np.abs(self.long) > 180 * ephem.degree):
+            raise ValueError('Invalid longitude')
+        if np.any((self.elev < 0) | (self.elev > 8848)):
+            raise ValueError('Invalid elevation')
+        self.horizon = horizon
+        self.pressure = pressure
+        self.temperature = temperature
+        # the geometric altitude of the horizon, which pass scans compare
+        # unrefracted samples against
+        self.geometric = horizon
+        if pressure > 0:
+            self.geometric = float(unrefract(horizon, pressure, temperature))
+        self.last_timing = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_ground(cls, ground):
+        observer = ground.observer
+        return cls([ground.latitude()], [ground.longitude()],
+                   [ground.elevation()], float(observer.horizon),
+                   observer.pressure, observer.temp)
+
+    def refracted(self, windows):
+        """Refracts the culmination altitude of pass windows from a scan"""
+        if self.pressure <= 0:
+            return windows
+        return [[k[:3] + (float(refract(k[3], self.pressure,
+                                         self.temperature)),) + k[4:]
+                 for k in found] for found in windows]
+
+    def observe(self, batch, when):
+        """
+        Returns az, alt, range and visible arrays of shape (satellites,
+        sites) for every satellite in a SatelliteBatch at datetime when
+        """
+        jd = julian_date(when)
+        with np.errstate(all='ignore'):
+            pos, _vel = batch.propagate(jd)
+            ecef = teme_to_ecef(pos, jd)
+            az, alt, rng = look_angles(ecef[:, None, :], self.lat, self.long,
+                                       self.elev)
+            alt = refract(alt, self.pressure, self.temperature)
+        return {'az': az, 'alt': alt, 'range': rng,
+                'visible': alt > self.horizon}
+
+    def passes(self, batch, start, duration, step=GRID_STEP, index=0):
+        """
+        Finds the passes of satellite index of a SatelliteBatch over every
+        site between ephem date start and start + duration days, sampling
+        every step seconds. Returns one list per site of next_pass()-style
+        tuples (rise_time, rise_az, max_time, max_alt, set_time, set_az);
+        rise and set are interpolated between samples, culmination is the
+        highest sample. A pass in progress at either end of the window is
+        clipped to it.
+        """
+        if batch.deep[index]:
+            raise ValueError('Deep-space satellites are not supported')
+        begin = time.perf_counter()
+        sites = len(self)
+        step_days = step / 86400.0
+        count = int(math.ceil(duration / step_days)) + 1
+        sub = SatelliteBatch([batch.tles[index]])
+        scan = PassScan(sites, self.geometric)
+        for first in range(0, count, GRID_CHUNK):
+            dates = start + step_days * np.arange(first,
+                                                  min(first + GRID_CHUNK,
+                                                      count))
+            jds = dates + 2415020.0
+            with np.errstate(all='ignore'):
+                pos, _vel = sub.propagate(jds)
+                ecef = teme_to_ecef(pos, jds)
+                az, alt, _rng = look_angles(ecef[:, None, :], self.lat,
+                                            self.long, self.elev)
+            scan.add(dates, az, alt)
+        found = self.refracted(scan.finish())
+        elapsed = time.perf_counter() - begin
+        self.last_timing = {'sites': sites, 'samples': count,
+                            'seconds': elapsed,
+                            'per_site': elapsed / max(1, sites)}
+        return found
+
+    def batch_passes(self, batch, start, duration, step=GRID_STEP, site=0):
+        """
+        Finds the passes of every satellite of a SatelliteBatch over one
+        site, like passes() with the roles swapped, so a week of passes of
+        thousands of satellites takes seconds rather than a pass search
+        each. The window is cut into spans of SCAN_SPAN seconds. One
+        propagation per span rules out the satellites whose ground track
+        can't come within a footprint (at apogee) of the site during it,
+        and only the rest are sampled every step seconds. Several spans
+        share each array operation, so small batches don't pay for one
+        call per span. Returns one list of windows per satellite;
+        deep-space satellites get none.
+        """
+        begin = time.perf_counter()
+        satellites = len(batch)
+        step_days = step / 86400.0
+        count = int(math.ceil(duration / step_days)) + 1
+        rows = max(1, int(SCAN_SPAN // step))
+        spans = max(1, SCAN_CHUNK // max(1, satellites))
+        lat = self.lat[site]
+        long = self.long[site]
+        elev = self.elev[site]
+        zenith = observer_ecef(lat, long, elev)
+        zenith = zenith / np.linalg.norm(zenith)
+        k = batch.k
+        axis = (SGP4_XKE / k['no']) ** (2.0 / 3.0)
+        apogee = (axis * (1.0 + k['ecco']) - 1.0) * SGP4_RADIUS
+        cos_nadir = np.minimum(SGP4_RADIUS * math.cos(self.geometric) /
+                               (SGP4_RADIUS + apogee), 1.0)
+        reach = np.arccos(cos_nadir) - self.geometric + OVERHEAD_MARGIN
+        # fastest the ground track can move (radians/s), at perigee
+        rate = (k['no'] / 60.0 * (1.0 + k['ecco']) ** 2 /
+                (1.0 - k['ecco'] * k['ecco']) ** 1.5 + EARTH_ROTATION)
+        scan = PassScan(satellites, self.geometric)
+        sampled = 0
+        for block in range(0, count, rows * spans):
+            firsts = np.arange(block, min(block + rows * spans, count), rows)
+            lasts = np.minimum(firsts + rows, count) - 1
+            # each span reaches back to the sample before it, so that no
+            # horizon crossing falls between two spans unseen
+            middle = start + step_days * (firsts + lasts - 1) / 2.0
+            half = (lasts - firsts + 1) * step / 2.0
+            jd = (middle + 2415020.0)[:, None]
+            with np.errstate(all='ignore'):
+                pos, _vel = batch.propagate(jd)
+                ecef = teme_to_ecef(pos, jd)
+                apart = np.arccos(np.clip(
+                    ecef @ zenith / np.linalg.norm(ecef, axis=-1), -1, 1))
+                near = apart - rate * half[:, None] <= reach
+            # sample every satellite left in every span in one propagation
+            dates = [start + step_days * np.arange(first, last + 1)
+                     for first, last in zip(firsts, lasts)]
+            cols = [np.flatnonzero(k) for k in near]
+            index = np.concatenate([np.tile(c, len(d))
+                                    for c, d in zip(cols, dates)])
+            if len(index):
+                jds = np.concatenate([np.repeat(d, len(c))
+                                      for c, d in zip(cols, dates)]) + 2415020.0
+                with np.errstate(all='ignore'):
+                    pos, _vel = batch.subset(index).propagate(jds)
+                    ecef = teme_to_ecef(pos, jds)
+                    az, alt, _rng = look_angles(ecef, lat, long, elev)
+                sampled = sampled + len(index)
+            offset = 0
+            for c, d in zip(cols, dates):
+                if not len(c):
+                    continue
+                size = len(c) * len(d)
+                scan.add(d, az[offset:offset + size].reshape(len(d), len(c)),
+                         alt[offset:offset + size].reshape(len(d), len(c)), c)
+                offset = offset + size
+        found = self.refracted(scan.finish())
+        elapsed = time.perf_counter() - begin
+        self.last_timing = {'satellites': satellites, 'samples': count,
+                            'sampled': sampled / max(1, satellites * count),
+                            'seconds': elapsed,
+                            'per_satellite': elapsed / max(1, satellites)}
+        return found
+
+class PassScan(object):
+    """
+    Finds pass windows in look angles sampled at fixed steps, with one
+    column per site (GroundGrid.passes) or per satellite
+    (GroundGrid.batch_passes). The samples arrive in chunks in time order,
+    so a long window is scanned in constant memory; passes still open at
+    the end of a chunk carry over to the next.
+    """
+    def __init__(self, columns, horizon):
+        self.horizon = horizon
+        self.found = [list() for _k in range(columns)]
+        self.open_rise = np.full(columns, np.nan)
+        self.open_rise_az = np.zeros(columns)
+        self.open_max = np.full(columns, -np.inf)
+        self.open_max_time = np.zeros(columns)
+        self.prev_date = None
+        self.prev_az = np.zeros(columns)
+        self.prev_alt = np.full(columns, -np.pi / 2)
+
+    def add(self, dates, az, alt, columns=None):
+        """
+        Scans the next chunk: ephem dates of shape (samples,) and az and
+        alt arrays of shape (samples, len(columns)), for the given columns
+        (default: all of them). Columns left out must be below the horizon
+        for the whole chunk and the sample before it.
+        """
+        if columns is None:
+            columns = np.arange(len(self.found))
+        found = self.found
+        open_rise = self.open_rise[columns]
+        open_rise_az = self.open_rise_az[columns]
+        open_max = self.open_max[columns]
+        open_max_time = self.open_max_time[columns]
+        if self.prev_date is not None:
+            dates = np.concatenate([[self.prev_date], dates])
+            az = np.concatenate([self.prev_az[None, columns], az])
+            alt = np.concatenate([self.prev_alt[None, columns], alt])
+        else:
+            # passes already in progress at the start
+            up = alt[0] > self.horizon
+            open_rise[up] = dates[0]
+            open_rise_az[up] = az[0][up]
+        above = alt > self.horizon
+        masked = np.where(above, alt, -np.inf)
+        seg_start = np.zeros(len(columns), dtype=int)
+
+        rows, cols = np.nonzero(above[1:] != above[:-1])
+        for row, col in sorted(zip(rows, cols), key=lambda k: (k[1], k[0])):
+            a0 = alt[row, col]
+            a1 = alt[row + 1, col]
+            frac = (self.horizon - a0) / (a1 - a0)
+            cross = dates[row] + frac * (dates[row + 1] - dates[row])
+            cross_az = az[row, col] + frac * (
+                (az[row + 1, col] - az[row, col] + math.pi) %
+                (2 * math.pi) - math.pi)
+            if a1 > a0:
+                open_rise[col] = cross
+                open_rise_az[col] = cross_az % (2 * math.pi)
+                open_max[col] = -np.inf
+                seg_start[col] = row + 1
+            else:
+                seg = masked[seg_start[col]:row + 1, col]
+                if len(seg) and seg.max() > open_max[col]:
+                    open_max[col] = seg.max()
+                    open_max_time[col] = dates[seg_start[col] + seg.argmax()]
+                if not np.isnan(open_rise[col]):
+                    found[columns[col]].append((
+                        ephem.Date(open_rise[col]), open_rise_az[col],
+                        ephem.Date(open_max_time[col]), open_max[col],
+                        ephem.Date(cross), cross_az % (2 * math.pi)))
+                open_rise[col] = np.nan
+                open_max[col] = -np.inf
+
+        # carry the running maximum of passes still open
+        still_open = ~np.isnan(open_rise)
+        rows_idx = np.arange(len(dates))[:, None]
+        tail = np.where(rows_idx >= seg_start[None, :], masked, -np.inf)
+        tail_max = tail.max(axis=0)
+        better = still_open & (tail_max > open_max)
+        self.open_rise[columns] = open_rise
+        self.open_rise_az[columns] = open_rise_az
+        self.open_max[columns] = np.where(better, tail_max, open_max)
+        self.open_max_time[columns] = np.where(
+            better, dates[tail.argmax(axis=0)], open_max_time)
+        self.prev_date = dates[-1]
+        self.prev_az[columns] = az[-1]
+        if len(columns) < len(found):
+            self.prev_alt.fill(-np.pi / 2)
+        self.prev_alt[columns] = alt[-1]
+
+    def finish(self):
+        """
+        Clips the passes still in progress to the last sample and returns
+        the windows, one list per column
+        """
+        for col in np.flatnonzero(~np.isnan(self.open_rise)):
+            self.found[col].append((ephem.Date(self.open_rise[col]),
+                                    self.open_rise_az[col],
+                                    ephem.Date(self.open_max_time[col]),
+                                    self.open_max[col],
+                                    ephem.Date(self.prev_date),
+                                    self.prev_az[col]))
+        return self.found
+
+class ConjunctionScreen(object):
+    """
+    Finds close approaches between the satellites of a SatelliteBatch. Work
+    is cut down in three stages:
+     - pairs whose perigee-apogee shells never come within the threshold
+       can't meet at all and are dropped from their orbital elements alone
+     - the survivors are propagated every step seconds. In all-pairs mode
+       their positions go into a uniform grid, and only objects in the same
+       or neighbouring cells are compared. Checking against one primary is
+       already linear, so there it is a plain distance check.
+     - each candidate is refined on a fine time grid around its closest
+       sample to get the time and distance of closest approach
+    Deep-space objects are outside the batch propagator and are skipped.
+    """
+    def __init__(self, batch, threshold=CONJ_THRESHOLD, step=CONJ_STEP,
+                 refine=CONJ_REFINE):
+        self.batch = batch
+        self.threshold = float(threshold)
+        self.step = float(step)
+        self.refine = float(refine)
+        self.last_timing = None
+        k = batch.k
+        axis = (SGP4_XKE / k['no']) ** (2.0 / 3.0) * SGP4_RADIUS
+        pad = self.threshold / 2.0 + CONJ_SHELL_MARGIN
+        # radii each object can reach, widened for the elements' drift
+        self.low = axis * (1.0 - k['ecco']) - pad
+        self.high = axis * (1.0 + k['ecco']) + pad
+        self.usable = ~batch.deep
+        with np.errstate(all='ignore'):
+            perigee_speed = np.sqrt(SGP4_MU * (2.0 / (axis * (1.0 - k['ecco'])) -
+                                               1.0 / axis))
+        fast = self.usable & np.isfinite(perigee_speed)
+        self.max_speed = float(np.max(np.where(fast, perigee_speed, 0.0),
+                                      initial=0.0))
+
+    def overlapping_pairs(self, rows):
+        """Counts the pairs among rows whose shells overlap"""
+        order = np.argsort(self.low[rows])
+        low = self.low[rows][order]
+        high = self.high[rows][order]
+        # the shells after i in order overlap it while they start below its top
+        ends = np.searchsorted(low, high, side='right')
+        return int(np.maximum(ends - np.arange(len(low)) - 1, 0).sum())
+
+    def screen(self, start, duration, primary=None):
+        """
+        Screens ephem date start to start + duration days. With a primary
+        row, only its approaches are found; otherwise every pair is checked.
+        Returns (tca, row_a, row_b, miss_km, speed_km_s) tuples by time;
+        self.last_timing holds the pruning counts and throughput.
+        """
+        begin = time.perf_counter()
+        count = len(self.batch)
+        usable = self.usable.copy()
+        if primary is not None:
+            if not usable[primary]:
+                raise ValueError('Deep-space satellites are not supported')
+            usable &= ((self.low <= self.high[primary]) &
+                       (self.low[primary] <= self.high))
+            usable[primary] = True
+            rows = np.flatnonzero(usable)
+            pairs_total = count - 1
+            pairs_kept = len(rows) - 1
+        else:
+            rows = np.flatnonzero(usable)
+            pairs_total = count * (count - 1) // 2
+            pairs_kept = self.overlapping_pairs(rows)
+        sub = self.batch.subset(rows)
+        low = self.low[rows]
+        high = self.high[rows]
+
+        steps = int(math.ceil(duration * 86400.0 / self.step)) + 1
+        step_days = self.step / 86400.0
+        # a pair within threshold between samples is at most half a step of
+        # relative motion further apart at the nearest sample
+        cell = self.threshold + self.max_speed * self.step
+        found = list()
+        checked = 0
+        chunk = max(1, CONJ_CHUNK // max(1, len(rows)))
+        for first in range(0, steps, chunk):
+            index = np.arange(first, min(first + chunk, steps))
+            jds = (start + step_days * index + 2415020.0)[:, None]
+            with np.errstate(all='ignore'):
+                pos, vel = sub.propagate(jds)
+            if primary is not None:
+                this = int(np.searchsorted(rows, primary))
+                cand_t, cand_a = np.nonzero(np.broadcast_to(
+                    np.arange(len(rows)) != this, (len(index), len(rows))))
+                cand_b = np.full(len(cand_a), this)
+            else:
+                cand_t, cand_a, cand_b = self.grid_pairs(pos, cell)
+                # the shells' test, now for the pairs that share a cell
+                keep = (low[cand_a] <= high[cand_b]) & (low[cand_b] <= high[cand_a])
+                cand_t = cand_t[keep]
+                cand_a = cand_a[keep]
+                cand_b = cand_b[keep]
+            checked = checked + len(cand_t)
+            with np.errstate(all='ignore'):
+                rel_pos = pos[cand_t, cand_a] - pos[cand_t, cand_b]
+                rel_vel = vel[cand_t, cand_a] - vel[cand_t, cand_b]
+                # relative motion is nearly straight over a step (both feel
+                # almost the same gravity), so the closest approach within
+                # half a step of this sample is found in closed form
+                shift = np.clip(-(rel_pos * rel_vel).sum(axis=-1) /
+                                (rel_vel * rel_vel).sum(axis=-1),
+                                -self.step / 2.0, self.step / 2.0)
+                closest = np.linalg.norm(rel_pos + rel_vel * shift[:, None],
+                                         axis=-1)
+            near = closest <= self.threshold + CONJ_SLACK
+            found.append((index[cand_t[near]], cand_a[near], cand_b[near],
+                          shift[near], closest[near]))
+
+        events = self.refine_events(sub, start, start + duration, found)
+        elapsed = time.perf_counter() - begin
+        self.last_timing = {
+            'objects': count, 'skipped_deep': int(self.batch.deep.sum()),
+            'propagated': len(rows), 'steps': steps,
+            'pairs': pairs_total, 'pairs_pruned': pairs_total - pairs_kept,
+            'screened': pairs_kept * steps, 'distance_checks': checked,
+            'candidates': sum(len(k[0]) for k in found),
+            'conjunctions': len(events), 'seconds': elapsed,
+            'pairs_per_second': pairs_kept * steps / max(elapsed, 1e-9)}
+        return [(tca, int(rows[a]), int(rows[b]), miss, speed)
+                for tca, a, b, miss, speed in events]
+
+    @staticmethod
+    def grid_pairs(pos, cell):
+        """
+        Returns (step, a, b) index arrays of every pair of objects in the
+        same or adjacent grid cells at the same step of pos (steps, n, 3)
+        """
+        step_idx, obj = np.nonzero(np.isfinite(pos).all(axis=-1))
+        empty = np.zeros(0, dtype=int)
+        if len(obj) == 0:
+            return empty, empty, empty
+        side = 1 << 16
+        coords = np.floor(pos[step_idx, obj] / cell).astype(np.int64) + side // 2
+        coords = np.clip(coords, 1, side - 2)
+        keys = ((step_idx.astype(np.int64) * side + coords[:, 0]) * side +
+                coords[:, 1]) * side + coords[:, 2]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        step_idx = step_idx[order]
+        obj = obj[order]
+        here = np.arange(len(keys))
+        # occupied cells, as runs of the sorted keys
+        cell_start = np.flatnonzero(np.diff(keys, prepend=-1))
+        cell_end = np.append(cell_start[1:], len(keys))
+        cells = keys[cell_start]
+        cell_of = np.repeat(np.arange(len(cells)), cell_end - cell_start)
+
+        out_t = list()
+        out_a = list()
+        out_b = list()
+        # the cell itself, then half of its 26 neighbours, so every pair is
+        # produced once
+        offsets = [(0, 0, 0)] + [k for k in itertools.product((-1, 0, 1),
+                                                               repeat=3)
+                                 if k > (0, 0, 0)]
+        for dx, dy, dz in offsets:
+            if (dx, dy, dz) == (0, 0, 0):
+                first = here + 1
+                last = cell_end[cell_of]
+            else:
+                other = cells + (dx * side + dy) * side + dz
+                match = np.minimum(np.searchsorted(cells, other),
+                                   len(cells) - 1)
+                hit = (cells[match] == other)[cell_of]
+                first = cell_start[match][cell_of]
+                last = np.where(hit, cell_end[match][cell_of], first)
+            counts = last - first
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            src = np.repeat(here, counts)
+            starts = np.cumsum(counts) - counts
+            dst = np.repeat(first, counts) + (np.arange(total) -
+                                              np.repeat(starts, counts))
+            out_t.append(step_idx[src])
+            out_a.append(obj[src])
+            out_b.append(obj[dst])
+        if not out_t:
+            return empty, empty, empty
+        return (np.concatenate(out_t), np.concatenate(out_a),
+                np.concatenate(out_b))
+
+    def refine_events(self, sub, start, end, found):
+        """
+        Collapses candidates flagged at consecutive steps into one event per
+        close approach and finds its time and distance of closest approach
+        on a grid of refine seconds, interpolated to the minimum
+        """
+        step_idx, row_a, row_b, shift, dist = [
+            np.concatenate([k[field] for k in found]) for field in range(5)]
+        if len(step_idx) == 0:
+            return list()
+        first = np.minimum(row_a, row_b)
+        second = np.maximum(row_a, row_b)
+        order = np.lexsort((step_idx, second, first))
+        first = first[order]
+        second = second[order]
+        step_idx = step_idx[order]
+        shift = shift[order]
+        dist = dist[order]
+        new_run = np.ones(len(order), dtype=bool)
+        new_run[1:] = ((first[1:] != first[:-1]) | (second[1:] != second[:-1]) |
+                       (step_idx[1:] != step_idx[:-1] + 1))
+        run = np.cumsum(new_run)
+        # the closest estimate of every run
+        best = np.lexsort((dist, run))
+        best = best[np.concatenate([[True], run[best][1:] != run[best][:-1]])]
+        first = first[best]
+        second = second[best]
+
+        centre = start + (step_idx[best] * self.step + shift[best]) / 86400.0
+        offsets = np.arange(-self.step / 2.0, self.step / 2.0 +
+                            self.refine / 2.0, self.refine)
+        jds = centre[None, :] + offsets[:, None] / 86400.0 + 2415020.0
+        with np.errstate(all='ignore'):
+            pos_a, vel_a = sub.subset(first).propagate(jds)
+            pos_b, vel_b = sub.subset(second).propagate(jds)
+            miss = np.linalg.norm(pos_a - pos_b, axis=-1)
+        miss = np.where(np.isfinite(miss), miss, np.inf)
+        cols = np.arange(len(centre))
+        low = np.clip(miss.argmin(axis=0), 1, len(offsets) - 2)
+        # parabola through the closest sample and its neighbours
+        d0 = miss[low - 1, cols]
+        d1 = miss[low, cols]
+        d2 = miss[low + 1, cols]
+        with np.errstate(all='ignore'):
+            curve = d0 - 2.0 * d1 + d2
+            frac = np.where(curve > 0, 0.5 * (d0 - d2) / curve, 0.0)
+        frac = np.clip(np.nan_to_num(frac), -1.0, 1.0)
+        dmin = np.maximum(np.minimum(d1 - 0.25 * (d0 - d2) * frac,
+                                     miss.min(axis=0)), 0.0)
+        tca = centre + (offsets[low] + frac * self.refine) / 86400.0
+        speed = np.linalg.norm(vel_a[low, cols] - vel_b[low, cols], axis=-1)
+        keep = np.flatnonzero((dmin <= self.threshold) & (tca >= start) &
+                              (tca <= end))
+        return sorted((ephem.Date(tca[k]), int(first[k]), int(second[k]),
+                       float(dmin[k]), float(speed[k])) for k in keep)
+
+class TleFetcher(object):
+    """
+    Downloads CelesTrak groups concurrently. Each worker thread keeps one
+    persistent HTTP connection per host. Requests are conditional
+    (ETag/If-Modified-Since), so unchanged groups cost one round trip and
+    are served from the copy saved last time. Bodies are parsed as they
+    stream in.
+    """
+    def __init__(self, url_format=TLE_URL_FORMAT, cache_dir=None,
+                 meta_file=None, workers=TLE_FETCH_WORKERS):
+        self.url_format = url_format
+        self.cache_dir = TLE_GROUPS_DIR if cache_dir is None else cache_dir
+        self.meta_file = TLE_META_FILE if meta_file is None else meta_file
+        meta_file = self.meta_file
+        self.workers = workers
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.pool = None
+        try:
+            with open(meta_file, 'r') as fname:
+                self.meta = json.load(fname)
+        except (IOError, ValueError):
+            self.meta = dict()
+
+    def group_file(self, group):
+        return os.path.join(self.cache_dir, group + '.txt')
+
+    def connection(self, url):
+        """Returns this thread's connection to url's host, opening it once"""
+        import http.client
+        import urllib.parse
+        parts = urllib.parse.urlsplit(url)
+        conns = getattr(self.local, 'conns', None)
+        if conns is None:
+            conns = self.local.conns = dict()
+        key = (parts.scheme, parts.netloc)
+        conn = conns.get(key)
+        if conn is None:
+            if parts.scheme == 'https':
+                conn = http.client.HTTPSConnection(parts.netloc, timeout=30)
+            else:
+                conn = http.client.HTTPConnection(parts.netloc, timeout=30)
+            conns[key] = conn
+        return conn
+
+    def request(self, url, headers):
+        """Sends a GET on a pooled connection, retrying once if it went stale"""
+        import http.client
+        import urllib.parse
+        from urllib.error import URLError
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        for attempt in range(2):
+            conn = self.connection(url)
+            try:
+                conn.request('GET', path, headers=headers)
+                return conn.getresponse()
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if attempt == 1:
+                    raise URLError(e)
+
+    def fetch(self, group):
+        """
+        Fetches one group into its cache file. Returns the HTTP status, 200
+        for new data or 304 if the saved copy is still current. A 304 is
+        only believed while the saved copy exists; if it is gone, the group
+        is fetched again without validators.
+        @throws ValueError, URLError, IOError
+        """
+        url = self.url_format.format(group)
+        for attempt in range(2):
+            with self.lock:
+                meta = dict(self.meta.get(group, dict()))
+            headers = {'Accept-Encoding': 'identity'}
+            if attempt == 0 and os.path.exists(self.group_file(group)):
+                if 'etag' in meta:
+                    headers['If-None-Match'] = meta['etag']
+                if 'last_modified' in meta:
+                    headers['If-Modified-Since'] = meta['last_modified']
+            response = self.request(url, headers)
+            status = response.status
+            if status != 304:
+                break
+            response.read()
+            if os.path.exists(self.group_file(group)):
+                return status
+            # the saved copy went missing, so it's a cache miss after all
+            with self.lock:
+                self.meta.pop(group, None)
+        else:
+            raise ValueError('Group %s is unchanged, but its saved copy is '
+                             'missing' % group)
+        if status != 200:
+            response.read()
+            if 300 <= status < 400:
+                raise ValueError('URL was redirected')
+            raise ValueError('Could not update TLE: status was %d' % status)
+
+        # stream the body straight into the group's cache file
+        tmp_file = self.group_file(group) + '.tmp'
+        count = 0
+        with open(tmp_file, 'w') as fname:
+            for entry in parse_tle_stream(response):
+                fname.write('\n'.join(entry) + '\n')
+                count = count + 1
+        # iterating stops at the end of the body without closing the
+        # response, which the connection needs before its next request
+        response.read()
+        if count == 0:
+            os.remove(tmp_file)
+            raise ValueError('No TLEs in group %s' % group)
+        os.replace(tmp_file, self.group_file(group))
+
+        meta = dict()
+        if response.getheader('ETag'):
+            meta['etag'] = response.getheader('ETag')
+        if response.getheader('Last-Modified'):
+            meta['last_modified'] = response.getheader('Last-Modified')
+        with self.lock:
+            self.meta[group] = meta
+        return status
+
+    def update(self, groups, tle_file):
+        """
+        Fetches every group concurrently, then merges them (deduplicated by
+        NORAD id, earlier groups winning) into tle_file with a write and
+        rename, so readers never see a partial file. Returns a dict of
+        group to HTTP status.
+        @throws ValueError, URLError, IOError if any group could not be
+        fetched or saved
+        """
+        if not os.path.isdir(self.cache_dir):
+            os.mkdir(self.cache_dir)
+        futures = [(group, self.executor().submit(self.fetch, group))
+                   for group in groups]
+        statuses = dict((group, future.result())
+                        for group, future in futures)
+        self.merge(groups, tle_file)
+        return statuses
+
+    async def update_async(self, groups, tle_file):
+        """
+        update() for the event loop: the fetches run on the pool and are
+        awaited together, so the loop is never blocked on the network
+        @throws ValueError, URLError, IOError if any group could not be
+        fetched or saved
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if not os.path.isdir(self.cache_dir):
+            os.mkdir(self.cache_dir)
+        results = await asyncio.gather(*[
+            loop.run_in_executor(self.executor(), self.fetch, group)
+            for group in groups])
+        await loop.run_in_executor(self.executor(), self.merge, groups,
+                                   tle_file)
+        return dict(zip(groups, results))
+
+    def executor(self):
+        """Returns the fetcher's thread pool, starting it on first use"""
+        if self.pool is None:
+            import concurrent.futures
+            # kept for the fetcher's lifetime so its threads' connections
+            # are reused by later updates
+            self.pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='tle-fetch')
+        return self.pool
+
+    def close(self):
+        """Stops the thread pool once any fetch in progress is done"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def merge(self, groups, tle_file):
+        """
+        Merges the saved groups into tle_file and saves the validators used
+        for the next conditional requests
+        """
+        tmp_file = tle_file + '.tmp'
+        seen = set()
+        with open(tmp_file, 'w') as out:
+            for group in groups:
+                with open(self.group_file(group), 'r') as fname:
+                    for entry in parse_tle_stream(fname):
+                        norad = entry[1][2:7].strip()
+                        if norad not in seen:
+                            seen.add(norad)
+                            out.write('\n'.join(entry) + '\n')
+        os.replace(tmp_file, tle_file)
+
+        tmp_file = self.meta_file + '.tmp'
+        with open(tmp_file, 'w') as fname:
+            json.dump(self.meta, fname)
+        os.replace(tmp_file, self.meta_file)
+
+class StdoutSink(object):
+    """Prints notifications"""
+    name = 'stdout'
+
+    def __str__(self):
+        return self.name
+
+    def send(self, message):
+        print(message['text'])
+        for line in message['body']:
+            print('  ' + line)
+
+    def close(self):
+        pass
+
+class DbusSink(object):
+    """
+    Shows notifications on the desktop. The session bus connection is opened
+    once and reopened only after it fails.
+    """
+    name = 'dbus'
+
+    def __init__(self):
+        if load_dbus() is None:
+            raise ValueError('The dbus sink requires the dbus module')
+        self.interface = None
+
+    def __str__(self):
+        return self.name
+
+    def send(self, message):
+        """@throws dbus.DBusException"""
+        if self.interface is None:
+            _bus_name = 'org.freedesktop.Notifications'
+            _object_path = '/org/freedesktop/Notifications'
+            obj = dbus.SessionBus().get_object(_bus_name, _object_path)
+            self.interface = dbus.Interface(obj, _bus_name)
+        try:
+            self.interface.Notify('satTracker', 0, '', message['text'],
+                                  '\n'.join(message['body']), [], dict(),
+                                  3000)
+        except dbus.DBusException:
+            self.interface = None
+            raise
+
+    def close(self):
+        self.interface = None
+
+class JsonLogSink(object):
+    """Appends notifications to a file, one JSON object per line"""
+    name = 'log'
+
+    def __init__(self, path=None):
+        self.path = ALERT_LOG_FILE if path is None else path
+        self.fname = None
+
+    def __str__(self):
+        return '%s %s' % (self.name, self.path)
+
+    def send(self, message):
+        if self.fname is None:
+            self.fname = open(self.path, 'a')
+        self.fname.write(json.dumps(message) + '\n')
+        self.fname.flush()
+
+    def close(self):
+        if self.fname is not None:
+            self.fname.close()
+            self.fname = None
+
+class WebhookSink(object):
+    """
+    POSTs notifications as JSON to a URL, e.g. a local home automation
+    server, over one persistent HTTP connection
+    """
+    name = 'webhook'
+
+    def __init__(self, url):
+        import urllib.parse
+        self.url = url
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ValueError('Invalid webhook URL: %s' % url)
+        self.parts = parts
+        self.conn = None
+
+    def __str__(self):
+        return '%s %s' % (self.name, self.url)
+
+    def send(self, message):
+        """@throws URLError"""
+        import http.client
+        from urllib.error import URLError
+        path = self.parts.path or '/'
+        if self.parts.query:
+            path = path + '?' + self.parts.query
+        body = json.dumps(message).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        for attempt in range(2):
+            if self.conn is None:
+                if self.parts.scheme == 'https':
+                    self.conn = http.client.HTTPSConnection(self.parts.netloc,
+                                                            timeout=10)
+                else:
+                    self.conn = http.client.HTTPConnection(self.parts.netloc,
+                                                           timeout=10)
+            try:
+                self.conn.request('POST', path, body, headers)
+                response = self.conn.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                # the server may have closed an idle connection
+                self.close()
+                if attempt == 1:
+                    raise URLError(e)
+        if response.status >= 300:
+            raise URLError('Webhook returned status %d' % response.status)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class Notifier(object):
+    """
+    Delivers alerts to pluggable sinks (see make_sink()). On the event loop,
+    alerts wait in a bounded queue for one delivery task; alerts arriving
+    within NOTIFY_COALESCE seconds of each other are sent as one
+    notification, so a burst of passes starting together costs one message
+    per sink. The sinks run on a worker thread and never block the loop.
+    When the queue is full, new alerts are dropped and counted.
+    """
+    def __init__(self, sinks, window=NOTIFY_COALESCE, size=NOTIFY_QUEUE_SIZE,
+                 batch=NOTIFY_BATCH):
+        self.sinks = sinks
+        self.window = window
+        self.size = size
+        self.batch = batch
+        self.queue = None
+        self.task = None
+        self.posted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self):
+        """Starts the delivery task on the running event loop"""
+        import asyncio
+        self.queue = asyncio.Queue(self.size)
+        self.task = spawn(self.run(), 'notifier')
+
+    def post(self, text):
+        """Queues an alert, or delivers it at once outside the event loop"""
+        alert = {'time': datetime.datetime.fromtimestamp(
+            int(clock_time()), datetime.UTC).isoformat(), 'text': text}
+        self.posted = self.posted + 1
+        if self.queue is None:
+            self.deliver([alert])
+            return
+        if self.queue.full():
+            self.dropped = self.dropped + 1
+            metrics.count('notify.dropped')
+            return
+        self.queue.put_nowait(alert)
+
+    async def run(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self.deliver, batch)
+            finally:
+                for _alert in batch:
+                    self.queue.task_done()
+
+    @staticmethod
+    def coalesce(batch):
+        """Returns one notification for a batch of alerts"""
+        if len(batch) == 1:
+            return {'time': batch[0]['time'], 'text': batch[0]['text'],
+                    'body': [], 'count': 1}
+        return {'time': batch[-1]['time'],
+                'text': '%d satTracker alerts' % len(batch),
+                'body': [k['text'] for k in batch], 'count': len(batch)}
+
+    def deliver(self, batch):
+        """
+        Sends a batch of alerts to every sink. If no sink could take it,
+        the alerts are printed instead.
+        """
+        start = metrics.start()
+        message = self.coalesce(batch)
+        delivered = False
+        for sink in self.sinks:
+            try:
+                sink.send(message)
+                delivered = True
+            except Exception as e:
+                self.failed = self.failed + 1
+                metrics.count('notify.failed')
+                print('Unable to notify %s: %s' % (sink, e), file=sys.stderr)
+        if not delivered:
+            StdoutSink().send(message)
+        self.sent = self.sent + 1
+        metrics.count('notify.coalesced', len(batch) - 1)
+        metrics.stop('notify', start)
+
+    async def close(self, timeout=SHUTDOWN_TIMEOUT):
+        """
+        Waits up to timeout seconds for queued alerts to be delivered, then
+        stops the delivery task and closes the sinks
+        """
+        import asyncio
+        if self.task is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+        self.queue = None
+        for sink in self.sinks:
+            sink.close()
+
+class QueryServer(object):
+    """
+    Local HTTP/JSON API for dashboards and scripts: GET /now, /passes,
+    /catalog and /stats (see serve_command()). Every client shares the
+    catalog and its bodies, the pass cache and the ground station, and whole
+    responses are kept by (endpoint, satellite, second) in an LRU of size
+    responses, so the same question asked again within a second costs a
+    dict lookup. Connections are kept alive and served on the event loop;
+    only pass searches run on worker threads (see search()), on copies of
+    the body and observer, so nothing else here needs a lock.
+    """
+    def __init__(self, size=SERVER_CACHE_SIZE):
+        self.size = size
+        self.responses = collections.OrderedDict()
+        # query string to catalog index, for the catalog in self.catalog
+        self.resolved = dict()
+        self.catalog = None
+        self.server = None
+        self.default = None
+        self.requests = 0
+        self.hits = 0
+        self.errors = 0
+        self.connections = 0
+        self.started = time.time()
+        self.endpoints = {'/now': self.now, '/passes': self.passes,
+                          '/catalog': self.listing, '/stats': self.stats}
+
+    async def start(self, host, port):
+        """Listens on host:port. Returns the address actually bound."""
+        import asyncio
+        try:
+            self.default = get_current()[0]
+        except (IOError, IndexError):
+            self.default = ISS_FULL_NAME
+        self.started = time.time()
+        self.server = await asyncio.start_server(self.serve, host, port)
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.server = None
+
+    async def serve(self, reader, writer):
+        """Answers one connection's requests until it closes"""
+        import asyncio
+        self.connections = self.connections + 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                parts = lines[0].split(' ')
+                keep_alive = parts[-1] == 'HTTP/1.1'
+                length = 0
+                for line in lines[1:]:
+                    name, _sep, value = line.partition(':')
+                    name = name.strip().lower()
+                    if name == 'connection':
+                        keep_alive = value.strip().lower() != 'close'
+                    elif name == 'content-length':
+                        try:
+                            length = int(value)
+                        except ValueError:
+                            length = -1
+                    elif name == 'transfer-encoding':
+                        length = -1
+                if 0 < length <= SERVER_MAX_BODY:
+                    # nothing here takes a body, but the next request
+                    # starts after it
+                    try:
+                        await reader.readexactly(length)
+                    except asyncio.IncompleteReadError:
+                        break
+                elif length != 0:
+                    # can't tell where the next request starts
+                    keep_alive = False
+                if len(parts) != 3:
+                    status, body = self.error(400, 'Malformed request')
+                    keep_alive = False
+                elif parts[0] != 'GET':
+                    status, body = self.error(405, 'Only GET is supported')
+                else:
+                    status, body = await self.respond(parts[1])
+                writer.write(b'HTTP/1.1 %d %s\r\n'
+                             b'Content-Type: application/json\r\n'
+                             b'Content-Length: %d\r\n'
+                             b'Connection: %s\r\n\r\n' % (
+                                 status, HTTP_REASONS[status], len(body),
+                                 b'keep-alive' if keep_alive else b'close'))
+                writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections = self.connections - 1
+            writer.close()
+
+    async def respond(self, target):
+        """Returns (status, JSON body) for a GET of target"""
+        import asyncio
+        import urllib.parse
+        self.requests = self.requests + 1
+        path, _sep, query = target.partition('?')
+        endpoint = self.endpoints.get(path)
+        if endpoint is None:
+            return self.error(404, 'No such endpoint: %s' % path)
+        try:
+            body = endpoint(dict(urllib.parse.parse_qsl(query)))
+            if asyncio.iscoroutine(body):
+                body = await body
+            return (200, body)
+        except LookupError as e:
+            return self.error(404, str(e))
+        except ValueError as e:
+            return self.error(400, str(e))
+
+    def error(self, status, text):
+        self.errors = self.errors + 1
+        return (status, json.dumps({'error': text}).encode('utf-8'))
+
+    def cached(self, key, build):
+        """Returns the response body for key, calling build() to make it"""
+        body = self.responses.get(key)
+        if body is not None:
+            self.hits = self.hits + 1
+            self.responses.move_to_end(key)
+            return body
+        body = json.dumps(build()).encode('utf-8')
+        self.responses[key] = body
+        while len(self.responses) > self.size:
+            self.responses.popitem(last=False)
+        return body
+
+    def refresh(self):
+        """Returns the catalog, forgetting every response if it changed"""
+        cat = get_catalog()
+        if cat is not self.catalog:
+            # the TLE file changed, so everything worked out from it is stale
+            self.catalog = cat
+            self.resolved.clear()
+            self.responses.clear()
+        return cat
+
+    def satellite(self, params):
+        """
+        Returns the catalog index asked for by params['sat'] (default: the
+        satellite last chosen at the prompt)
+        @throws LookupError
+        """
+        cat = self.refresh()
+        query = params.get('sat', self.default)
+        idx = self.resolved.get(query)
+        if idx is None:
+            idx = cat.find(query)
+            if idx is None:
+                raise LookupError('Unable to find a satellite named "%s"' %
+                                  query)
+            if len(self.resolved) >= self.size:
+                self.resolved.clear()
+            self.resolved[query] = idx
+        return idx
+
+    @staticmethod
+    def second(params):
+        """
+        Returns the whole unix second asked for by params['time'], either
+        unix seconds or a UTC time like '2024/1/1 12:00' (default: now)
+        @throws ValueError
+        """
+        text = params.get('time')
+        if text is None:
+            return int(time.time())
+        try:
+            value = float(text)
+        except ValueError:
+            value = None
+        if value is not None:
+            if not math.isfinite(value) or abs(value) > 1e12:
+                raise ValueError('time must be a finite number of seconds')
+            return int(value)
+        return int(math.floor((ephem.Date(text) - UNIX_EPOCH) * 86400.0 +
+                              0.5))
+
+    @staticmethod
+    def date(second):
+        return ephem.Date(UNIX_EPOCH + second / 86400.0)
+
+    @staticmethod
+    def windows(body, observer, when, count):
+        """Returns up to count pass windows of body from ephem date when"""
+        cache = get_pass_cache()
+        found = list()
+        try:
+            while len(found) < count:
+                window = cache.next_pass(body, observer, when)
+                found.append(window)
+                when = ephem.Date(window[4] + ephem.second)
+        except ValueError:
+            pass # never passes (again)
+        return found
+
+    async def search(self, idx, second, count):
+        """
+        Fills the pass cache for count passes of satellite idx from second on
+        a worker thread, so a search never holds up other connections. The
+        response is then built on the loop from cache hits. The worker reads
+        its own body from the TLE: the shared one is computed on the loop,
+        and pyephem's copy() of a satellite shares its propagator state.
+        """
+        import asyncio
+        cat = self.catalog
+        observer = grnd.observer.copy()
+        await asyncio.to_thread(lambda: self.windows(
+            ephem.readtle(*cat.tle(idx)), observer, self.date(second), count))
+
+    async def now(self, params):
+        idx = self.satellite(params)
+        second = self.second(params)
+        if ('now', idx, second) not in self.responses:
+            await self.search(idx, second, 1)
+            idx = self.satellite(params) # the catalog may have changed
+        return self.cached(('now', idx, second), lambda: position_doc(
+            self.catalog.body(idx), self.date(second)))
+
+    async def passes(self, params):
+        idx = self.satellite(params)
+        second = self.second(params)
+        try:
+            count = int(params.get('count', 5))
+        except ValueError:
+            raise ValueError('count must be a number')
+        count = min(max(count, 1), SERVER_MAX_PASSES)
+        if ('passes', idx, second, count) not in self.responses:
+            await self.search(idx, second, count)
+            idx = self.satellite(params) # the catalog may have changed
+
+        def build():
+            body = self.catalog.body(idx)
+            found = self.windows(body, grnd.observer, self.date(second),
+                                 count)
+            return {'name': body.name,
+                    'passes': [pass_doc(body, k) for k in found]}
+        return self.cached(('passes', idx, second, count), build)
+
+    def listing(self, params):
+        cat = self.refresh()
+        query = params.get('q', '')
+        try:
+            limit = int(params.get('limit', 100))
+        except ValueError:
+            raise ValueError('limit must be a number')
+
+        def build():
+            found = range(len(cat)) if query == '' else cat.search(query)
+            return [{'name': cat.name(k), 'norad': cat.norad(k)}
+                    for k in itertools.islice(found, max(0, limit))]
+        return self.cached(('catalog', query, limit), build)
+
+    def stats(self, params):
+        uptime = max(time.time() - self.started, 1e-9)
+        return json.dumps({
+            'requests': self.requests, 'cache_hits': self.hits,
+            'hit_rate': round(self.hits / max(1, self.requests), 4),
+            'errors': self.errors, 'cached': len(self.responses),
+            'connections': self.connections, 'uptime': round(uptime, 1),
+            'requests_per_second': round(self.requests / uptime, 1),
+        }).encode('utf-8')
+
+class Screen(object):
+    """
+    A terminal drawn with ANSI cursor addressing. A frame is a list of rows,
+    each a list of (column, width, color, text) cells. draw() writes only
+    the characters that differ from the last frame, in one write, and
+    blanks cells that are gone, so a steady display costs a few bytes a
+    frame and never flickers. Frames, bytes written and CPU time are counted.
+    """
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.cells = dict()
+        self.size = None
+        self.frames = 0
+        self.written = 0
+        self.cpu = 0.0
+
+    def terminal_size(self):
+        try:
+            return os.get_terminal_size(self.out.fileno())
+        except (AttributeError, OSError, ValueError):
+            return os.terminal_size((80, 24))
+
+    def open(self):
+        """Hides the cursor; the first draw() clears the screen"""
+        self.write('\033[?25l')
+        self.size = None
+
+    def close(self):
+        """Puts the cursor back below the last frame"""
+        rows = [k[0] for k in self.cells]
+        self.write('\033[%d;1H\033[?25h\n' % (max(rows, default=0) + 1))
+        self.cells.clear()
+
+    def write(self, data):
+        self.out.write(data)
+        self.out.flush()
+        self.written = self.written + len(data.encode('utf-8'))
+
+    def draw(self, frame):
+        start = time.process_time()
+        size = self.terminal_size()
+        parts = list()
+        if size != self.size:
+            # resized (or the first frame), so everything is redrawn
+            parts.append('\033[H\033[2J')
+            self.cells.clear()
+            self.size = size
+        seen = set()
+        for row, cells in enumerate(frame[:size.lines - 1]):
+            for col, width, color, text in cells:
+                width = min(width, size.columns - col)
+                if width <= 0:
+                    continue
+                key = (row, col)
+                text = text[:width].ljust(width)
+                value = (width, color, text)
+                seen.add(key)
+                old = self.cells.get(key)
+                if old == value:
+                    continue
+                self.cells[key] = value
+                first = 0
+                last = width
+                if old is not None and old[:2] == value[:2]:
+                    # only the characters that changed, e.g. a last digit
+                    while old[2][first] == text[first]:
+                        first = first + 1
+                    while old[2][last - 1] == text[last - 1]:
+                        last = last - 1
+                parts.append('\033[%d;%dH%s%s%s' % (
+                    row + 1, col + first + 1, color, text[first:last],
+                    COL_NORMAL if color else ''))
+        for key in [k for k in self.cells if k not in seen]:
+            width = self.cells.pop(key)[0]
+            parts.append('\033[%d;%dH%s' % (key[0] + 1, key[1] + 1,
+                                             ' ' * width))
+        if parts:
+            self.write(''.join(parts))
+        self.frames = self.frames + 1
+        self.cpu = self.cpu + time.process_time() - start
+
+    def stats(self):
+        """Returns (frames, bytes per frame, CPU seconds per frame)"""
+        frames = max(1, self.frames)
+        return (self.frames, self.written / frames, self.cpu / frames)
+
+class Dashboard(object):
+    """
+    Live view of the tracked satellite, and of every satellite followed
+    with `track add`, redrawn a few times a second on a Screen
+    """
+    def __init__(self, table=False, screen=None):
+        self.table = table
+        self.screen = Screen() if screen is None else screen
+        self.rate = DASH_RATE
+        self.build_cpu = 0.0
+
+    def frame(self):
+        """Returns the cells of one frame at the tracked time"""
+        report = sat_report()
+        u_time = p_time.replace(microsecond=0, tzinfo=None)
+        l_time = ephem.localtime(ephem.Date(u_time)).replace(microsecond=0)
+        rows = [[(0, 12, COL_CYAN, 'satTracker'),
+                 (12, 20, COL_YELLOW, str(l_time)),
+                 (32, 11, '', 'local time'),
+                 (44, 20, COL_YELLOW, str(u_time)), (64, 3, '', 'UTC')],
+                [],
+                [(0, 40, COL_WHITE, report['name'])]]
+        fields = [('lat:', COL_GREEN, report['lat']),
+                  ('long:', COL_GREEN, report['long']),
+                  ('azimuth:', '', report['az']),
+                  ('altitude:', COL_GREEN if report['alt'] > 0 else '',
+                   report['alt']),
+                  ('elevation:', '', '%.0f m' % report['elevation'])]
+        for label, color, value in fields:
+            rows.append([(0, 14, '', label), (14, 20, color, str(value))])
+        if report['aos'] is None:
+            rows.append([(0, 40, COL_PURPLE, 'This satellite will never pass')])
+        else:
+            rows.append([(0, 14, '', 'next pass at'),
+                         (14, 20, COL_YELLOW, str(report['aos'])),
+                         (34, 30, '', report['suffix'])])
+            rows.append([(0, 14, '', 'end time:'),
+                         (14, 20, COL_YELLOW, str(report['los']))])
+        if self.table:
+            rows.append([])
+            rows.extend(self.table_rows())
+        return rows
+
+    def table_rows(self):
+        """Returns rows for every tracked satellite"""
+        if tracked is None:
+            return [[(0, 60, COL_GREY,
+                      'No satellites are being tracked. Use `track add`.')]]
+        update_tracked()
+        state = tracked_state
+        header = [(0, 24, COL_WHITE, 'name')] + [
+            (col, width, COL_WHITE, text.rjust(width)) for col, width, text in
+            ((25, 9, 'lat'), (35, 10, 'long'), (46, 8, 'az'), (55, 8, 'alt'),
+             (64, 10, 'range (km)'))]
+        rows = [header]
+        for idx, name in enumerate(tracked.names):
+            color = COL_GREEN if state['alt'][idx] > 0 else ''
+            rows.append([
+                (0, 24, color, name[:24]),
+                (25, 9, color, '%9.3f' % (state['sublat'][idx] / DEG2RAD)),
+                (35, 10, color, '%10.3f' % (state['sublong'][idx] / DEG2RAD)),
+                (46, 8, color, '%8.2f' % (state['az'][idx] / DEG2RAD)),
+                (55, 8, color, '%8.2f' % (state['alt'][idx] / DEG2RAD)),
+                (64, 10, color, '%10.1f' % (state['range'][idx] / 1000.0))])
+        return rows
+
+    def draw(self):
+        start = time.process_time()
+        frame = self.frame()
+        self.build_cpu = self.build_cpu + time.process_time() - start
+        self.screen.draw(frame)
+
+    async def run(self, rate=DASH_RATE, stop=None, frames=None):
+        """
+        Draws rate frames a second, on the second's boundaries, until the
+        awaitable stop finishes, frames have been drawn, or it is cancelled
+        """
+        import asyncio
+        if stop is not None:
+            stop = asyncio.ensure_future(stop)
+        self.rate = rate
+        interval = 1.0 / rate
+        self.screen.open()
+        try:
+            while frames is None or self.screen.frames < frames:
+                self.draw()
+                delay = interval - time.time() % interval
+                if stop is None:
+                    await asyncio.sleep(delay)
+                    continue
+                done, _pending = await asyncio.wait({stop}, timeout=delay)
+                if done:
+                    break
+        finally:
+            if stop is not None and not stop.done():
+                stop.cancel()
+            self.screen.close()
+
+    def stats(self):
+        """Returns (frames, bytes per frame, CPU seconds per frame)"""
+        frames, written, cpu = self.screen.stats()
+        return (frames, written, cpu + self.build_cpu / max(1, frames))
+
+class StatePublisher(object):
+    """
+    Writes the satellite and every tracked satellite into a StateTable at
+    the tracked time; the scheduler calls publish() every few seconds. The
+    satellite's next pass comes from the pass cache. Those of the tracked
+    satellites come from one batched search over STATE_LOOKAHEAD days,
+    redone in a worker thread once half of it has gone by, so a large batch
+    never holds up the event loop; until it is done their passes are NaN.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.table = None
+        # (batch, pass cache generation, unix start, rise array, set array)
+        self.passes = None
+        self.searching = False
+        self.writes = 0
+
+    def layout(self):
+        """Returns the table, replacing it if the satellites changed"""
+        entries = list()
+        if sat is not None:
+            entries.append((sat.catalog_number, sat.name))
+        if tracked is not None:
+            entries.extend((norad_number(tle[1][2:7]), tle[0])
+                           for tle in tracked.tles)
+        if self.table is None or self.table.entries != entries:
+            old = self.table
+            self.table = StateTable(self.path, entries)
+            if old is not None:
+                old.close()
+        return self.table
+
+    def publish(self):
+        """
+        Writes every slot. Returns a coroutine searching for the tracked
+        satellites' passes if they are due one, else None.
+        """
+        start = metrics.start()
+        when = sync_time()
+        table = self.layout()
+        now = when.timestamp()
+        stamp = time.time()
+        slot = 0
+        if sat is not None:
+            slot = 1
+            aos = los = math.nan
+            try:
+                window = grnd.next_pass(sat)
+                aos = (window[0] - UNIX_EPOCH) * 86400.0
+                los = (window[4] - UNIX_EPOCH) * 86400.0
+            except (ValueError, TypeError):
+                # never rises, or never sets
+                pass
+            try:
+                sat.compute(grnd.observer)
+                table.write(0, (now, stamp, math.degrees(sat.sublat),
+                                math.degrees(sat.sublong),
+                                math.degrees(sat.az), math.degrees(sat.alt),
+                                sat.range / 1000.0, aos, los))
+            except ValueError:
+                # too far from the TLE's epoch; readers see how old it is
+                pass
+        search = None
+        if tracked is not None:
+            update_tracked()
+            state = tracked_state
+            aos, los = self.tracked_passes(now)
+            count = len(tracked)
+            table.write_many(slot, (
+                np.full(count, now), np.full(count, stamp),
+                np.degrees(state['sublat']), np.degrees(state['sublong']),
+                np.degrees(state['az']), np.degrees(state['alt']),
+                state['range'] / 1000.0, aos, los))
+            search = self.search_due(now)
+        self.writes = self.writes + 1
+        metrics.stop('state.publish', start)
+        return search
+
+    def tracked_passes(self, now):
+        """
+        Returns arrays of the unix AOS and LOS of every tracked satellite's
+        current or next pass, NaN where none is known
+        """
+        count = len(tracked)
+        if self.passes is None or self.passes[0] is not tracked:
+            return np.full(count, np.nan), np.full(count, np.nan)
+        rise, sets = self.passes[3:]
+        # the first window not over yet; the last column is all NaN
+        first = (sets <= now).sum(axis=1)
+        rows = np.arange(count)
+        return rise[rows, first], sets[rows, first]
+
+    def search_due(self, now):
+        """Returns a coroutine searching for passes if they are out of date"""
+        if self.searching:
+            return None
+        generation = get_pass_cache().generation
+        if self.passes is not None:
+            batch, found_generation, found_start = self.passes[:3]
+            if (batch is tracked and found_generation == generation and
+                    found_start <= now <
+                    found_start + STATE_LOOKAHEAD * 86400.0 / 2):
+                return None
+        self.searching = True
+        return self.search(tracked, generation, now)
+
+    async def search(self, batch, generation, now):
+        import asyncio
+        try:
+            found = await asyncio.to_thread(
+                station_grid().batch_passes, batch,
+                ephem.Date(UNIX_EPOCH + now / 86400.0), STATE_LOOKAHEAD,
+                REPLAY_STEP)
+        finally:
+            self.searching = False
+        width = max(len(k) for k in found) + 1
+        rise = np.full((len(found), width), np.nan)
+        sets = np.full((len(found), width), np.nan)
+        for row, windows in enumerate(found):
+            for col, window in enumerate(windows):
+                rise[row, col] = (window[0] - UNIX_EPOCH) * 86400.0
+                sets[row, col] = (window[4] - UNIX_EPOCH) * 86400.0
+        self.passes = (batch, generation, now, rise, sets)
+
+#######################################
+## Functions
+#######################################
+
+def set_data_dir(path):
+    """
+    Points every data file at path instead of ~/.satTracker and forgets
+    anything cached from the old location
+    """
+    global DATA_DIR, TLE_FILE, GRND_FILE, CRON_FILE, PASS_LOG_FILE
+    global TLE_GROUPS_FILE, TLE_GROUPS_DIR, TLE_META_FILE, CURRENT_SAT_FILE
+    global CATALOG_FILE, METRICS_FILE, NOTIFY_FILE, ALERT_LOG_FILE
+    global ARCHIVE_FILE, ARCHIVE_INDEX_FILE, STATE_FILE, TELEMETRY_FILE
+    global catalog, crontab, tle_fetcher, notifier, archive, sat_span
+    global telemetry
+    DATA_DIR = path
+    TLE_FILE = os.path.join(DATA_DIR, 'tles.txt')
+    GRND_FILE = os.path.join(DATA_DIR, 'grnd.txt')
+    CRON_FILE = os.path.join(DATA_DIR, 'cron.txt')
+    PASS_LOG_FILE = os.path.join(DATA_DIR, 'passes.log')
+    TLE_GROUPS_FILE = os.path.join(DATA_DIR, 'groups.txt')
+    TLE_GROUPS_DIR = os.path.join(DATA_DIR, 'groups')
+    TLE_META_FILE = os.path.join(DATA_DIR, 'groups.json')
+    CURRENT_SAT_FILE = os.path.join(DATA_DIR, 'current.txt')
+    CATALOG_FILE = os.path.join(DATA_DIR, 'catalog.idx')
+    METRICS_FILE = os.path.join(DATA_DIR, 'metrics.json')
+    NOTIFY_FILE = os.path.join(DATA_DIR, 'notify.txt')
+    ALERT_LOG_FILE = os.path.join(DATA_DIR, 'alerts.log')
+    ARCHIVE_FILE = os.path.join(DATA_DIR, 'archive.tle')
+    ARCHIVE_INDEX_FILE = os.path.join(DATA_DIR, 'archive.idx')
+    STATE_FILE = os.path.join(DATA_DIR, 'state.bin')
+    TELEMETRY_FILE = os.path.join(DATA_DIR, 'telemetry.bin')
+    catalog = None
+    crontab = None
+    tle_fetcher = None
+    notifier = None
+    if archive is not None:
+        archive.close()
+    archive = None
+    if telemetry is not None:
+        telemetry.close()
+    telemetry = None
+    sat_span = None
+    get_pass_cache().invalidate()
+
+def clear_screen():
+    """Utility to clear the terminal screen, with ANSI codes on posix"""
+    if os.name == 'posix':
+        sys.stdout.write('\033[H\033[2J')
+        sys.stdout.flush()
+    else:
+        os.system('cls')
+
+def kill_program(status):
+    """
+    This is the function that should be called to kill the program cleanly.
+    It raises SystemExit, so the event loop's tasks are shut down and
+    buffered output is flushed on the way out.
+    """
+
+    print('\nProgram is terminating.')
+    sys.exit(status)
+
+def sig_handler(_signumber, _frame):
+    kill_program(0)
+
+def spawn(coro, name=None):
+    """
+    Runs coro as a task on the event loop. The task is kept until it
+    finishes, so shutdown() can wait for it, and its errors are reported.
+    """
+    task = event_loop.create_task(coro, name=name)
+    tasks.add(task)
+    task.add_done_callback(task_done)
+    return task
+
+def task_done(task):
+    tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print('%s: %s: %s' % (task.get_name(), type(task.exception()),
+                              task.exception()), file=sys.stderr)
+
+async def read_line(msg):
+    """
+    Prints msg and waits for a line of input without blocking the event
+    loop. Returns None at the end of input.
+    """
+    import asyncio
+    global stdin_reader, stdin_transport
+    print(msg, end='', flush=True)
+    if stdin_reader is None:
+        reader = asyncio.StreamReader()
+        # a duplicate, so closing the transport leaves sys.stdin open
+        pipe = os.fdopen(os.dup(sys.stdin.fileno()), 'rb', buffering=0)
+        try:
+            stdin_transport, _protocol = await event_loop.connect_read_pipe(
+                lambda: asyncio.StreamReaderProtocol(reader), pipe)
+            stdin_reader = reader
+        except (OSError, ValueError):
+            # e.g. stdin is a regular file, which can't be polled
+            pipe.close()
+            stdin_reader = False
+    if stdin_reader is False:
+        line = await asyncio.to_thread(sys.stdin.readline)
+    else:
+        line = (await stdin_reader.readline()).decode('utf-8', 'replace')
+    if line == '':
+        return None
+    return line.rstrip('\n')
+
+async def runtime():
+    """
+    Runs the tracker on one asyncio event loop. The scheduler, notifications,
+    downloads and jobs are tasks alongside the prompt, so the globals they
+    share are only touched from the loop's thread, and any number of
+    satellites can be followed without a thread each. Returns when the user
+    quits, after shutting everything down.
+    """
+    import asyncio
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        event_loop.add_signal_handler(signum, main_task.cancel)
+
+    get_notifier().start()
+    sched = get_scheduler()
+    sched.add_planner(plan_pass_events)
+    sched.add_planner(plan_tle_events)
+    sched.add_planner(plan_telemetry_events)
+    scheduler_task = spawn(sched.run(), 'scheduler')
+    # the program can't go on without its scheduler
+    scheduler_task.add_done_callback(
+        lambda task: task.cancelled() or main_task.cancel())
+    try:
+        await prompt()
+    except asyncio.CancelledError:
+        main_task.uncancel()
+        print('\nProgram is terminating.')
+    finally:
+        scheduler_task.cancel()
+        await shutdown()
+
+async def shutdown(timeout=SHUTDOWN_TIMEOUT):
+    """
+    Gives outstanding tasks, e.g. notifications being delivered, up to
+    timeout seconds to finish and cancels the rest. Then releases stdin and
+    the download threads and flushes output.
+    """
+    import asyncio
+    global event_loop, stdin_reader, stdin_transport
+    if notifier is not None:
+        await notifier.close(timeout)
+    pending = [k for k in tasks if not k.done()]
+    if pending:
+        _done, pending = await asyncio.wait(pending, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if tle_fetcher is not None:
+        tle_fetcher.close()
+    if stdin_transport is not None:
+        stdin_transport.close()
+        # the terminal is shared with the shell, which expects blocking reads
+        os.set_blocking(sys.stdin.fileno(), True)
+    stdin_reader = None
+    stdin_transport = None
+    event_loop = None
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+def load_dbus():
+    """Imports dbus on first use. Returns the module, or None if missing"""
+    global dbus, dbus_checked
+    if not dbus_checked:
+        dbus_checked = True
+        try:
+            import dbus
+        except ImportError:
+            print('Warning: could not import dbus module', file=sys.stderr)
+    return dbus
+
+def load_numpy():
+    """
+    Imports numpy on first use. Returns the module, or None if missing; it is
+    only needed for tracking many satellites at once.
+    """
+    global np, np_checked
+    if not np_checked:
+        np_checked = True
+        try:
+            import numpy as np
+        except ImportError:
+            pass
+    return np
+
+def get_current():
+    """Load the most recently tracked satellite into memory"""
+    metrics.count('read.current.txt')
+    with open(CURRENT_SAT_FILE, 'r') as fname:
+        vals = fname.read().split('\n')
+        full_name = vals[0]
+        short_name = vals[1]
+    return (full_name, short_name)
+
+def save_current(full_name, short_name):
+    """Save the currently tracked satellite into persistent storage"""
+    with open(CURRENT_SAT_FILE, 'w') as fname:
+        fname.write('\n'.join([full_name, short_name, '']))
+
+def set_grnd():
+    """This sets the grnd global variable from persistent storage"""
+    metrics.count('read.grnd.txt')
+    try:
+        with open(GRND_FILE, 'r') as fname:
+            lines = fname.read().split('\n')
+        g_lat = float(lines[0])
+        g_long = float(lines[1])
+        g_elev = float(lines[2])
+        offset = float(lines[3])
+    except (IOError, IndexError, ValueError):
+        raise ValueError('Improperly formatted ground file')
+
+    global grnd
+    grnd = Ground(g_lat, g_long, g_elev, offset)
+    get_pass_cache().invalidate()
+    get_scheduler().reschedule()
+
+def update_grnd(answers=None):
+    """
+    This allows users to change the ground station information. answers,
+    if given, are the replies to GRND_QUESTIONS already read from the user.
+    """
+
+    if answers is None:
+        print('Please enter information for your ground observer:')
+        answers = [input(question) for question in GRND_QUESTIONS]
+    u_lat, u_long, u_elev, u_tzn = answers
+
+    try:
+        u_lat = float(u_lat)
+    except ValueError:
+        print(f'Invalid latitude: {u_lat}')
+        raise
+
+    try:
+        u_long = float(u_long)
+    except ValueError:
+        print(f'Invalid longitude: {u_long}')
+        raise
+
+    try:
+        u_elev = float(u_elev)
+    except ValueError:
+        print(f'Invalid elevation: {u_elev}')
+        raise
+
+    # check validity of values & their types
+    if u_elev < 0:
+        print('Warning: minimum supported elevation is 0 meters. Clamping value to 0.')
+        u_elev = 0
+
+    # TODO(nfischer): capture the timezone from the system clock.
+    try:
+        u_tzn = float(u_tzn)
+    except ValueError:
+        print(f'Invalid timezone: {u_tzn}')
+        raise
+
+    # convert to radians
+    u_lat = u_lat * ephem.degree
+    u_long = u_long * ephem.degree
+
+    # write values to file
+    grnd_str = '\n'.join([str(u_lat), str(u_long), str(u_elev), str(u_tzn), ''])
+    print(grnd_str)
+    with open(GRND_FILE, 'w') as fname:
+        fname.write(grnd_str)
+
+    return
+
+def install_program():
+    """
+    Installs user data on the system.
+    Creates the directory and asks for input for ground observer info.
+    """
+
+    print(f"""
+    Would you like to allow satTracker to install on your computer?
+    This will store satellite TLE data and your ground station data
+    (ex. latitude/longitude) in {DATA_DIR}.
+    """)
+
+    decision = input('Do you want to install satTracker? (y/N): ')
+    if decision != 'y':
+        print('Not installing. Terminating satTracker.')
+        exit(1)
+
+    print('\nInstalling satTracker\n')
+
+    # make the directory
+    if not os.path.isdir(DATA_DIR):
+        try:
+            os.mkdir(DATA_DIR)
+        except OSError:
+            print('There was an error installing the program.')
+            exit(1)
+
+    if not os.path.exists(GRND_FILE):
+        update_grnd()
+
+    if not os.path.exists(TLE_FILE):
+        update_tle()
+
+    if not os.path.exists(CURRENT_SAT_FILE):
+        save_current(ISS_FULL_NAME, ISS_NICKNAME)
+
+    return
+
+
+def is_installed():
+    """returns True if satTracker.py appears to be installed correctly"""
+
+    return os.path.isdir(DATA_DIR) and os.path.exists(GRND_FILE)
+
+
+def handle_time(argv):
+    """
+    Adjusts time forward, backward, or resets it to current time. Warping
+    makes the tracked time run faster than real time from where it is.
+    """
+    global displacement, is_frozen, p_time, sim_clock
+    argc = len(argv)
+    if argc < 2:
+        print('Usage: time [dhms] <int> | reset | freeze | unfreeze | '
+              'warp <factor>|off')
+        return
+    fst = argv[1]
+    if argc == 2:
+        # check for single-argument commands
+        if matches(fst, 'reset'):
+            print("Time is reset to 'now'")
+            displacement = datetime.timedelta()
+            is_frozen = False
+            sim_clock = None
+        elif matches(fst, 'freeze') or matches(fst, 'frozen'):
+            sync_time()
+            is_frozen = True
+            print("Time is now frozen. Use 'time unfreeze' to undo this.")
+        elif matches(fst, 'unfreeze'):
+            is_frozen = False
+            if sim_clock is not None:
+                # warp on from where time stood still
+                sim_clock = SimClock(p_time.timestamp(), sim_clock.rate)
+            print('Time is now unfrozen.')
+        else:
+            print("Unknown time argument '%s'" % fst)
+            return
+    elif matches(fst, 'warp'):
+        scnd = argv[2]
+        try:
+            rate = 1.0 if scnd == 'off' else float(scnd)
+        except ValueError:
+            rate = 0
+        if not 0 < rate <= TIME_WARP_MAX:
+            print('The warp factor must be between 0 and %d' % TIME_WARP_MAX)
+            return
+        now = sync_time()
+        if rate == 1:
+            # keep the tracked time where the warp left it
+            displacement = now - datetime.datetime.now(datetime.UTC)
+            sim_clock = None
+            print('Time runs at real time again.')
+        else:
+            sim_clock = SimClock(now.timestamp(), rate)
+            print('Time now runs %g times as fast as real time. Use '
+                  "'time warp off' to undo this." % rate)
+    else:
+        scnd = argv[2]
+        try:
+            scnd = int(scnd)
+        except ValueError:
+            return
+
+        if matches(fst, 'Day') or matches(fst, 'day'):
+            adjuster = datetime.timedelta(days=scnd)
+        elif matches(fst, 'hour') or matches(fst, 'Hour'):
+            adjuster = datetime.timedelta(hours=scnd)
+        elif matches(fst, 'minute') or matches(fst, 'Minute'):
+            adjuster = datetime.timedelta(minutes=scnd)
+        elif matches(fst, 'second') or matches(fst, 'Second'):
+            adjuster = datetime.timedelta(seconds=scnd)
+        else:
+            print("Unknown time unit '%s'" % fst)
+            return
+
+        # now adjust displacement
+        displacement = displacement + adjuster
+        if sim_clock is not None:
+            sim_clock.shift(adjuster.total_seconds())
+        if is_frozen:
+            p_time = p_time + adjuster
+    get_pass_cache().invalidate()
+    get_scheduler().reschedule()
+    return
+
+
+def output_grnd():
+    """Prints output for user's groundstation"""
+    g_lat = grnd.latitude()
+    g_long = grnd.longitude()
+    g_elev = grnd.elevation()
+
+    print('Printing info for your ground observer:')
+    print('lat: ' + COL_BLUE, g_lat, '°N', COL_NORMAL)
+    print('long:' + COL_BLUE, g_long, '°E', COL_NORMAL)
+    print('elev:', g_elev, 'm')
+    return
+
+def sat_report():
+    """
+    Computes the satellite at the tracked time. Returns a dict of its name,
+    lat, long, az, alt and elevation, and the local aos and los of its next
+    pass (None if it never passes) with a suffix describing it.
+    """
+    sync_time()
+    start = metrics.start()
+    sat.compute(grnd.observer)
+    metrics.stop('sat.compute', start)
+    report = {'name': sat.name, 'lat': sat.sublat, 'long': sat.sublong,
+              'az': sat.az, 'alt': sat.alt, 'elevation': sat.elevation,
+              'aos': None, 'los': None, 'suffix': ''}
+    try:
+        pass_tuple = grnd.next_pass(sat)
+        report['aos'] = ephem.localtime(pass_tuple[0]).replace(microsecond=0)
+        report['los'] = ephem.localtime(pass_tuple[4]).replace(microsecond=0)
+        night_time = is_night(pass_tuple)
+        visible = night_time and is_visible(sat, pass_tuple)
+        sat.compute(grnd.observer)
+    except ValueError:
+        return report
+    if visible:
+        report['suffix'] = 'local time (night, visible)'
+    elif night_time:
+        report['suffix'] = 'local time (night)'
+    else:
+        report['suffix'] = 'local time (day time)'
+    return report
+
+def output_sat():
+    """Prints output for the satellite"""
+    report = sat_report()
+    print(report['name'])
+    print('lat: ', COL_GREEN, report['lat'], COL_NORMAL)
+    print('long:', COL_GREEN, report['long'], COL_NORMAL)
+    print('azimuth:', report['az'])
+    print('altitude:', report['alt'])
+    print('elevation:', report['elevation'])
+    if report['aos'] is not None:
+        print('next pass at' + COL_YELLOW, report['aos'],
+              COL_NORMAL + report['suffix'])
+        print('end time:   ' + COL_YELLOW, report['los'], COL_NORMAL)
+    else:
+        print(COL_PURPLE + 'This satellite will never pass' + COL_NORMAL)
+    return
+
+def read_satellite(full_name, nick_name='', when=None):
+    """
+    Returns a pyephem body for the best catalog match of full_name, named
+    nick_name if given. If when (a datetime or ephem date) is given, the
+    archived element set nearest it is used instead of the current one.
+
+    @throws ValueError
+    """
+    cat = get_catalog()
+    idx = cat.find(full_name)
+    if idx is None:
+        raise ValueError('Unable to find satellite')
+    my_lines = cat.tle(idx)
+    if when is not None and os.path.exists(ARCHIVE_FILE):
+        found = get_archive().nearest(cat.norad(idx), ephem_julian(when))
+        if found is not None:
+            my_lines = found[0]
+
+    sat_name = cat.name(idx) if nick_name == '' else nick_name
+
+    # May throw an exception
+    return ephem.readtle(sat_name, my_lines[1], my_lines[2])
+
+def set_satellite(full_name, nick_name=''):
+    ret = read_satellite(full_name, nick_name)
+    save_current(full_name, nick_name)
+
+    global sat, sat_span
+    sat = ret
+    sat_span = None
+    get_scheduler().reschedule()
+
+def output_now():
+    """
+    By default, it prints the current time in local time and UTC. This will
+    print(the time being tracked by the program if the user has adjusted the)
+    time forward or backward.
+    """
+    u_time = sync_time().replace(microsecond=0)
+    l_time = ephem.localtime(ephem.Date(u_time)).replace(microsecond=0)
+    cti = 'Current time is'+COL_YELLOW
+    print(cti, l_time, COL_NORMAL + 'local time')
+    print(cti, u_time, COL_NORMAL + 'UTC')
+    return
+
+def tle_groups():
+    """Returns the CelesTrak groups to download, one per line of groups.txt"""
+    try:
+        with open(TLE_GROUPS_FILE, 'r') as fname:
+            groups = [k.strip() for k in fname if k.strip() != '']
+    except IOError:
+        groups = list()
+    return groups if groups else list(TLE_GROUPS)
+
+def parse_tle_stream(lines):
+    """
+    Yields (name, line1, line2) triplets from an iterable of text or byte
+    lines, as they arrive. Blank and malformed lines are skipped.
+    """
+    name = None
+    line1 = None
+    for raw in lines:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        line = raw.strip()
+        if line.startswith('1 ') and name is not None:
+            line1 = line
+        elif line.startswith('2 ') and line1 is not None:
+            yield (name, line1, line)
+            name = None
+            line1 = None
+        elif line != '':
+            name = line
+            line1 = None
+
+def update_tle(groups=None, url_format=TLE_URL_FORMAT):
+    """
+    Updates the program's TLEs for satellites, merging every group in
+    groups (default: tle_groups()). Returns a dict of group to HTTP status.
+
+    @throws ValueError, URLError, IOError
+    """
+    if groups is None:
+        groups = tle_groups()
+    start = metrics.start()
+    statuses = get_tle_fetcher(url_format).update(groups, TLE_FILE)
+    metrics.stop('tle.refresh', start)
+    archive_tles()
+    tle_updated()
+    return statuses
+
+async def update_tle_async(groups=None, url_format=TLE_URL_FORMAT):
+    """
+    update_tle() for the event loop, which keeps running while the groups
+    download
+
+    @throws ValueError, URLError, IOError
+    """
+    import asyncio
+    if groups is None:
+        groups = tle_groups()
+    start = metrics.start()
+    statuses = await get_tle_fetcher(url_format).update_async(groups,
+                                                              TLE_FILE)
+    metrics.stop('tle.refresh', start)
+    await asyncio.to_thread(archive_tles)
+    tle_updated()
+    return statuses
+
+async def refresh_tle():
+    """Scheduled TLE update on the event loop"""
+    try:
+        await update_tle_async()
+    except (ValueError, IOError):
+        print('Unable to update TLE. Check your network connection')
+
+def get_tle_fetcher(url_format=TLE_URL_FORMAT):
+    """Returns the shared TLE downloader for url_format"""
+    global tle_fetcher
+    if tle_fetcher is None or tle_fetcher.url_format != url_format:
+        if tle_fetcher is not None:
+            tle_fetcher.close()
+        tle_fetcher = TleFetcher(url_format)
+    return tle_fetcher
+
+def tle_updated():
+    """Re-indexes the new TLE file and replans everything that used it"""
+    global sat_span
+    build_catalog()
+    sat_span = None
+    get_pass_cache().invalidate()
+    get_scheduler().reschedule()
+
+def get_pass_cache():
+    """Returns the shared pass prediction cache"""
+    global pass_cache
+    if pass_cache is None:
+        pass_cache = PassCache()
+    return pass_cache
+
+def get_archive():
+    """
+    Returns the shared TLE archive. Opening it only maps the files; element
+    sets are added where they arrive (update_tle() and `archive add`), never
+    on a lookup.
+    """
+    global archive
+    if archive is None:
+        archive = TleArchive(ARCHIVE_FILE, ARCHIVE_INDEX_FILE)
+    return archive
+
+def get_telemetry():
+    """Returns the telemetry log, creating it on first use"""
+    global telemetry
+    if telemetry is None:
+        telemetry = TelemetryLog(TELEMETRY_FILE)
+    return telemetry
+
+def record_telemetry():
+    """
+    Appends the satellite's state to the telemetry log. Only the present
+    is logged: nothing is while the tracked time is moved, frozen or
+    warped.
+    """
+    if (sat is None or is_frozen or sim_clock is not None or displacement or
+            load_numpy() is None):
+        return
+    when = sync_time()
+    try:
+        sat.compute(grnd.observer)
+    except ValueError:
+        # too far from the TLE's epoch
+        return
+    start = metrics.start()
+    dropped = get_telemetry().append(when.timestamp(), sat.catalog_number, (
+        math.degrees(sat.sublat), math.degrees(sat.sublong),
+        sat.elevation / 1000.0, math.degrees(sat.az), math.degrees(sat.alt),
+        sat.range / 1000.0))
+    metrics.stop('telemetry', start)
+    if dropped:
+        # the clock went back; `telemetry --tiers` shows the totals
+        metrics.count('telemetry.dropped')
+
+def archive_tles():
+    """Adds every element set in the TLE file to the archive"""
+    global sat_span
+    start = metrics.start()
+    with open(TLE_FILE, 'r') as fname:
+        added = get_archive().append(parse_tle_stream(fname))
+    metrics.stop('archive.append', start)
+    if added:
+        # select_tle() may have settled on the one element set there was
+        sat_span = None
+    return added
+
+def select_tle():
+    """
+    Swaps the tracked satellite's element set for the archived one whose
+    epoch is nearest the tracked time, so moving the time by weeks still
+    propagates from elements fitted near it. Only searches the archive when
+    the tracked time leaves the span the current element set is best for.
+    """
+    global sat, sat_span
+    jd = ephem_julian(p_time)
+    if sat_span is not None and sat_span[0] <= jd < sat_span[1]:
+        return
+    if not os.path.exists(ARCHIVE_FILE):
+        # nothing archived yet, so nothing to open or index
+        sat_span = (float('-inf'), float('inf'))
+        return
+    start = metrics.start()
+    found = get_archive().nearest(sat.catalog_number, jd)
+    if found is None:
+        # never archived: the current element set is all there is
+        sat_span = (float('-inf'), float('inf'))
+    else:
+        (_name, line1, line2), low, high = found
+        sat_span = (low, high)
+        if abs(tle_epoch(line1) - ephem_julian(sat.epoch)) > 1e-6:
+            try:
+                sat = ephem.readtle(sat.name, line1, line2)
+                get_scheduler().reschedule()
+            except ValueError:
+                # damaged in the archive; keep propagating what we have
+                pass
+    metrics.stop('archive.lookup', start)
+
+def get_daylight():
+    """Returns the shared sunrise, sunset and sunlight cache"""
+    global daylight
+    if daylight is None:
+        daylight = Daylight()
+    return daylight
+
+def get_scheduler():
+    """Returns the scheduler driving the background thread"""
+    global scheduler
+    if scheduler is None:
+        scheduler = Scheduler()
+    return scheduler
+
+def build_catalog():
+    """Re-indexes the TLE file and saves the index alongside it"""
+    global catalog
+    catalog = Catalog.build(TLE_FILE)
+    catalog.save(CATALOG_FILE)
+    return catalog
+
+def get_catalog():
+    """
+    Returns the catalog index for the TLE file, loading it from disk or
+    rebuilding it if the TLE file has changed since it was last indexed
+    """
+    global catalog
+    stat = os.stat(TLE_FILE)
+    if (catalog is not None and catalog.tle_mtime == stat.st_mtime and
+            catalog.tle_size == stat.st_size):
+        return catalog
+    try:
+        catalog = Catalog.load(CATALOG_FILE, TLE_FILE)
+    except ValueError:
+        build_catalog()
+    return catalog
+
+def all_stations():
+    """Returns a list of all known space stations"""
+    return get_catalog().names()
+
+def parse_elements(line1, line2):
+    """
+    Parses the SGP4 mean elements out of a TLE pair. Returns the elements
+    (ecco, argpo, inclo, mo, no_kozai, nodeo, bstar) in radians and
+    radians/minute, and the epoch as a Julian date.
+    """
+    epoch = tle_epoch(line1)
+    try:
+        bstar = float(line1[53] + '.' + line1[54:59] + 'e' + line1[59:61])
+        inclo = float(line2[8:16]) * DEG2RAD
+        nodeo = float(line2[17:25]) * DEG2RAD
+        ecco = float('0.' + line2[26:33].strip())
+        argpo = float(line2[34:42]) * DEG2RAD
+        mo = float(line2[43:51]) * DEG2RAD
+        no_kozai = float(line2[52:63]) * 2.0 * math.pi / 1440.0
+    except (IndexError, ValueError):
+        raise ValueError('Improperly formatted TLE')
+    return (ecco, argpo, inclo, mo, no_kozai, nodeo, bstar), epoch
+
+def tle_epoch(line1):
+    """
+    Returns the epoch of a TLE's first line as a Julian date
+    @throws ValueError
+    """
+    try:
+        year = int(line1[18:20])
+        day = float(line1[20:32])
+    except (IndexError, ValueError):
+        raise ValueError('Improperly formatted TLE')
+    year = year + (1900 if year >= 57 else 2000)
+    return julian_date(datetime.datetime(year, 1, 1)) + day - 1.0
+
+def norad_number(text):
+    """
+    Parses a NORAD catalog number, including the Alpha-5 form where a
+    leading letter stands for 10-33 (I and O are skipped): 'A0001' is 100001
+    @throws ValueError
+    """
+    text = text.strip()
+    if text[:1].isalpha():
+        return (10 + 'ABCDEFGHJKLMNPQRSTUVWXYZ'.index(text[0].upper())) * \
+            10000 + int(text[1:])
+    return int(text)
+
+def ephem_julian(when):
+    """Converts a datetime or an ephem date to a Julian date"""
+    if isinstance(when, datetime.datetime):
+        return julian_date(when)
+    return float(when) + ephem.julian_date(0)
+
+def orbit_bounds(line1, line2):
+    """
+    Returns what the overhead query needs to rule a TLE out without
+    propagating it: (max_lat, perigee, apogee, inclo, nodeo, nodedot,
+    epoch). max_lat is the highest latitude (radians) its ground track
+    reaches, perigee and apogee are heights above the equatorial radius
+    (km), and the right ascension of the ascending node is nodeo (radians)
+    at the epoch (Julian date), moving nodedot radians/day
+    @throws ValueError
+    """
+    try:
+        inclo = float(line2[8:16]) * DEG2RAD
+        nodeo = float(line2[17:25]) * DEG2RAD
+        ecco = float('0.' + line2[26:33].strip())
+        motion = float(line2[52:63]) * 2.0 * math.pi / 86400.0
+    except (IndexError, ValueError):
+        raise ValueError('Improperly formatted TLE')
+    if motion <= 0:
+        raise ValueError('Improperly formatted TLE')
+    axis = (SGP4_MU / (motion * motion)) ** (1.0 / 3.0)
+    semi_latus = axis * (1.0 - ecco * ecco) / SGP4_RADIUS
+    # the secular drift of the node due to J2
+    nodedot = (-1.5 * SGP4_J2 * math.cos(inclo) * motion * 86400.0 /
+               (semi_latus * semi_latus))
+    return (min(inclo, math.pi - inclo), axis * (1.0 - ecco) - SGP4_RADIUS,
+            axis * (1.0 + ecco) - SGP4_RADIUS, inclo, nodeo, nodedot,
+            tle_epoch(line1))
+
+def clenshaw(coeffs, x):
+    """Evaluates the Chebyshev series coeffs at x in [-1, 1]"""
+    b1 = 0.0
+    b2 = 0.0
+    x2 = x + x
+    for c in coeffs[:0:-1]:
+        b1, b2 = c + x2 * b1 - b2, b1
+    return coeffs[0] + x * b1 - b2
+
+def cheb_derivative(coeffs, half):
+    """
+    Returns the Chebyshev series of the derivative of coeffs, per unit of
+    time when x = 1 is half units from the middle of the segment
+    """
+    count = len(coeffs)
+    out = [0.0] * max(1, count - 1)
+    for j in range(count - 1, 0, -1):
+        out[j - 1] = 2.0 * j * coeffs[j] + (out[j + 1] if j + 1 < count - 1
+                                             else 0.0)
+    out[0] = out[0] / 2.0
+    return [k / half for k in out]
+
+def footprint(height, min_alt):
+    """
+    Returns the earth central angle (radians) between an observer and the
+    point under a satellite height km up that the observer sees at
+    altitude min_alt (radians): the radius of the satellite's footprint
+    """
+    cos_nadir = SGP4_RADIUS * math.cos(min_alt) / (SGP4_RADIUS + height)
+    if height <= 0 or cos_nadir >= 1.0:
+        return 0.0
+    return math.acos(cos_nadir) - min_alt
+
+def sin_range(low, high):
+    """Returns the least and greatest value of sin(x) for low <= x <= high"""
+    if high - low >= 2.0 * math.pi:
+        return -1.0, 1.0
+    values = [math.sin(low), math.sin(high)]
+    # the peaks and troughs in between
+    first = math.ceil((low - math.pi / 2.0) / math.pi)
+    for turn in range(first, int(math.floor((high - math.pi / 2.0) /
+                                            math.pi)) + 1):
+        values.append(1.0 if turn % 2 == 0 else -1.0)
+    return min(values), max(values)
+
+def sampled_pass(body, observer, when, end, min_alt):
+    """
+    Follows body every OVERHEAD_STEP seconds from ephem date when, and
+    returns the next_pass()-style window of its first pass above min_alt
+    that starts by end, to within a step, or None. Moves observer.
+    """
+    step = OVERHEAD_STEP * ephem.second
+    window = None
+    # passes still going at the end are followed for up to a day more
+    while when <= (end if window is None else end + 1):
+        observer.date = when
+        body.compute(observer)
+        if body.alt > min_alt:
+            if window is None:
+                window = [ephem.Date(when), body.az, ephem.Date(when),
+                          body.alt, None, None]
+            elif body.alt > window[3]:
+                window[2:4] = [ephem.Date(when), body.alt]
+        elif window is not None:
+            window[4:6] = [ephem.Date(when), body.az]
+            break
+        when = ephem.Date(when + step)
+    return None if window is None else tuple(window)
+
+def overhead(start, duration, min_alt):
+    """
+    Finds every satellite in the TLE file that is above min_alt (radians)
+    from the ground station at some time from ephem date start to start +
+    duration days. Satellites are first ruled out from their elements:
+    those whose ground track never reaches within a footprint (at apogee)
+    of the station's latitude, then those whose orbit plane doesn't pass
+    within a footprint of the station while it turns under the sky in the
+    window. The rest are scanned every OVERHEAD_STEP seconds, and pyephem
+    finds the exact pass of any that come near min_alt. Returns (passes,
+    stats): next_pass()-style tuples with the catalog index first, by rise
+    time, and the cull counts.
+    """
+    begin = time.perf_counter()
+    cat = get_catalog()
+    lat = math.atan((1.0 - WGS84_E2) * math.tan(grnd.observer.lat))
+    observer = grnd.observer.copy()
+    observer.date = start
+    # the right ascension of the station's meridian over the window
+    sidereal = float(observer.sidereal_time())
+    turn = 2.0 * math.pi * 1.00273790935 * duration
+    jd = ephem_julian(ephem.Date(start))
+    survivors = list()
+    culled_lat = 0
+    culled_plane = 0
+    for idx, bound in enumerate(cat.bounds()):
+        if bound is None:
+            continue
+        max_lat, _perigee, apogee, inclo, nodeo, nodedot, epoch = bound
+        reach = footprint(apogee, min_alt) + OVERHEAD_MARGIN
+        if abs(lat) - max_lat > reach:
+            culled_lat = culled_lat + 1
+            continue
+        # sine of the station's angle from the orbit plane as it turns
+        node = nodeo + nodedot * (jd - epoch)
+        low, high = sin_range(sidereal - node, sidereal - node + turn)
+        across = math.cos(lat) * math.sin(inclo)
+        along = math.sin(lat) * math.cos(inclo)
+        least = min(abs(along - across * low), abs(along - across * high))
+        if (along - across * low) * (along - across * high) > 0 and \
+                least > math.sin(min(reach, math.pi / 2.0)):
+            culled_plane = culled_plane + 1
+            continue
+        survivors.append(idx)
+    cull_time = time.perf_counter() - begin
+
+    observer.horizon = min_alt
+    end = ephem.Date(start + duration)
+    step = OVERHEAD_STEP * ephem.second
+    near = min_alt - OVERHEAD_SLACK * ephem.degree
+    found = list()
+    tles = cat.tles() if survivors else list()
+    for idx in survivors:
+        try:
+            body = ephem.readtle(*tles[idx])
+            when = ephem.Date(start)
+            while when <= end:
+                observer.date = when
+                body.compute(observer)
+                if body.alt > near:
+                    break
+                when = ephem.Date(when + step)
+            else:
+                continue
+            if when == start and body.alt > min_alt:
+                # already up; pyephem would skip to the next pass
+                try:
+                    _rise, _raz, max_time, max_alt, set_time, set_az = \
+                        observer.next_pass(body, singlepass=False)
+                except ValueError:
+                    # never sets, e.g. a geostationary satellite
+                    max_time, max_alt, set_time, set_az = (None, body.alt,
+                                                           None, None)
+                window = (ephem.Date(start), body.az, max_time, max_alt,
+                          set_time, set_az)
+            else:
+                observer.date = max(start, when - step)
+                try:
+                    window = observer.next_pass(body)
+                except (ValueError, TypeError):
+                    # pyephem raises TypeError checking the order of a pass
+                    # it didn't find
+                    window = (None,) * 6
+                if window[0] is None or window[0] > end:
+                    # pyephem can miss grazing passes with a raised horizon
+                    window = sampled_pass(body, observer, when, end, min_alt)
+                    if window is None:
+                        continue
+        except (ValueError, RuntimeError):
+            # the elements are too old to propagate
+            continue
+        if window[0] is not None and window[0] <= end:
+            found.append((idx,) + tuple(window))
+    found.sort(key=lambda k: k[1])
+    stats = {'objects': len(cat), 'culled': culled_lat + culled_plane,
+             'culled_latitude': culled_lat, 'culled_plane': culled_plane,
+             'searched': len(survivors), 'found': len(found),
+             'cull_seconds': cull_time,
+             'seconds': time.perf_counter() - begin}
+    return found, stats
+
+def julian_date(when):
+    """Converts a datetime (naive datetimes are taken as UTC) to a Julian date"""
+    if when.tzinfo is not None:
+        when = when.astimezone(datetime.UTC).replace(tzinfo=None)
+    delta = when - datetime.datetime(2000, 1, 1, 12)
+    return 2451545.0 + delta.days + (delta.seconds +
+                                     delta.microseconds / 1e6) / 86400.0
+
+def gmst(jd):
+    """Greenwich mean sidereal time in radians (IAU-82), as SGP4 expects"""
+    tut1 = (jd - 2451545.0) / 36525.0
+    temp = (-6.2e-6 * tut1 * tut1 * tut1 + 0.093104 * tut1 * tut1 +
+            (876600.0 * 3600.0 + 8640184.812866) * tut1 + 67310.54841)
+    return np.mod(temp * DEG2RAD / 240.0, 2.0 * np.pi)
+
+def observer_ecef(lat, long, elev):
+    """Returns the earth-fixed position (km) of geodetic lat/long/elev(m)"""
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    radius = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    height = np.asarray(elev) / 1000.0
+    return np.stack([(radius + height) * cos_lat * np.cos(long),
+                     (radius + height) * cos_lat * np.sin(long),
+                     (radius * (1.0 - WGS84_E2) + height) * sin_lat], axis=-1)
+
+def teme_to_ecef(pos, jd):
+    """Rotates TEME positions (..., 3) into the earth-fixed frame"""
+    theta = gmst(jd)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+    return np.stack([cos_t * pos[..., 0] + sin_t * pos[..., 1],
+                     -sin_t * pos[..., 0] + cos_t * pos[..., 1],
+                     pos[..., 2]], axis=-1)
+
+def ecef_to_geodetic(ecef):
+    """Returns geodetic latitude, longitude (radians) and height (m)"""
+    x = ecef[..., 0]
+    y = ecef[..., 1]
+    z = ecef[..., 2]
+    rho = np.hypot(x, y)
+    long = np.arctan2(y, x)
+    lat = np.arctan2(z, rho * (1.0 - WGS84_E2))
+    for _k in range(3):
+        sin_lat = np.sin(lat)
+        radius = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+        lat = np.arctan2(z + radius * WGS84_E2 * sin_lat, rho)
+    sin_lat = np.sin(lat)
+    radius = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    height = rho / np.cos(lat) - radius
+    return lat, long, height * 1000.0
+
+def look_angles(ecef, lat, long, elev):
+    """
+    Returns azimuth, altitude (radians) and range (m) of earth-fixed
+    positions ecef as seen from geodetic lat/long/elev. Arrays broadcast.
+    """
+    delta = ecef - observer_ecef(lat, long, elev)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    sin_long = np.sin(long)
+    cos_long = np.cos(long)
+    south = (sin_lat * cos_long * delta[..., 0] +
+             sin_lat * sin_long * delta[..., 1] - cos_lat * delta[..., 2])
+    east = -sin_long * delta[..., 0] + cos_long * delta[..., 1]
+    zenith = (cos_lat * cos_long * delta[..., 0] +
+              cos_lat * sin_long * delta[..., 1] + sin_lat * delta[..., 2])
+    rng = np.sqrt(south * south + east * east + zenith * zenith)
+    az = np.mod(np.arctan2(east, -south), 2.0 * np.pi)
+    alt = np.arcsin(zenith / rng)
+    return az, alt, rng * 1000.0
+
+def unrefract(alt, pressure, temperature):
+    """
+    Returns the true altitude (radians) of apparent altitudes alt, for the
+    pressure (mBar) and temperature (C) of a pyephem observer. This is
+    libastro's model: a polynomial fit below 15 degrees and the tangent
+    formula above, blended across a degree.
+    """
+    alt_deg = np.degrees(alt)
+    low = alt - np.radians(
+        ((2e-5 * alt_deg + 1.96e-2) * alt_deg + 0.1594) * pressure /
+        ((273.0 + temperature) *
+         ((8.45e-2 * alt_deg + 5.05e-1) * alt_deg + 1.0)))
+    # libastro leaves the bending off where the fit turns negative
+    low = np.where((alt < 0) & (low > alt), alt, low)
+    with np.errstate(all='ignore'):
+        high = alt - 7.888888e-5 * pressure / ((273.0 + temperature) *
+                                               np.tan(alt))
+    blend = (alt - 14.5 * DEG2RAD) / DEG2RAD
+    return np.where(alt < 14.5 * DEG2RAD, low,
+                    np.where(alt >= 15.5 * DEG2RAD, high,
+                             low + (high - low) * blend))
+
+def refract(alt, pressure, temperature):
+    """
+    Returns the apparent altitude (radians) of true altitudes alt, as
+    pyephem reports it for an observer with pressure (mBar) and
+    temperature (C). It inverts unrefract() by the secant method, as
+    libastro does, to within REFRACTION_TOLERANCE.
+    """
+    alt = np.asarray(alt, dtype=float)
+    if pressure <= 0:
+        return alt
+    with np.errstate(all='ignore'):
+        true0 = unrefract(alt, pressure, temperature)
+        delta = 0.8 * (alt - true0)
+        found = alt.copy()
+        for _k in range(20):
+            found = found + delta
+            true = unrefract(found, pressure, temperature)
+            done = ~(np.abs(alt - true) > REFRACTION_TOLERANCE)
+            if done.all():
+                break
+            delta = np.where(done, 0.0, -delta * (alt - true) /
+                             (true0 - true))
+            true0 = true
+    return found
+
+def teme_look_angles(pos, jd, lat, long, elev, pressure=0.0,
+                     temperature=15.0):
+    """
+    Converts TEME positions into the same quantities pyephem reports for an
+    EarthSatellite: sublat, sublong, elevation, az, alt and range. Like
+    pyephem, sublat is geocentric while elevation is above the ellipsoid,
+    and alt is refracted for the observer's pressure (mBar) and temperature
+    (C); with no pressure it is the geometric altitude.
+    """
+    ecef = teme_to_ecef(pos, jd)
+    _lat, sublong, height = ecef_to_geodetic(ecef)
+    sublat = np.arctan2(ecef[..., 2], np.hypot(ecef[..., 0], ecef[..., 1]))
+    az, alt, rng = look_angles(ecef, lat, long, elev)
+    alt = refract(alt, pressure, temperature)
+    return {'sublat': sublat, 'sublong': sublong, 'elevation': height,
+            'az': az, 'alt': alt, 'range': rng}
+
+def clock_time():
+    """
+    Returns the unix time the scheduler runs on: the wall clock, or the
+    virtual clock of a replay
+    """
+    if sim_clock is not None and sim_clock.virtual:
+        return sim_clock.now
+    return time.time()
+
+def sync_time():
+    """Moves the ground observer to the tracked time and returns that time"""
+    global p_time
+    if not is_frozen:
+        if sim_clock is None:
+            p_time = datetime.datetime.now(datetime.UTC) + displacement
+        else:
+            p_time = datetime.datetime.fromtimestamp(sim_clock.time(),
+                                                     datetime.UTC)
+    grnd.set_date(p_time)
+    if sat is not None:
+        select_tle()
+    return p_time
+
+def wall_time(date):
+    """Converts a tracked ephem date into a unix time on the scheduler's clock"""
+    when = ephem.Date(date).datetime().replace(tzinfo=datetime.UTC)
+    # land just inside the event so the tracked time has reached it
+    if sim_clock is not None:
+        return sim_clock.wall_time(when.timestamp()) + 0.01
+    return (when - displacement).timestamp() + 0.01
+
+def alert(msg):
+    """
+    Sends msg to the notification sinks. Inside the event loop it is queued
+    for the notifier's delivery task, so a slow sink can't stall the loop.
+    """
+    get_notifier().post(msg)
+
+def make_sink(spec):
+    """
+    Returns the notification sink for a spec: 'stdout', 'dbus',
+    'log [<path>]' or 'webhook <url>'
+
+    @throws ValueError
+    """
+    words = spec.split()
+    if words == ['stdout']:
+        return StdoutSink()
+    if words == ['dbus']:
+        return DbusSink()
+    if words and words[0] == 'log' and len(words) <= 2:
+        return JsonLogSink(words[1] if len(words) == 2 else None)
+    if len(words) == 2 and words[0] == 'webhook':
+        return WebhookSink(words[1])
+    raise ValueError('Unknown notification sink: %s' % spec)
+
+def load_sinks():
+    """
+    Returns the sinks listed one per line in the notify file, by default
+    dbus if it is available or else stdout
+    """
+    sinks = list()
+    try:
+        with open(NOTIFY_FILE, 'r') as fname:
+            for line in fname:
+                line = line.strip()
+                if line == '' or line.startswith('#'):
+                    continue
+                try:
+                    sinks.append(make_sink(line))
+                except ValueError as e:
+                    print('Ignoring notification sink: %s' % e)
+    except IOError:
+        pass
+    if not sinks:
+        sinks.append(DbusSink() if load_dbus() is not None else StdoutSink())
+    return sinks
+
+def save_sinks(sinks):
+    """Writes the sinks back to the notify file atomically"""
+    tmp_file = NOTIFY_FILE + '.tmp'
+    with open(tmp_file, 'w') as fname:
+        for sink in sinks:
+            fname.write(str(sink) + '\n')
+    os.replace(tmp_file, NOTIFY_FILE)
+
+def get_notifier():
+    """Returns the shared notifier, loading its sinks on first use"""
+    global notifier
+    if notifier is None:
+        notifier = Notifier(load_sinks())
+    return notifier
+
+def plan_pass_events(sched):
+    """Schedules the start or end of the satellite's current or next pass"""
+    global last_pass_notice
+    sched.cancel_tag('pass')
+    if is_frozen:
+        # tracked time stands still, so no pass can start or end
+        return
+    start = metrics.start()
+    sync_time()
+    try:
+        pass_tuple = grnd.next_pass(sat)
+    except ValueError:
+        # satellite is always below the horizon
+        metrics.stop('tick', start)
+        return
+    if grnd.in_pass(pass_tuple):
+        if last_pass_notice != (sat.name, pass_tuple[4]):
+            last_pass_notice = (sat.name, pass_tuple[4])
+            alert(sat.name + ' is currently passing overhead')
+        sched.schedule(wall_time(pass_tuple[4]), 'LOS ' + sat.name,
+                       sched.reschedule, tag='pass')
+    else:
+        sched.schedule(wall_time(pass_tuple[0]), 'AOS ' + sat.name,
+                       sched.reschedule, tag='pass')
+    metrics.stop('tick', start)
+
+def plan_tle_events(sched):
+    """Schedules a reminder for when the TLE file goes stale"""
+    sched.cancel_tag('tle')
+    try:
+        stamp = os.stat(TLE_FILE).st_mtime
+    except OSError:
+        return
+    stale = stamp + TLE_MAX_AGE.total_seconds()
+    if stale <= time.time():
+        # main() already offered an update at start up
+        return
+    msg = 'Your TLE is getting a little stale. Use `update` to refresh it.'
+    sched.schedule(stale, 'TLE stale', lambda: alert(msg), tag='tle')
+
+def plan_telemetry_events(sched):
+    """
+    Schedules the telemetry log's samples, one per step of its finest tier,
+    while the tracked time is the present
+    """
+    sched.cancel_tag('telemetry')
+    if (is_frozen or displacement or sim_clock is not None or
+            load_numpy() is None):
+        # record_telemetry() would log nothing
+        return
+    step = TELEMETRY_TIERS[0][0]
+    first = (math.floor(clock_time() / step) + 1) * step
+    sched.schedule(first, 'record telemetry', record_telemetry,
+                   interval=step, tag='telemetry')
+
+def station_grid():
+    """
+    Returns a GroundGrid of just the ground station, for batched pass
+    searches. It refracts like the station's observer, so rise and set
+    agree with pyephem's own to within a few seconds.
+    """
+    return GroundGrid.from_ground(grnd)
+
+def prefill_passes(rows, start, end, step=REPLAY_STEP):
+    """
+    Fills the pass cache with every pass of the catalog entries rows from
+    ephem date start to end, found by one batched search over all of them
+    (GroundGrid.batch_passes over station_grid()) instead of a pass search
+    each. Returns the number of windows found.
+    """
+    cat = get_catalog()
+    tles = cat.tles()
+    batch = SatelliteBatch([tles[k] for k in rows])
+    found = station_grid().batch_passes(batch, start, end - start, step)
+    cache = get_pass_cache()
+    for idx, windows, deep in zip(rows, found, batch.deep):
+        # the scan can't follow deep-space orbits, so they find no windows
+        if windows or not deep:
+            cache.seed(cat.body(idx), grnd.observer, start, windows)
+    return sum(len(k) for k in found)
+
+def replay(start, end, speed=None, trace=None):
+    """
+    Replays the tracker from ephem date start to end on a virtual clock:
+    the pass events of the satellite, the cron jobs and the alerts they
+    send run as they would live, but the clock jumps from one event to the
+    next, or with speed, moves speed times as fast as real time. Nothing
+    reads the wall clock, so a replay sends the same alerts every time.
+    trace is called with each event as it fires. Returns the scheduler.
+    """
+    global sim_clock, scheduler, is_frozen, last_pass_notice
+    stop = ephem.Date(end).datetime().replace(
+        tzinfo=datetime.UTC).timestamp()
+    sim_clock = SimClock(ephem.Date(start).datetime().replace(
+        tzinfo=datetime.UTC).timestamp())
+    is_frozen = False
+    last_pass_notice = None
+    sched = scheduler = Scheduler()
+    sched.trace = trace
+    if sat is not None:
+        sched.add_planner(plan_pass_events)
+    sched.add_planner(get_crontab().plan)
+    try:
+        while True:
+            timeout = sched.run_pending()
+            if timeout == 0:
+                # the planners want to run again
+                continue
+            if sim_clock.now >= stop:
+                break
+            when = stop if timeout is None else min(sim_clock.now + timeout,
+                                                    stop)
+            if speed is not None:
+                time.sleep((when - sim_clock.now) / speed)
+            sim_clock.advance(when)
+    finally:
+        sim_clock = None
+    return sched
+
+def output_schedule():
+    """Prints the scheduler's pending events and its wakeup counters"""
+    sched = get_scheduler()
+    for event in sched.pending():
+        stamp = datetime.datetime.fromtimestamp(event.when).replace(
+            microsecond=0)
+        print(COL_YELLOW + str(stamp) + COL_NORMAL, event.name)
+    print('wakeups: %d, events fired: %d, wakeups saved vs. polling: %d' %
+          (sched.wakeups, sched.fired, sched.saved_wakeups()))
+    print('tasks running: %d' % len(tasks))
+    return
+
+def output_stats():
+    """Prints the hot path timings and counters"""
+    snap = metrics.snapshot()
+    if not snap['enabled']:
+        print('Statistics are off. Use `stats on` to collect them.')
+    since = datetime.datetime.fromtimestamp(snap['since']).replace(
+        microsecond=0)
+    print('Statistics since', since)
+    if snap['histograms']:
+        print('%-16s %8s %10s %10s %10s %10s' % ('timer', 'count', 'mean us',
+                                                'p50 us', 'p99 us',
+                                                'max us'))
+    for name, hist in sorted(snap['histograms'].items()):
+        print('%-16s %8d %10.1f %10.1f %10.1f %10.1f' % (
+            name, hist['count'], hist['mean'] * 1e6, hist['p50'] * 1e6,
+            hist['p99'] * 1e6, hist['max'] * 1e6))
+    for name, value in sorted(snap['counters'].items()):
+        print('%-16s %8d' % (name, value))
+    sched = get_scheduler()
+    print('scheduler wakeups: %d, saved vs. polling: %d' %
+          (sched.wakeups, sched.saved_wakeups()))
+    cat = get_catalog()
+    used, bodies = cat.memory()
+    print('catalog: %d objects, %.0f bytes each, %d of %d bodies built' %
+          (len(cat), used / max(1, len(cat)), bodies, cat.cache_size))
+    return
+
+def handle_publish(argv):
+    """Starts or stops keeping the state table up to date"""
+    global state_publisher
+    sched = get_scheduler()
+    sched.cancel_tag('state')
+    if len(argv) > 1 and argv[1] == 'off':
+        print('No longer updating %s' % STATE_FILE)
+        return
+    interval = STATE_INTERVAL
+    try:
+        if len(argv) > 1:
+            interval = parse_duration(argv[1])
+        if interval <= 0:
+            raise ValueError('Invalid duration: %s' % argv[1])
+    except ValueError as e:
+        print(e)
+        return
+    if state_publisher is None or state_publisher.path != STATE_FILE:
+        state_publisher = StatePublisher(STATE_FILE)
+    sched.schedule(clock_time(), 'publish state', state_publisher.publish,
+                   interval=interval, tag='state')
+    print('Updating %s every %g seconds' % (STATE_FILE, interval))
+
+def handle_stats(argv):
+    """Shows, toggles, resets or periodically dumps the statistics"""
+    if len(argv) < 2:
+        output_stats()
+    elif argv[1] == 'on':
+        metrics.enabled = True
+        print('Collecting statistics')
+    elif argv[1] == 'off':
+        metrics.enabled = False
+        print('No longer collecting statistics')
+    elif matches(argv[1], 'reset'):
+        metrics.reset()
+    elif matches(argv[1], 'dump'):
+        sched = get_scheduler()
+        sched.cancel_tag('metrics')
+        if len(argv) < 3 or argv[2] == 'off':
+            print('No longer writing %s' % METRICS_FILE)
+            return
+        try:
+            interval = parse_duration(argv[2])
+        except ValueError as e:
+            print(e)
+            return
+        metrics.enabled = True
+        sched.schedule(clock_time() + interval, 'dump statistics',
+                       lambda: metrics.dump(METRICS_FILE), interval=interval,
+                       tag='metrics')
+        print('Writing %s every %g seconds' % (METRICS_FILE, interval))
+    else:
+        print("Unknown stats argument '%s'" % argv[1])
+    return
+
+def track_satellites(query):
+    """
+    Adds every catalog entry matching query (or the whole catalog for 'all')
+    to the set of satellites tracked together. Returns the number added.
+    """
+    global tracked
+    cat = get_catalog()
+    if query == 'all':
+        indices = range(len(cat))
+    else:
+        indices = cat.search(query)
+    tles = list() if tracked is None else list(tracked.tles)
+    known = set(k[0] for k in tles)
+    added = 0
+    for idx in indices:
+        if cat.name(idx) not in known:
+            tles.append(cat.tle(idx))
+            known.add(cat.name(idx))
+            added = added + 1
+    if added > 0:
+        tracked = SatelliteBatch(tles)
+        update_tracked()
+    return added
+
+def untrack_satellites():
+    """Stops tracking the batch of satellites"""
+    global tracked
+    global tracked_state
+    tracked = None
+    tracked_state = None
+
+def update_tracked():
+    """Propagates every tracked satellite to the tracked time"""
+    global tracked_state
+    when = sync_time()
+    start = metrics.start()
+    tracked_state = tracked.observe(grnd.observer, when)
+    metrics.stop('batch.observe', start)
+
+def output_tracked():
+    """Prints a table of the positions of every tracked satellite"""
+    if tracked is not None:
+        update_tracked()
+    batch = tracked
+    state = tracked_state
+    if batch is None or state is None:
+        print('No satellites are being tracked. Use `track add <name>`.')
+        return
+    print('%-24s %9s %10s %8s %8s %10s' % ('name', 'lat', 'long', 'az',
+                                         'alt', 'range (km)'))
+    for idx, name in enumerate(batch.names):
+        color = COL_GREEN if state['alt'][idx] > 0 else COL_NORMAL
+        print(color + '%-24s %9.3f %10.3f %8.2f %8.2f %10.1f' % (
+            name[:24], state['sublat'][idx] / DEG2RAD,
+            state['sublong'][idx] / DEG2RAD, state['az'][idx] / DEG2RAD,
+            state['alt'][idx] / DEG2RAD, state['range'][idx] / 1000.0) +
+              COL_NORMAL)
+    return
+
+def handle_track(argv):
+    """Handles the track command for following many satellites at once"""
+    if load_numpy() is None:
+        print('Tracking many satellites requires numpy (`pip3 install numpy`)')
+        return
+    if len(argv) < 2 or matches(argv[1], 'show'):
+        output_tracked()
+    elif matches(argv[1], 'add'):
+        if len(argv) < 3:
+            print('Must specify satellites to track')
+            return
+        added = track_satellites(' '.join(argv[2:]))
+        count = 0 if tracked is None else len(tracked)
+        print('Now tracking %d satellites (%d added)' % (count, added))
+    elif matches(argv[1], 'clear'):
+        untrack_satellites()
+        print('No longer tracking any satellites')
+    elif matches(argv[1], 'bench'):
+        if tracked is None:
+            print('No satellites are being tracked')
+            return
+        rate = tracked.throughput(grnd.observer)
+        print('%d satellites: %.0f satellites/second/core' % (len(tracked),
+                                                            rate))
+    else:
+        print("Unknown track argument '%s'" % argv[1])
+    return
+
+def parse_duration(text):
+    """Parses durations such as '90', '30s', '5m', '6h' or '1d' into seconds"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    try:
+        if text[-1:] in units:
+            return float(text[:-1]) * units[text[-1]]
+        return float(text)
+    except ValueError:
+        raise ValueError('Invalid duration: %s' % text)
+
+def is_night(pass_tuple):
+    """returns True if the pass starts while it is night at the ground"""
+    return grnd.is_dark(pass_tuple[0])
+
+def is_visible(body, pass_tuple):
+    """
+    returns True if body can be seen during the pass: it starts at night and
+    the satellite is in sunlight for some of it. Moves body.
+    """
+    return (is_night(pass_tuple) and
+            get_daylight().sunlit_fraction(body, pass_tuple) > 0)
+
+def log_pass(name, pass_tuple):
+    """Appends a pass to the pass log"""
+    aos = ephem.Date(pass_tuple[0]).datetime().replace(microsecond=0)
+    los = ephem.Date(pass_tuple[4]).datetime().replace(microsecond=0)
+    with open(PASS_LOG_FILE, 'a') as fname:
+        fname.write('%s\t%sZ\t%sZ\t%.1f\n' % (name, aos.isoformat(),
+                                              los.isoformat(),
+                                              pass_tuple[3] / ephem.degree))
+
+def get_crontab():
+    """Returns the table of scheduled jobs"""
+    global crontab
+    if crontab is None:
+        crontab = CronTable(CRON_FILE)
+    return crontab
+
+def cron_daemon():
+    """
+    This loads all saved cron jobs and hands them to the scheduler, which
+    runs each job when its deadline comes
+    """
+    table = get_crontab()
+    table.load()
+    get_scheduler().add_planner(table.plan)
+
+def handle_cron(argv):
+    """Lists, adds or removes scheduled jobs"""
+    table = get_crontab()
+    if len(argv) < 2 or matches(argv[1], 'list'):
+        if not table.jobs:
+            print('No jobs are scheduled')
+        for job_id in sorted(table.jobs):
+            print(table.jobs[job_id])
+    elif matches(argv[1], 'add'):
+        try:
+            job = table.add(' '.join(argv[2:]))
+            print('Added job %s' % job)
+        except ValueError as e:
+            print(e)
+    elif matches(argv[1], 'remove'):
+        try:
+            job = table.remove(int(argv[2]))
+            print('Removed job %s' % job)
+        except (IndexError, ValueError) as e:
+            print('Unable to remove job: %s' % e)
+    else:
+        print("Unknown cron argument '%s'" % argv[1])
+    return
+
+def handle_notify(argv):
+    """Lists, adds, removes or tests the notification sinks"""
+    notes = get_notifier()
+    if len(argv) < 2 or matches(argv[1], 'show'):
+        for sink in notes.sinks:
+            print(sink)
+        print('alerts: %d, notifications sent: %d, dropped: %d, sink '
+              'failures: %d' % (notes.posted, notes.sent, notes.dropped,
+                                notes.failed))
+    elif matches(argv[1], 'add'):
+        try:
+            sink = make_sink(' '.join(argv[2:]))
+        except ValueError as e:
+            print(e)
+            return
+        notes.sinks.append(sink)
+        save_sinks(notes.sinks)
+        print('Added notification sink %s' % sink)
+    elif matches(argv[1], 'remove'):
+        if len(argv) < 3:
+            print('Must specify a sink to remove')
+            return
+        kept = [k for k in notes.sinks if k.name != argv[2]]
+        if len(kept) == len(notes.sinks):
+            print("No '%s' notification sink" % argv[2])
+            return
+        for sink in notes.sinks:
+            if sink not in kept:
+                sink.close()
+        notes.sinks[:] = kept
+        save_sinks(kept)
+        print("Removed the '%s' notification sink" % argv[2])
+    elif matches(argv[1], 'test'):
+        alert('This is a test notification from satTracker')
+    else:
+        print("Unknown notify argument '%s'" % argv[1])
+    return
+
+def handle_overhead(argv):
+    """Lists the satellites that rise above an altitude in the next hours"""
+    try:
+        min_alt = float(argv[1]) if len(argv) > 1 else OVERHEAD_ALT
+        hours = float(argv[2]) if len(argv) > 2 else 1
+    except ValueError:
+        print('Usage: overhead [min-altitude] [hours]')
+        return
+    start = ephem.Date(sync_time())
+    found, stats = overhead(start, hours / 24.0, min_alt * ephem.degree)
+    cat = get_catalog()
+    for idx, rise, _raz, _max_time, max_alt, _set_time, _saz in found:
+        peak = '  ?  ' if max_alt is None else '%5.1f' % (max_alt / ephem.degree)
+        print('%s  %s°  %s' % (ephem.localtime(rise).replace(microsecond=0),
+                               peak, cat.name(idx)))
+    print_overhead_stats(stats, sys.stdout)
+    return
+
+def handle_archive(argv):
+    """Displays the TLE archive, or archives the current TLE file"""
+    arch = get_archive()
+    if len(argv) < 2 or matches(argv[1], 'show'):
+        print('%d element sets archived, %.1f MB' %
+              (len(arch), arch.size() / 1e6))
+        sync_time()
+        epochs = arch.epochs(sat.catalog_number)
+        used = ephem_julian(sat.epoch)
+        print('%s has %d, nearest the tracked time:' % (sat.name, len(epochs)))
+        pos = bisect.bisect_left(epochs, used)
+        for epoch in epochs[max(0, pos - 5):pos + 6]:
+            when = ephem.Date(epoch - ephem.julian_date(0))
+            mark = ' <- in use' if abs(epoch - used) < 1e-6 else ''
+            print('  %s UTC%s' % (str(when), mark))
+    elif matches(argv[1], 'add'):
+        print('Archived %d new element sets' % archive_tles())
+    else:
+        print("Unknown archive argument '%s'" % argv[1])
+    return
+
+async def handle_dashboard(argv):
+    """Runs the live dashboard until the user presses enter"""
+    table = False
+    rate = DASH_RATE
+    for arg in argv[1:]:
+        if matches(arg, 'table'):
+            table = True
+            continue
+        try:
+            rate = float(arg)
+        except ValueError:
+            print("Unknown dashboard argument '%s'" % arg)
+            return
+    if not 0 < rate <= 30:
+        print('The rate must be between 0 and 30 frames per second')
+        return
+    dash = Dashboard(table)
+    await dash.run(rate, stop=read_line(''))
+    print_dashboard_stats(dash, sys.stdout)
+
+def print_dashboard_stats(dash, out):
+    frames, written, cpu = dash.stats()
+    print('%d frames, %.0f bytes (%.0f bytes/s) and %.0f us of CPU each' %
+          (frames, written, written * dash.rate, cpu * 1e6), file=out)
+
+def matches(str1, str2):
+    """
+    Takes two strings and returns True if one is a prefix of the other
+    """
+
+    len1 = len(str1)
+    len2 = len(str2)
+
+    if len1 == 0 or len2 == 0:
+        # empty string should return false always
+        return False
+
+    if len1 < len2:
+        return str1 == str2[0:len1]
+    else:
+        return str2 == str1[0:len2]
+
+def usage():
+    """Outputs help info when the user inputs 'help' at the command line"""
+    print("""
+To enter a command to satTracker, enter one or more characters at the start
+of the desired command option.
+
+satTracker command prompt options:
+
+quit                              This quits the application cleanly
+help                              This displays this help message
+clear                             Clear the screen
+update [group ...]                Update the satellites TLE from CelesTrak
+                                  groups (default: those in groups.txt)
+grnd, ground                      Display ground station information
+now                               Display the current time in UTC
+change                            Enter new ground station information
+time [dhms] <int>                 Increase or decrease time by <int> days,
+                                  hours, minutes, or seconds
+time reset                        Reset time to current time
+time warp <factor>|off            Move the tracked time factor times as fast as
+                                  real time, or at the normal rate again
+print (or simply hitting enter)   Display satellite location and time of next
+                                  pass
+list_stations                     Display the station list
+choose_station <satellite-name>   Change the station to a different space
+                                  station in the station list
+dashboard [table] [fps]           Live view of the satellite (and of the
+                                  tracked ones), until you press enter
+track [show]                      Display every tracked satellite
+track add <name-prefix|all>       Track all matching satellites at once
+track clear                       Stop tracking the extra satellites
+track bench                       Measure tracking throughput
+schedule                          Display upcoming events and wakeup counts
+cron [list]                       Display scheduled jobs
+cron add <job>                    Schedule a job, e.g.
+                                    every 6h update
+                                    pass night 5m notify ISS (ZARYA)
+                                    pass visible notify ISS (ZARYA)
+                                    pass log STARLINK*
+cron remove <id>                  Remove a scheduled job
+stats                             Display hot path timings and counters
+stats on|off|reset                Start, stop or reset collecting statistics
+stats dump <duration>|off         Periodically write statistics to
+                                  metrics.json
+notify [show]                     Display notification sinks and counters
+notify add <sink>                 Also send alerts to a sink: stdout, dbus,
+                                  log [<file>] or webhook <url>
+notify remove <stdout|dbus|log|webhook>
+                                  Stop sending alerts to a sink
+notify test                       Send a test notification
+archive [show]                    Display the archived element sets of the
+                                  satellite (the one nearest the tracked time
+                                  is used)
+archive add                       Archive the current TLE file now
+overhead [degrees] [hours]        List the satellites rising above degrees
+                                  (default 30) in the next hours (default 1)
+publish [<duration>]|off          Keep the satellite's (and the tracked ones')
+                                  position and next pass in state.bin for
+                                  other programs, every duration (default 1s)
+
+Non-interactive commands (run `satTracker.py <command> --help` for options):
+
+satTracker.py now [name]          Print a satellite's position and next pass
+                                  as JSON
+satTracker.py list [prefix]       List the satellites in the TLE file
+satTracker.py passes [name ...]   Predict every pass of every satellite in the
+                                  TLE file, or of those named, as CSV or JSON
+                                  lines
+satTracker.py coverage <name>     Predict one satellite's passes over a grid
+                                  of ground sites as CSV
+satTracker.py stream [name ...]   Stream pointing, range rate and Doppler at
+                                  10-50 Hz through the next pass, in real
+                                  time
+satTracker.py dashboard [name]    Show a live view of a satellite (and, with
+                                  --track, a table of many) until Ctrl-C
+satTracker.py serve               Answer position, pass and catalog queries
+                                  from scripts over a local HTTP/JSON API
+satTracker.py overhead            List the satellites that rise above 30° in
+                                  the next hour
+satTracker.py conjunctions [name] Find the objects passing within a few km of
+                                  a satellite (or, with --all, of each other)
+satTracker.py replay [name]       Replay a week of passes, jobs and alerts
+                                  on a simulated clock, as fast as possible
+satTracker.py state [name ...]    Print the state a running tracker publishes
+                                  (see `publish`), or time reads of it
+satTracker.py export [name ...]   Write ground tracks and look angles as
+                                  memory-mappable .npy arrays
+satTracker.py telemetry [name]    Print the satellite states logged while
+                                  the tracker runs
+""")
+    return
+
+async def prompt():
+    """Creates a command line within the program"""
+    try:
+        while 1:
+            text = await read_line('\nPress enter to see values, q to quit: ')
+            if text is None:
+                # end of input
+                kill_program(0)
+            start = metrics.start()
+            key_list = list()
+            key = ''
+            if text != '':
+                key_list = text.split()
+                key = key_list[0]
+
+            if (matches(key, 'quit') or key == 'Q' or key == ';q' or
+                    key == 'exit'):
+                kill_program(0)
+                sys.exit(0) # redundant, but safe
+            elif matches(key, 'help') or key == '--help':
+                usage()
+            elif matches(key, 'clear') or key == 'cls':
+                clear_screen()
+            elif matches(key, 'update'):
+                try:
+                    print('Updating your TLE...')
+                    groups = key_list[1:] if len(key_list) > 1 else None
+                    statuses = await update_tle_async(groups)
+                    for group, status in sorted(statuses.items()):
+                        state = 'unchanged' if status == 304 else 'updated'
+                        print('%s: %s' % (group, state))
+                    print('Successfully updated your TLE!')
+                except (ValueError, IOError):
+                    print('Unable to update TLE. Check your network connection')
+            elif matches(key, 'grnd') or key == 'ground':
+                output_grnd()
+            elif matches(key, 'choose_station'):
+                if len(key_list) < 2:
+                    print('Must specify a station to change to')
+                    metrics.stop('prompt', start)
+                    continue
+                my_sat = ' '.join(key_list[1:])
+                nick_name = None
+                cat = get_catalog()
+                idx = cat.exact(my_sat)
+                if idx is not None:
+                    station = cat.name(idx)
+                    print('Switching to satellite %s' % station)
+                    nick_name = await read_line('Enter a short name: ') or ''
+                    set_satellite(station, nick_name)
+                else:
+                    matches_found = [cat.name(k) for k in cat.search(my_sat, 5)]
+                    if matches_found:
+                        print('Did you mean: ' + ', '.join(matches_found))
+                if nick_name is None:
+                    print('Unable to find a satellite named "%s"' % my_sat)
+            elif matches(key, 'list_stations'):
+                for k in all_stations():
+                    print(k)
+            elif matches(key, 'now'):
+                output_now()
+            elif matches(key, 'change'):
+                print('Please enter information for your ground observer:')
+                answers = list()
+                for question in GRND_QUESTIONS:
+                    answers.append(await read_line(question) or '')
+                update_grnd(answers)
+                try:
+                    set_grnd()
+                    print('Your update of ground station info is complete.')
+                    output_grnd()
+                except ValueError:
+                    print('It appears there was an error with your grnd values.')
+                    kill_program(1)
+            elif matches(key, 'time'):
+                handle_time(key_list)
+            elif matches(key, 'track'):
+                handle_track(key_list)
+            elif matches(key, 'schedule'):
+                output_schedule()
+            elif matches(key, 'cron'):
+                handle_cron(key_list)
+            elif matches(key, 'stats'):
+                handle_stats(key_list)
+            elif matches(key, 'notify'):
+                handle_notify(key_list)
+            elif matches(key, 'publish'):
+                handle_publish(key_list)
+            elif matches(key, 'archive'):
+                handle_archive(key_list)
+            elif matches(key, 'overhead'):
+                handle_overhead(key_list)
+            elif matches(key, 'dashboard'):
+                await handle_dashboard(key_list)
+
+            else:
+                output_sat()
+            metrics.stop('prompt', start)
+    except Exception as e:
+        print(type(e))
+        print(e)
+        kill_program(1)
+
+
+
+#######################################
+## Batch pass prediction
+#######################################
+
+# per-process state for pass prediction workers
+worker_tles = None
+worker_ground = None
+
+def passes_worker_init(tles, latitude, longitude, elevation):
+    """Gives a worker process the catalog and the ground station"""
+    global worker_tles
+    global worker_ground
+    worker_tles = tles
+    worker_ground = Ground(latitude, longitude, elevation)
+
+def passes_worker(shard, shards, start, end, visibility=False):
+    """
+    Predicts every pass rising in [start, end) for satellites shard, shard +
+    shards, shard + 2 * shards, ... of the worker's catalog. Returns rows of
+    (rise_time, name, norad, max_time, max_alt, set_time, rise_az, set_az)
+    sorted by rise time. With visibility, rows also end with whether the
+    pass is at night and the fraction of it the satellite is sunlit.
+    """
+    observer = worker_ground.observer
+    rows = list()
+    row_tles = list()
+    for idx in range(shard, len(worker_tles), shards):
+        name, line1, line2 = worker_tles[idx]
+        try:
+            body = ephem.readtle(name, line1, line2)
+        except ValueError:
+            continue
+        observer.date = start
+        while True:
+            try:
+                pass_tuple = observer.next_pass(body)
+            except ValueError:
+                # never rises, never sets, or too far from the TLE epoch
+                break
+            rise_time, rise_az, max_time, max_alt, set_time, set_az = pass_tuple
+            if rise_time is None or set_time is None or rise_time >= end:
+                break
+            rows.append((float(rise_time), name, line1[2:7].strip(),
+                         float(max_time), float(max_alt), float(set_time),
+                         float(rise_az), float(set_az)))
+            row_tles.append(worker_tles[idx])
+            observer.date = set_time + ephem.second
+    if visibility:
+        windows = [(k[0], k[6], k[3], k[4], k[5], k[7]) for k in rows]
+        classes = get_daylight().visibility(row_tles, windows, observer)
+        rows = [row + cls for row, cls in zip(rows, classes)]
+    rows.sort()
+    return rows
+
+def iso_date(date, timespec='seconds'):
+    """Returns ephem date date as ISO 8601 UTC, e.g. 2024-03-01T12:00:00Z"""
+    return ephem.Date(date).datetime().isoformat(timespec=timespec) + 'Z'
+
+def format_pass(row, fmt):
+    """Formats a passes_worker() row as a CSV line or a JSON object"""
+    import csv
+    rise_time, name, norad, max_time, max_alt, set_time, rise_az, set_az = row[:8]
+    fields = [('aos', iso_date(rise_time)), ('name', name), ('norad', norad),
+              ('tca', iso_date(max_time)),
+              ('max_alt', round(max_alt / ephem.degree, 2)),
+              ('los', iso_date(set_time)),
+              ('aos_az', round(rise_az / ephem.degree, 2)),
+              ('los_az', round(set_az / ephem.degree, 2))]
+    if len(row) > 8:
+        fields.append(('night', row[8]))
+        fields.append(('sunlit', round(row[9], 2)))
+    if fmt == 'json':
+        return json.dumps(dict(fields))
+    out = io.StringIO()
+    csv.writer(out, lineterminator='').writerow([k[1] for k in fields])
+    return out.getvalue()
+
+def batch_passes(start, days, workers, fmt='csv', out=sys.stdout, tles=None,
+                 visibility=False):
+    """
+    Predicts the passes of every satellite in tles (default: the whole
+    catalog) over the ground station, spreading shards of them across a
+    process pool. Results are streamed one day at a time, sorted by AOS.
+    With visibility, each pass is also classified as night or day and by
+    how much of it the satellite is sunlit. Returns the number of passes
+    written.
+    """
+    if tles is None:
+        cat = get_catalog()
+        tles = cat.tles()
+    workers = max(1, min(workers, len(tles)))
+    header = ['aos', 'name', 'norad', 'tca', 'max_alt', 'los', 'aos_az',
+              'los_az']
+    if visibility:
+        header = header + ['night', 'sunlit']
+    if fmt == 'csv':
+        out.write(','.join(header) + '\n')
+    count = 0
+    initargs = (tles, grnd.latitude(), grnd.longitude(), grnd.elevation())
+    if workers == 1:
+        # a single shard is cheaper in this process than in a pool
+        passes_worker_init(*initargs)
+        pool = None
+    else:
+        import concurrent.futures
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=passes_worker_init,
+            initargs=initargs)
+    try:
+        day = ephem.Date(start)
+        end = ephem.Date(start + days)
+        while day < end:
+            day_end = ephem.Date(min(day + 1, end))
+            if pool is None:
+                shards = [passes_worker(0, 1, day, day_end, visibility)]
+            else:
+                futures = [pool.submit(passes_worker, k, workers, day,
+                                       day_end, visibility)
+                           for k in range(workers)]
+                shards = [k.result() for k in futures]
+            for row in heapq.merge(*shards):
+                out.write(format_pass(row, fmt) + '\n')
+                count = count + 1
+            out.flush()
+            day = day_end
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return count
+
+def export_tracks(batch, start, days, step, out_dir, dtype='float32'):
+    """
+    Writes the ground track and look angles of every satellite of a
+    SatelliteBatch, from ephem date start for days every step seconds, as
+    .npy files in out_dir: time.npy holds the unix time of each sample and
+    each of EXPORT_COLUMNS a (samples, satellites) array. Samples are
+    propagated EXPORT_CHUNK positions at a time and appended to the files,
+    so memory use doesn't grow with the span; np.load(path, mmap_mode='r')
+    maps the results without copying. Deep-space satellites are NaN.
+    header.json, describing the arrays, is written last. Returns it.
+    """
+    samples = int(days * 86400.0 / step) + 1
+    count = len(batch)
+    rows = max(1, EXPORT_CHUNK // max(1, count))
+    observer = grnd.observer
+    names = ['time'] + [k[0] for k in EXPORT_COLUMNS]
+    dtypes = dict((name, np.dtype(dtype)) for name in names)
+    dtypes['time'] = np.dtype('<f8')
+    shapes = dict((name, (samples, count)) for name in names)
+    shapes['time'] = (samples,)
+    files = dict()
+    try:
+        for name in names:
+            files[name] = open(os.path.join(out_dir, name + '.npy'), 'wb')
+            np.lib.format.write_array_header_1_0(files[name], {
+                'descr': np.lib.format.dtype_to_descr(dtypes[name]),
+                'fortran_order': False, 'shape': shapes[name]})
+        start_jd = ephem_julian(ephem.Date(start))
+        start_unix = (float(start) - UNIX_EPOCH) * 86400.0
+        for first in range(0, samples, rows):
+            offsets = np.arange(first, min(samples, first + rows)) * step
+            jd = (start_jd + offsets / 86400.0)[:, None]
+            with np.errstate(all='ignore'):
+                pos, _vel = batch.propagate(jd)
+                look = teme_look_angles(pos, jd, observer.lat, observer.long,
+                                        observer.elev, observer.pressure,
+                                        observer.temp)
+            (start_unix + offsets).tofile(files['time'])
+            for name, key, scale, _unit in EXPORT_COLUMNS:
+                (look[key] * scale).astype(dtypes[name]).tofile(files[name])
+    finally:
+        for fname in files.values():
+            fname.close()
+
+    satellites = list()
+    for (name, line1, line2), deep in zip(batch.tles, batch.deep):
+        satellites.append({
+            'name': name, 'norad': norad_number(line1[2:7]),
+            'epoch': iso_date(tle_epoch(line1) - ephem.julian_date(0)),
+            'line1': line1, 'line2': line2, 'deep_space': bool(deep)})
+    arrays = {'time': {'file': 'time.npy', 'shape': [samples],
+                       'dtype': dtypes['time'].str, 'unit': 'unix seconds'}}
+    for name, _key, _scale, unit in EXPORT_COLUMNS:
+        arrays[name] = {'file': name + '.npy', 'shape': [samples, count],
+                        'dtype': dtypes[name].str, 'unit': unit}
+    header = {
+        'start': iso_date(start), 'step': step, 'samples': samples,
+        'observer': {'lat': math.degrees(observer.lat),
+                     'long': math.degrees(observer.long),
+                     'elevation': observer.elev},
+        'satellites': satellites, 'arrays': arrays,
+    }
+    tmp_file = os.path.join(out_dir, 'header.json.tmp')
+    with open(tmp_file, 'w') as fname:
+        json.dump(header, fname, indent=1)
+        fname.write('\n')
+    os.replace(tmp_file, os.path.join(out_dir, 'header.json'))
+    return header
+
+def load_station():
+    """
+    Loads the ground station for a one-shot command. Returns False, after
+    printing why, if that is not possible.
+    """
+    if not is_installed():
+        print('satTracker is not installed. Run it once interactively first.',
+              file=sys.stderr)
+        return False
+    try:
+        set_grnd()
+    except ValueError:
+        print('Unable to load valid ground information', file=sys.stderr)
+        return False
+    return True
+
+def passes_command(argv):
+    """Entry point for `satTracker.py passes`: predict passes and exit"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py passes',
+        description='Predict every pass over your ground station for every '
+                    'satellite in the TLE file, or for those named')
+    parser.add_argument('satellite', nargs='*',
+                        help='satellite names, prefixes or NORAD ids '
+                             '(default: all of them)')
+    parser.add_argument('--days', type=float, default=7,
+                        help='length of the prediction window (default 7)')
+    parser.add_argument('--start', default=None,
+                        help="UTC start time, e.g. '2024/1/1 12:00' "
+                             "(default now)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                        help='csv, or json for one JSON object per line')
+    parser.add_argument('--visibility', action='store_true',
+                        help='add whether each pass is at night and the '
+                             'fraction of it the satellite is sunlit')
+    args = parser.parse_args(argv)
+
+    if not load_station():
+        return 1
+    tles = None
+    if args.satellite:
+        cat = get_catalog()
+        tles = list()
+        for query in args.satellite:
+            idx = cat.find(query)
+            if idx is None:
+                print('Unable to find a satellite named "%s"' % query,
+                      file=sys.stderr)
+                return 1
+            tles.append(cat.tle(idx))
+    start = ephem.now() if args.start is None else ephem.Date(args.start)
+
+    begin = time.perf_counter()
+    count = batch_passes(start, args.days, args.workers, args.format,
+                         tles=tles, visibility=args.visibility)
+    elapsed = time.perf_counter() - begin
+    satellites = len(get_catalog()) if tles is None else len(tles)
+    print('%d passes for %d satellites in %.2f s with %d workers' %
+          (count, satellites, elapsed, max(1, min(args.workers, satellites))),
+          file=sys.stderr)
+    return 0
+
+def now_command(argv):
+    """Entry point for `satTracker.py now`: print a satellite's position"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py now',
+        description='Print where a satellite is and when it next passes over '
+                    'your ground station, as JSON')
+    parser.add_argument('satellite', nargs='?', default=None,
+                        help='satellite name, prefix or NORAD id (default: '
+                             'the one last chosen at the prompt)')
+    parser.add_argument('--time', default=None,
+                        help="UTC time, e.g. '2024/1/1 12:00' (default now)")
+    args = parser.parse_args(argv)
+
+    if not load_station():
+        return 1
+    when = ephem.now() if args.time is None else ephem.Date(args.time)
+    try:
+        if args.satellite is None:
+            body = read_satellite(*get_current(), when=when)
+        else:
+            body = read_satellite(args.satellite, when=when)
+    except (IOError, IndexError, ValueError):
+        print('Unable to find a satellite named "%s"' %
+              (args.satellite or ISS_FULL_NAME), file=sys.stderr)
+        return 1
+    try:
+        doc = position_doc(body, when)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(doc))
+    return 0
+
+def position_doc(body, when):
+    """
+    Returns what `now` and the server's /now report about body at ephem
+    date when: where it is, and its pass in progress or next pass
+    @throws ValueError if body can't be computed for when
+    """
+    grnd.set_date(when)
+    body.compute(grnd.observer)
+    doc = {'name': body.name, 'time': iso_date(when),
+           'lat': round(body.sublat / ephem.degree, 4),
+           'long': round(body.sublong / ephem.degree, 4),
+           'elevation': round(body.elevation / 1000.0, 3),
+           'az': round(body.az / ephem.degree, 2),
+           'alt': round(body.alt / ephem.degree, 2),
+           'range': round(body.range / 1000.0, 3),
+           'eclipsed': bool(body.eclipsed), 'next_pass': None}
+    try:
+        doc['next_pass'] = pass_doc(body, grnd.next_pass(body))
+    except ValueError:
+        pass # never passes over the ground station
+    return doc
+
+def pass_doc(body, pass_tuple):
+    """Returns a pass window as the JSON `now` and the server report"""
+    return {'aos': iso_date(pass_tuple[0]), 'tca': iso_date(pass_tuple[2]),
+            'max_alt': round(pass_tuple[3] / ephem.degree, 2),
+            'los': iso_date(pass_tuple[4]), 'night': is_night(pass_tuple),
+            'visible': is_visible(body, pass_tuple)}
+
+def list_command(argv):
+    """Entry point for `satTracker.py list`: print the catalog's names"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py list',
+        description='List the satellites in the TLE file, or those matching '
+                    'a name prefix, best match first')
+    parser.add_argument('query', nargs='?', default=None,
+                        help='name prefix or NORAD id')
+    parser.add_argument('--format', choices=['text', 'json'], default='text',
+                        help='names one per line, or JSON lines with NORAD '
+                             'ids')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(TLE_FILE):
+        print('No TLE file. Run satTracker.py once interactively first.',
+              file=sys.stderr)
+        return 1
+    cat = get_catalog()
+    if args.query is None:
+        found = range(len(cat))
+    else:
+        found = cat.search(args.query)
+    for idx in found:
+        if args.format == 'json':
+            print(json.dumps({'name': cat.name(idx), 'norad': cat.norad(idx)}))
+        else:
+            print(cat.name(idx))
+    return 0
+
+def coverage_command(argv):
+    """Entry point for `satTracker.py coverage`: passes over a grid of sites"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py coverage',
+        description='Predict the passes of one satellite over a grid of '
+                    'ground sites')
+    parser.add_argument('satellite', help='satellite name, prefix or NORAD id')
+    parser.add_argument('--lat', type=float, nargs=3, default=[-60, 60, 5],
+                        metavar=('MIN', 'MAX', 'STEP'),
+                        help='latitude range in degrees (default -60 60 5)')
+    parser.add_argument('--long', type=float, nargs=3,
+                        default=[-180, 175, 5], metavar=('MIN', 'MAX', 'STEP'),
+                        help='longitude range in degrees (default -180 175 5)')
+    parser.add_argument('--elev', type=float, default=0,
+                        help='site elevation in meters (default 0)')
+    parser.add_argument('--hours', type=float, default=24,
+                        help='length of the prediction window (default 24)')
+    parser.add_argument('--start', default=None,
+                        help="UTC start time, e.g. '2024/1/1 12:00' "
+                             "(default now)")
+    parser.add_argument('--step', type=float, default=GRID_STEP,
+                        help='seconds between samples (default %d)' %
+                             GRID_STEP)
+    args = parser.parse_args(argv)
+
+    if load_numpy() is None:
+        print('The coverage command requires numpy', file=sys.stderr)
+        return 1
+    cat = get_catalog()
+    idx = cat.find(args.satellite)
+    if idx is None:
+        print('Unable to find a satellite named "%s"' % args.satellite,
+              file=sys.stderr)
+        return 1
+    lats = np.arange(args.lat[0], args.lat[1] + args.lat[2] / 2, args.lat[2])
+    longs = np.arange(args.long[0], args.long[1] + args.long[2] / 2,
+                      args.long[2])
+    grid_lat, grid_long = np.meshgrid(lats, longs, indexing='ij')
+    grid = GroundGrid(grid_lat.ravel() * ephem.degree,
+                      grid_long.ravel() * ephem.degree, args.elev)
+    start = ephem.now() if args.start is None else ephem.Date(args.start)
+    batch = SatelliteBatch([cat.tle(idx)])
+    try:
+        found = grid.passes(batch, start, args.hours / 24.0, args.step)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    import csv
+    out = csv.writer(sys.stdout, lineterminator='\n')
+    out.writerow(['lat', 'long', 'aos', 'tca', 'max_alt', 'los'])
+    for site, site_passes in enumerate(found):
+        for pass_tuple in site_passes:
+            out.writerow([grid_lat.flat[site], grid_long.flat[site],
+                          iso_date(pass_tuple[0]), iso_date(pass_tuple[2]),
+                          round(pass_tuple[3] / ephem.degree, 2),
+                          iso_date(pass_tuple[4])])
+    timing = grid.last_timing
+    print('%s: %d sites, %d samples each, %.2f s (%.1f us per site)' %
+          (cat.name(idx), timing['sites'], timing['samples'],
+           timing['seconds'], timing['per_site'] * 1e6), file=sys.stderr)
+    return 0
+
+def stream_command(argv):
+    """Entry point for `satTracker.py stream`: high-rate pointing during passes"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py stream',
+        description='Stream az/el, range, range rate and Doppler for the next '
+                    'pass of one or more satellites, in real time, e.g. for '
+                    'rotator control and Doppler correction')
+    parser.add_argument('satellite', nargs='*',
+                        help='satellite names, prefixes or NORAD ids '
+                             '(default: the one last chosen at the prompt)')
+    parser.add_argument('--rate', type=float, default=STREAM_RATE,
+                        help='samples per second (default %d)' % STREAM_RATE)
+    parser.add_argument('--freq', type=float, default=None,
+                        help='downlink frequency in MHz, to add the Doppler '
+                             'shifted frequency')
+    parser.add_argument('--start', default=None,
+                        help="UTC time, e.g. '2024/1/1 12:00', to stream the "
+                             "passes after it at once instead of in real "
+                             "time")
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                        help='csv, or json for one JSON object per line')
+    args = parser.parse_args(argv)
+
+    if not load_station():
+        return 1
+    if not 0 < args.rate <= 1000:
+        print('The rate must be between 0 and 1000 per second',
+              file=sys.stderr)
+        return 1
+    cat = get_catalog()
+    queries = args.satellite
+    if not queries:
+        try:
+            queries = [get_current()[0]]
+        except (IOError, IndexError):
+            queries = [ISS_FULL_NAME]
+    start = ephem.now() if args.start is None else ephem.Date(args.start)
+    passes = list()
+    for query in queries:
+        idx = cat.find(query)
+        if idx is None:
+            print('Unable to find a satellite named "%s"' % query,
+                  file=sys.stderr)
+            return 1
+        body = ephem.readtle(*cat.tle(idx))
+        observer = grnd.observer.copy()
+        observer.date = start
+        try:
+            window = PassCache(1).next_pass(body, observer, start)
+            eph = PassEphemeris(body, observer, window[0], window[4])
+        except ValueError as e:
+            print('%s: %s' % (cat.name(idx), e), file=sys.stderr)
+            continue
+        print('%s: AOS %s, LOS %s, %d segments from %d pyephem samples in '
+              '%.1f ms, within %.5f° pointing, %.2f m range, %.4f m/s range '
+              'rate' % (cat.name(idx), eph.start, eph.end, len(eph.segments),
+                        eph.samples, eph.fit_seconds * 1e3,
+                        eph.error[0] / ephem.degree, eph.error[1],
+                        eph.error[2]), file=sys.stderr)
+        passes.append(eph)
+    if not passes:
+        return 1
+    return stream_passes(passes, args.rate, args.freq, args.format,
+                         realtime=args.start is None)
+
+def stream_passes(passes, rate, freq=None, fmt='csv', out=sys.stdout,
+                  realtime=True):
+    """
+    Writes the state of every PassEphemeris in passes rate times a second
+    while it is in its pass. In real time, each second's samples are
+    evaluated together and each is written when it falls due.
+    """
+    import csv
+    fields = ['time', 'name', 'az', 'alt', 'range', 'range_rate',
+              'az_rate', 'alt_rate', 'doppler']
+    if freq is not None:
+        fields.append('freq')
+    writer = csv.writer(out, lineterminator='\n')
+    if fmt == 'csv':
+        writer.writerow(fields)
+    interval = 1.0 / rate
+    first = min(k.start for k in passes)
+    last = max(k.end for k in passes)
+    tick = 0
+    written = 0
+    cpu = time.process_time()
+    while True:
+        times = [first + (tick + k) * interval * ephem.second
+                 for k in range(max(1, int(rate)))]
+        rows = list()
+        for eph in passes:
+            live = [k for k in times if eph.start <= k <= eph.end]
+            if not live:
+                continue
+            if load_numpy() is not None:
+                states = eph.block(live).tolist()
+            else:
+                states = [eph.state(k) for k in live]
+            rows.extend((date, eph.name, state)
+                        for date, state in zip(live, states))
+        rows.sort(key=lambda k: k[0])
+        for date, name, state in rows:
+            if realtime:
+                delay = (date - UNIX_EPOCH) * 86400.0 - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            az, alt, rng, range_rate, az_rate, alt_rate = state
+            doppler = 1.0 - range_rate / SPEED_OF_LIGHT
+            row = [ephem.Date(date).datetime().isoformat(
+                       timespec='milliseconds') + 'Z', name,
+                   round(az / ephem.degree, 4), round(alt / ephem.degree, 4),
+                   round(rng, 1), round(range_rate, 3),
+                   round(az_rate / ephem.degree, 5),
+                   round(alt_rate / ephem.degree, 5), '%.10f' % doppler]
+            if freq is not None:
+                row.append('%.6f' % (freq * doppler))
+            if fmt == 'csv':
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(dict(zip(fields, row))) + '\n')
+            if realtime:
+                out.flush()
+            written = written + 1
+        tick = tick + len(times)
+        if first + tick * interval * ephem.second > last:
+            break
+    cpu = time.process_time() - cpu
+    print('%d samples, %.1f us of CPU each' % (written, cpu * 1e6 /
+                                                max(1, written)),
+          file=sys.stderr)
+    return 0
+
+def serve_command(argv):
+    """Entry point for `satTracker.py serve`: the local HTTP/JSON API"""
+    import argparse
+    import asyncio
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py serve',
+        description='Answer position, pass and catalog queries over HTTP '
+                    'with JSON, sharing one set of caches between every '
+                    'client: GET /now?sat=ISS&time=..., '
+                    '/passes?sat=ISS&count=5, /catalog?q=STARLINK&limit=100 '
+                    'and /stats')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on (default 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=SERVER_PORT,
+                        help='port to listen on (default %d)' % SERVER_PORT)
+    parser.add_argument('--cache', type=int, default=SERVER_CACHE_SIZE,
+                        help='responses kept (default %d)' %
+                             SERVER_CACHE_SIZE)
+    args = parser.parse_args(argv)
+
+    if not load_station():
+        return 1
+    if not os.path.exists(TLE_FILE):
+        print('No TLE file. Run satTracker.py once interactively first.',
+              file=sys.stderr)
+        return 1
+    server = QueryServer(args.cache)
+
+    async def run():
+        main_task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, main_task.cancel)
+        address = await server.start(args.host, args.port)
+        print('Serving on http://%s:%d' % address[:2], file=sys.stderr)
+        try:
+            await server.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except OSError as e:
+        print('Unable to listen on %s:%d: %s' % (args.host, args.port, e),
+              file=sys.stderr)
+        return 1
+    print('%d requests, %.1f%% from the cache' %
+          (server.requests, 100.0 * server.hits / max(1, server.requests)),
+          file=sys.stderr)
+    return 0
+
+def dashboard_command(argv):
+    """Entry point for `satTracker.py dashboard`: the live dashboard"""
+    import argparse
+    import asyncio
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py dashboard',
+        description='Show a live view of a satellite, and optionally a table '
+                    'of many, redrawing only what changes (Ctrl-C to stop)')
+    parser.add_argument('satellite', nargs='?', default=None,
+                        help='satellite name, prefix or NORAD id (default: '
+                             'the one last chosen at the prompt)')
+    parser.add_argument('--track', default=None,
+                        help="also show a table of every satellite matching "
+                             "this name prefix, or 'all'")
+    parser.add_argument('--rate', type=float, default=DASH_RATE,
+                        help='frames per second (default %d)' % DASH_RATE)
+    parser.add_argument('--frames', type=int, default=None,
+                        help='stop after this many frames and print the '
+                             'bytes and CPU time they took')
+    args = parser.parse_args(argv)
+
+    if not load_station():
+        return 1
+    if not 0 < args.rate <= 30:
+        print('The rate must be between 0 and 30 frames per second',
+              file=sys.stderr)
+        return 1
+    global sat, p_time, displacement, is_frozen
+    p_time = datetime.datetime.now(datetime.UTC)
+    displacement = datetime.timedelta()
+    is_frozen = False
+    try:
+        if args.satellite is None:
+            sat = read_satellite(*get_current())
+        else:
+            sat = read_satellite(args.satellite)
+    except (IOError, IndexError, ValueError):
+        print('Unable to find a satellite named "%s"' %
+              (args.satellite or ISS_FULL_NAME), file=sys.stderr)
+        return 1
+    if args.track is not None:
+        if load_numpy() is None:
+            print('Tracking many satellites requires numpy', file=sys.stderr)
+            return 1
+        track_satellites(args.track)
+    dash = Dashboard(args.track is not None)
+    try:
+        asyncio.run(dash.run(args.rate, frames=args.frames))
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print_dashboard_stats(dash, sys.stderr)
+    return 0
+
+def replay_command(argv):
+    """Entry point for `satTracker.py replay`: simulate a stretch of time"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py replay',
+        description='Replay a stretch of time through the scheduler, the '
+                    'cron jobs and the notification sinks, as fast as '
+                    'possible or a number of times real time. A replay '
+                    'runs offline and sends the same alerts every time.')
+    parser.add_argument('satellite', nargs='?', default=None,
+                        help='satellite name, prefix or NORAD id to follow '
+                             '(default: the one last chosen at the prompt)')
+    parser.add_argument('--start', default=None,
+                        help="UTC start time, e.g. '2024/1/1 12:00' "
+                             "(default now)")
+    parser.add_argument('--days', type=float, default=7,
+                        help='length of the replay (default 7)')
+    parser.add_argument('--speed', type=float, default=None,
+                        help='run this many times as fast as real time '
+                             '(default: as fast as possible)')
+    parser.add_argument('--job', action='append', default=None,
+                        help="a job to run instead of those in cron.txt, "
+                             "e.g. 'pass night 5m notify STARLINK*'; may be "
+                             "repeated")
+    parser.add_argument('--sink', action='append', default=None,
+                        help="where alerts go instead of stdout, e.g. "
+                             "'log alerts.log'; may be repeated")
+    parser.add_argument('--pass-log', default=os.devnull,
+                        help='file that `pass log` jobs append to (default: '
+                             'none, so passes.log is left alone)')
+    parser.add_argument('--step', type=float, default=REPLAY_STEP,
+                        help='seconds between samples of the batched pass '
+                             'search (default %d)' % REPLAY_STEP)
+    parser.add_argument('--events', action='store_true',
+                        help='print every event as it fires')
+    args = parser.parse_args(argv)
+
+    if not load_station():
+        return 1
+    if args.days <= 0 or args.step <= 0 or (args.speed is not None and
+                                            args.speed <= 0):
+        print('The days, speed and step must be positive', file=sys.stderr)
+        return 1
+    global sat, p_time, displacement, notifier, PASS_LOG_FILE
+    start = ephem.now() if args.start is None else ephem.Date(args.start)
+    end = ephem.Date(start + args.days)
+    p_time = ephem.Date(start).datetime().replace(tzinfo=datetime.UTC)
+    displacement = datetime.timedelta()
+    try:
+        if args.satellite is None:
+            sat = read_satellite(*get_current(), when=start)
+        else:
+            sat = read_satellite(args.satellite, when=start)
+    except (IOError, IndexError, ValueError):
+        print('Unable to find a satellite named "%s"' %
+              (args.satellite or ISS_FULL_NAME), file=sys.stderr)
+        return 1
+    try:
+        notifier = Notifier([make_sink(k) for k in args.sink or ['stdout']])
+        table = get_crontab()
+        if args.job is None:
+            table.load()
+        else:
+            table.jobs = dict((k + 1, Job(k + 1, spec))
+                              for k, spec in enumerate(args.job))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    PASS_LOG_FILE = args.pass_log
+
+    begin = time.perf_counter()
+    cat = get_catalog()
+    rows = set()
+    idx = cat.exact(sat.name)
+    if idx is not None:
+        rows.add(idx)
+    for job in table.jobs.values():
+        if job.kind == 'pass':
+            rows.update(cat.exact(k) for k in table.targets(job))
+    windows = 0
+    if rows and load_numpy() is not None:
+        # the passes after the last ones in the replay are planned too
+        windows = prefill_passes(sorted(rows), start,
+                                 ephem.Date(end + REPLAY_LOOKAHEAD),
+                                 args.step)
+    prefill = time.perf_counter() - begin
+
+    def trace(event):
+        when = datetime.datetime.fromtimestamp(clock_time(), datetime.UTC)
+        print('%sZ  %s' % (when.replace(microsecond=0, tzinfo=None)
+                           .isoformat(), event.name))
+    try:
+        sched = replay(start, end, args.speed,
+                       trace if args.events else None)
+    except KeyboardInterrupt:
+        return 1
+    finally:
+        for sink in notifier.sinks:
+            sink.close()
+    elapsed = time.perf_counter() - begin
+    print('%g days replayed in %.2f s (%.0f times real time): %d events, '
+          '%d alerts' % (args.days, elapsed,
+                         args.days * 86400 / max(elapsed, 1e-9), sched.fired,
+                         notifier.posted), file=sys.stderr)
+    print('%d passes of %d satellites found in %.2f s' %
+          (windows, len(rows), prefill), file=sys.stderr)
+    return 0
+
+def overhead_command(argv):
+    """Entry point for `satTracker.py overhead`: what will be overhead soon"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py overhead',
+        description='List the satellites in the TLE file that rise above an '
+                    'altitude over your ground station soon')
+    parser.add_argument('--min-alt', type=float, default=OVERHEAD_ALT,
+                        help='degrees above the horizon (default %d)' %
+                             OVERHEAD_ALT)
+    parser.add_argument('--hours', type=float, default=1,
+                        help='length of the window (default 1)')
+    parser.add_argument('--start', default=None,
+                        help="UTC start time, e.g. '2024/1/1 12:00' "
+                             "(default now)")
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                        help='csv, or json for one JSON object per line')
+    args = parser.parse_args(argv)
+
+    if not load_station():
+        return 1
+    start = ephem.now() if args.start is None else ephem.Date(args.start)
+    found, stats = overhead(start, args.hours / 24.0,
+                            args.min_alt * ephem.degree)
+
+    import csv
+    def iso(date):
+        # next_pass() leaves out a rise or set it can't find
+        return None if date is None else iso_date(date)
+    cat = get_catalog()
+    fields = ['aos', 'name', 'norad', 'tca', 'max_alt', 'los']
+    out = csv.writer(sys.stdout, lineterminator='\n')
+    if args.format == 'csv':
+        out.writerow(fields)
+    for idx, rise, _raz, max_time, max_alt, set_time, _saz in found:
+        row = [iso(rise), cat.name(idx), cat.norad(idx), iso(max_time),
+               None if max_alt is None else round(max_alt / ephem.degree, 2),
+               iso(set_time)]
+        if args.format == 'csv':
+            out.writerow(row)
+        else:
+            print(json.dumps(dict(zip(fields, row))))
+    print_overhead_stats(stats)
+    return 0
+
+def print_overhead_stats(stats, out=sys.stderr):
+    print('%d of %d satellites overhead; %d ruled out in %.1f ms (%d by '
+          'latitude, %d by orbit plane), %d searched, %.2f s in all' %
+          (stats['found'], stats['objects'], stats['culled'],
+           stats['cull_seconds'] * 1e3, stats['culled_latitude'],
+           stats['culled_plane'], stats['searched'], stats['seconds']),
+          file=out)
+
+def conjunctions_command(argv):
+    """Entry point for `satTracker.py conjunctions`: screen for close approaches"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py conjunctions',
+        description='Find the objects in the TLE file that pass close to a '
+                    'satellite, or to each other')
+    parser.add_argument('satellite', nargs='?', default=None,
+                        help='satellite name, prefix or NORAD id (default: '
+                             'the one last chosen at the prompt)')
+    parser.add_argument('--all', action='store_true',
+                        help='screen every pair of objects instead')
+    parser.add_argument('--distance', type=float, default=CONJ_THRESHOLD,
+                        help='report approaches closer than this many km '
+                             '(default %d)' % CONJ_THRESHOLD)
+    parser.add_argument('--hours', type=float, default=24,
+                        help='length of the screening window (default 24)')
+    parser.add_argument('--start', default=None,
+                        help="UTC start time, e.g. '2024/1/1 12:00' "
+                             "(default now)")
+    parser.add_argument('--step', type=float, default=CONJ_STEP,
+                        help='seconds between samples (default %d)' %
+                             CONJ_STEP)
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                        help='csv, or json for one JSON object per line')
+    args = parser.parse_args(argv)
+
+    if load_numpy() is None:
+        print('The conjunctions command requires numpy', file=sys.stderr)
+        return 1
+    cat = get_catalog()
+    primary = None
+    if not args.all:
+        query = args.satellite
+        if query is None:
+            try:
+                query = get_current()[0]
+            except (IOError, IndexError):
+                query = ISS_FULL_NAME
+        primary = cat.find(query)
+        if primary is None:
+            print('Unable to find a satellite named "%s"' % query,
+                  file=sys.stderr)
+            return 1
+    batch = SatelliteBatch(cat.tles())
+    start = ephem.now() if args.start is None else ephem.Date(args.start)
+    screen = ConjunctionScreen(batch, args.distance, args.step)
+    try:
+        events = screen.screen(start, args.hours / 24.0, primary)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    import csv
+    fields = ['tca', 'name_a', 'norad_a', 'name_b', 'norad_b', 'miss_km',
+              'speed_km_s']
+    out = csv.writer(sys.stdout, lineterminator='\n')
+    if args.format == 'csv':
+        out.writerow(fields)
+    for tca, row_a, row_b, miss, speed in events:
+        row = [iso_date(tca, 'milliseconds'), cat.name(row_a),
+               cat.norad(row_a), cat.name(row_b), cat.norad(row_b),
+               round(miss, 3), round(speed, 3)]
+        if args.format == 'csv':
+            out.writerow(row)
+        else:
+            print(json.dumps(dict(zip(fields, row))))
+    timing = screen.last_timing
+    print('%d conjunctions within %g km: %d objects (%d deep-space skipped), '
+          '%d of %d pairs pruned by perigee/apogee, %d candidates from %d '
+          'distance checks over %d steps in %.2f s (%.3g pairs/s)' %
+          (timing['conjunctions'], args.distance, timing['objects'],
+           timing['skipped_deep'], timing['pairs_pruned'], timing['pairs'],
+           timing['candidates'], timing['distance_checks'], timing['steps'],
+           timing['seconds'], timing['pairs_per_second']), file=sys.stderr)
+    return 0
+
+def state_command(argv):
+    """
+    Entry point for `satTracker.py state`: print or time reads of the state
+    table a running tracker publishes
+    """
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py state',
+        description='Print the latest state of the satellites a running '
+                    'tracker publishes (`publish` at its prompt) as JSON '
+                    'lines, read from shared memory without disturbing it')
+    parser.add_argument('satellite', nargs='*',
+                        help='names or NORAD ids to print (default: all)')
+    parser.add_argument('--file', default=None,
+                        help='state table to read (default: %s)' % STATE_FILE)
+    parser.add_argument('--latency', type=int, default=0, metavar='READS',
+                        help='instead, time this many reads and print '
+                             'percentiles')
+    args = parser.parse_args(argv)
+
+    try:
+        reader = StateReader(args.file)
+    except (OSError, ValueError) as e:
+        print('No state table (use `publish` at the prompt): %s' % e,
+              file=sys.stderr)
+        return 1
+    keys = [int(k) if k.isdigit() else k for k in args.satellite]
+    if args.latency > 0:
+        keys = keys or reader.names
+        if not keys:
+            print('The state table is empty', file=sys.stderr)
+            return 1
+        timings = list()
+        for k in range(args.latency):
+            start = time.perf_counter()
+            reader.read(keys[k % len(keys)])
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print('%d reads: p50 %.2f us, p99 %.2f us, max %.2f us, %d retried' %
+              (len(timings), timings[len(timings) // 2] * 1e6,
+               timings[int(len(timings) * 0.99)] * 1e6, timings[-1] * 1e6,
+               reader.retries))
+        return 0
+    if keys:
+        found = [reader.read(key) for key in keys]
+    else:
+        found = reader.read_all()
+    for state in found:
+        if state is not None:
+            print(json.dumps(state))
+    return 0 if all(k is not None for k in found) else 1
+
+def export_command(argv):
+    """Entry point for `satTracker.py export`: ground tracks as arrays"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py export',
+        description='Write the ground tracks and look angles of satellites '
+                    'over a span of time as .npy arrays, which numpy and '
+                    'other tools can memory-map, with a JSON header '
+                    'describing the satellites, the ground station and the '
+                    'arrays')
+    parser.add_argument('satellite', nargs='*',
+                        help='satellite names, prefixes or NORAD ids '
+                             '(default: the one last chosen at the prompt)')
+    parser.add_argument('--match', action='append', default=[],
+                        metavar='PREFIX',
+                        help='also every satellite whose name starts with '
+                             'PREFIX, e.g. STARLINK; may be repeated')
+    parser.add_argument('--start', default=None,
+                        help="UTC start time, e.g. '2024/1/1 12:00' "
+                             "(default now)")
+    parser.add_argument('--days', type=float, default=1,
+                        help='length of the export (default 1)')
+    parser.add_argument('--step', type=float, default=EXPORT_STEP,
+                        help='seconds between samples (default %d)' %
+                             EXPORT_STEP)
+    parser.add_argument('--dtype', choices=['float32', 'float64'],
+                        default='float32',
+                        help='type of the exported values (default float32, '
+                             'about a meter of resolution)')
+    parser.add_argument('--output', required=True, metavar='DIR',
+                        help='directory for header.json and the .npy files')
+    args = parser.parse_args(argv)
+
+    if load_numpy() is None:
+        print('The export command requires numpy', file=sys.stderr)
+        return 1
+    if args.step <= 0 or args.days < 0:
+        print('The step must be positive and the days not negative',
+              file=sys.stderr)
+        return 1
+    if not load_station():
+        return 1
+    cat = get_catalog()
+    indices = list()
+    queries = args.satellite
+    if not queries and not args.match:
+        try:
+            queries = [get_current()[0]]
+        except (IOError, IndexError):
+            queries = [ISS_FULL_NAME]
+    for query in queries:
+        idx = cat.find(query)
+        if idx is None:
+            print('Unable to find a satellite named "%s"' % query,
+                  file=sys.stderr)
+            return 1
+        indices.append(idx)
+    for prefix in args.match:
+        indices.extend(cat.search(prefix))
+    # each satellite once, in the order asked for
+    indices = list(dict.fromkeys(indices))
+    if not indices:
+        print('No satellites match', file=sys.stderr)
+        return 1
+    start = ephem.now() if args.start is None else ephem.Date(args.start)
+    os.makedirs(args.output, exist_ok=True)
+
+    begin = time.perf_counter()
+    header = export_tracks(SatelliteBatch([cat.tle(k) for k in indices]),
+                           start, args.days, args.step, args.output,
+                           args.dtype)
+    elapsed = time.perf_counter() - begin
+    positions = header['samples'] * len(indices)
+    print('%d satellites x %d samples written to %s in %.2f s (%.0f positions '
+          'per second)' % (len(indices), header['samples'], args.output,
+                           elapsed, positions / max(elapsed, 1e-9)),
+          file=sys.stderr)
+    deep = sum(k['deep_space'] for k in header['satellites'])
+    if deep:
+        print('%d deep-space satellites are left NaN' % deep, file=sys.stderr)
+    return 0
+
+def telemetry_command(argv):
+    """Entry point for `satTracker.py telemetry`: query the telemetry log"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='satTracker.py telemetry',
+        description='Print the satellite states logged while the tracker '
+                    'ran over a span of time, from the finest tier of the '
+                    'log that still holds it')
+    parser.add_argument('satellite', nargs='?', default=None,
+                        help='satellite name, prefix or NORAD id (default: '
+                             'every satellite logged)')
+    parser.add_argument('--end', default=None,
+                        help="UTC end time, e.g. '2024/1/1 12:00' "
+                             "(default now)")
+    parser.add_argument('--hours', type=float, default=24,
+                        help='length of the span before the end (default 24)')
+    parser.add_argument('--step', type=float, default=None,
+                        help='seconds between samples wanted, at least '
+                             '(default: the finest available)')
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                        help='csv, or json for one JSON object per line')
+    parser.add_argument('--tiers', action='store_true',
+                        help='instead, print what each tier of the log holds')
+    args = parser.parse_args(argv)
+
+    if load_numpy() is None:
+        print('The telemetry command requires numpy', file=sys.stderr)
+        return 1
+    if not os.path.exists(TELEMETRY_FILE):
+        print('No telemetry log. It is written while the tracker runs at '
+              'the prompt.', file=sys.stderr)
+        return 1
+    log = get_telemetry()
+    def iso(stamp):
+        return iso_date(UNIX_EPOCH + stamp / 86400.0, 'milliseconds')
+    if args.tiers:
+        for step, count, oldest, newest, dropped in log.spans():
+            print('every %gs: %d samples%s%s' % (
+                step, count, '' if oldest is None else
+                ', %s to %s' % (iso(oldest), iso(newest)),
+                ', %d dropped out of order' % dropped if dropped else ''))
+        return 0
+    norad = None
+    if args.satellite is not None:
+        if args.satellite.isdigit():
+            norad = int(args.satellite)
+        else:
+            cat = get_catalog()
+            idx = cat.find(args.satellite)
+            if idx is None:
+                print('Unable to find a satellite named "%s"' %
+                      args.satellite, file=sys.stderr)
+                return 1
+            norad = norad_number(cat.norad(idx))
+    end = ephem.now() if args.end is None else ephem.Date(args.end)
+    end = (end - UNIX_EPOCH) * 86400.0
+    begin = time.perf_counter()
+    found = log.query(end - args.hours * 3600.0, end, norad, args.step)
+    elapsed = time.perf_counter() - begin
+
+    import csv
+    names = [k[0] for k in TELEMETRY_COLUMNS]
+    out = csv.writer(sys.stdout, lineterminator='\n')
+    if args.format == 'csv':
+        out.writerow(names)
+    columns = [found[name].tolist() for name in names]
+    for row in zip(*columns):
+        row = [iso(row[0]), row[1]] + [round(k, 4) for k in row[2:]]
+        if args.format == 'json':
+            print(json.dumps(dict(zip(names, row))))
+        else:
+            out.writerow(row)
+    print('%d samples every %gs found in %.2f ms' %
+          (len(found['time']), found['step'], elapsed * 1e3), file=sys.stderr)
+    return 0
+
+def main():
+    """The main function"""
+
+    # Check if installed
+    if not is_installed():
+        install_program()
+
+    ## initialize satellite info
+    stamp = datetime.datetime.fromtimestamp(os.stat(TLE_FILE)[8])
+    if datetime.datetime.now() > (stamp + TLE_MAX_AGE):
+        # TLE is old
+        msg = ('Your TLE is getting a little stale. Would you like to update '
+               'it? (y/N) ')
+        resp = input(msg)
+        if resp == 'y':
+            try:
+                update_tle()
+            except (ValueError, IOError):
+                print('Unable to update TLE. Continuing anyway with old values')
+
+    # read in last satellite viewed
+    try:
+        full_name, short_name = get_current()
+    except (IOError, IndexError):
+        print('Unable to find your satellite, defaulting to ISS')
+        full_name = ISS_FULL_NAME
+        short_name = ISS_NICKNAME
+        save_current(full_name, short_name)
+
+    # pull the TLE from disc
+    try:
+        set_satellite(full_name, short_name)
+    except (IOError, ValueError):
+        # there was an error with the file format or the file did not exist
+        try:
+            update_tle()
+        except (ValueError, IOError):
+            kill_program(1)
+
+        try:
+            set_satellite(full_name, short_name)
+        except ValueError:
+            try:
+                full_name = ISS_FULL_NAME
+                short_name = ISS_NICKNAME
+                set_satellite(full_name, short_name)
+            except:
+                kill_program(1)
+
+    ## set up ground station information
+    try:
+        set_grnd()
+    except ValueError:
+        # there was an error with the file format or the file did not exist
+        msg = (COL_RED + 'Error with ground file. ' + COL_NORMAL +
+               'Please update it with valid information.')
+        print(msg)
+        update_grnd()
+        try:
+            set_grnd()
+        except:
+            print('Unable to load valid ground information')
+            exit(1)
+
+    # set time
+    global p_time
+    p_time = datetime.datetime.now(datetime.UTC)
+    global displacement
+    displacement = datetime.timedelta() # initialize to zero
+    global is_frozen
+    is_frozen = False
+
+    # load scheduled jobs
+    cron_daemon()
+
+    # run the prompt and the scheduler on one event loop until the user quits
+    import asyncio
+    asyncio.run(runtime())
+
+# non-interactive commands, run as `satTracker.py <command> [options]`
+COMMANDS = {
+    'now': now_command,
+    'list': list_command,
+    'passes': passes_command,
+    'coverage': coverage_command,
+    'conjunctions': conjunctions_command,
+    'overhead': overhead_command,
+    'stream': stream_command,
+    'serve': serve_command,
+    'dashboard': dashboard_command,
+    'replay': replay_command,
+    'state': state_command,
+    'export': export_command,
+    'telemetry': telemetry_command,
+}
+
+def launch(argv):
+    """
+    Entry point for satTracker.py: runs the one-shot command named by argv,
+    or else the interactive tracker. Returns the exit status.
+    """
+    if len(argv) > 0:
+        if argv[0] == '--help':
+            usage()
+            return 0
+        elif argv[0] in COMMANDS:
+            # one-shot commands answer and exit without starting any threads
+            return COMMANDS[argv[0]](argv[1:])
+
+    # Register signal handler
+    signal.signal(signal.SIGINT, sig_handler)
+
+    # execute the main function now
+    main()
+
+    return 0
+
+if __name__ == '__main__':
+    exit(launch(sys.argv[1:]))
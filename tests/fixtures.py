@@ -0,0 +1,116 @@
+"""
+Synthetic TLE fixtures shared by the tests, benchmark.py and loadtest.py: a
+reproducible catalog, a fixed ground station and a frozen tracking time, so
+nothing needs the network or depends on the wall clock.
+"""
+
+import datetime
+import os
+import random
+import shutil
+import tempfile
+
+import sattrack as st
+
+FROZEN_TIME = datetime.datetime(2024, 1, 2, 12, 0, 0, tzinfo=datetime.UTC)
+TLE_EPOCH = '24001.50000000'
+SEED = 1
+# ground station: 40 N, 75 W, 100 m, UTC-5 (radians, as grnd.txt stores)
+GRND_TEXT = '0.6981317007977318\n-1.3089969389957472\n100.0\n-5.0\n'
+
+def checksum(line):
+    """Appends the TLE modulo-10 checksum to the first 68 columns of line"""
+    total = 0
+    for char in line[:68]:
+        if char.isdigit():
+            total = total + int(char)
+        elif char == '-':
+            total = total + 1
+    return line[:68] + str(total % 10)
+
+def make_tle(name, norad, inc, raan, ecc, argp, anomaly, motion, bstar):
+    """Returns a (name, line1, line2) element set with valid checksums"""
+    line1 = ('1 %05dU 98067A   %s  .00016717  00000-0  %s 0  999' %
+             (norad, TLE_EPOCH, bstar)).ljust(68)
+    line2 = ('2 %05d %8.4f %8.4f %07d %8.4f %8.4f %11.8f%05d' %
+             (norad, inc, raan, int(round(ecc * 1e7)), argp, anomaly, motion,
+              1000)).ljust(68)
+    return (name, checksum(line1), checksum(line2))
+
+def make_catalog(size, seed=SEED):
+    """
+    Returns size element sets: the ISS followed by a reproducible mix of
+    LEO, MEO and GEO objects
+    """
+    rand = random.Random(seed)
+    tles = [make_tle(st.ISS_FULL_NAME, 25544, 51.6416, 247.4627, 0.0006703,
+                     130.5360, 325.0288, 15.72125391, '10270-3')]
+    for idx in range(1, size):
+        kind = rand.random()
+        if kind < 0.85:
+            motion = rand.uniform(11.0, 16.2)
+            ecc = rand.uniform(0.0, 0.02)
+        elif kind < 0.95:
+            motion = rand.uniform(1.9, 6.0)
+            ecc = rand.uniform(0.0, 0.5)
+        else:
+            motion = rand.uniform(0.99, 1.01)
+            ecc = rand.uniform(0.0, 0.001)
+        tles.append(make_tle('OBJECT %05d' % idx, 30000 + idx,
+                             rand.uniform(0.0, 110.0), rand.uniform(0.0, 360.0),
+                             ecc, rand.uniform(0.0, 360.0),
+                             rand.uniform(0.0, 360.0), motion,
+                             '%05d-4' % rand.randint(1000, 90000)))
+    return tles
+
+def with_epoch(entry, epoch):
+    """Returns a copy of the (name, line1, line2) entry with another epoch"""
+    name, line1, line2 = entry
+    return (name, checksum(line1[:18] + epoch + line1[32:]), line2)
+
+def write_tles(path, tles):
+    with open(path, 'w') as fname:
+        for entry in tles:
+            fname.write('\n'.join(entry) + '\n')
+
+def install_fixtures(data_dir, size):
+    """Creates a satTracker data directory holding size satellites"""
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+    st.set_data_dir(data_dir)
+    write_tles(st.TLE_FILE, make_catalog(size))
+    with open(st.GRND_FILE, 'w') as fname:
+        fname.write(GRND_TEXT)
+    st.save_current(st.ISS_FULL_NAME, st.ISS_NICKNAME)
+    st.build_catalog()
+    # as an update would
+    st.archive_tles()
+    st.set_grnd()
+    st.set_satellite(st.ISS_FULL_NAME, st.ISS_NICKNAME)
+    freeze_time()
+
+def freeze_time():
+    st.p_time = FROZEN_TIME
+    st.displacement = datetime.timedelta()
+    st.is_frozen = True
+    st.sync_time()
+
+def install(size=30):
+    """
+    Creates a throwaway data directory of size synthetic satellites and
+    points the tracker at it. Time runs on a virtual SimClock from
+    FROZEN_TIME, as in a replay, so nothing reads the wall clock. Returns
+    the directory for remove().
+    """
+    work_dir = tempfile.mkdtemp(prefix='satTracker-test-')
+    install_fixtures(os.path.join(work_dir, '.satTracker'), size)
+    st.is_frozen = False
+    st.sim_clock = st.SimClock(FROZEN_TIME.timestamp())
+    st.sync_time()
+    return work_dir
+
+def remove(work_dir):
+    st.sim_clock = None
+    st.scheduler = None
+    st.set_data_dir(os.path.join(work_dir, '.satTracker'))
+    shutil.rmtree(work_dir)
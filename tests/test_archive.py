@@ -0,0 +1,89 @@
+"""TleArchive lookups and index merges"""
+
+import os
+import unittest
+
+import sattrack as st
+from tests import fixtures
+
+ISS, OBJECT = fixtures.make_catalog(2)
+
+class TleArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+        self.archive = st.TleArchive(os.path.join(self.dir, 'archive.tle'),
+                                     os.path.join(self.dir, 'archive.idx'))
+
+    def tearDown(self):
+        self.archive.close()
+        fixtures.remove(self.dir)
+
+    def test_empty_archive_writes_nothing(self):
+        self.archive.open()
+        self.assertEqual(len(self.archive), 0)
+        self.assertIsNone(self.archive.nearest(25544, st.tle_epoch(ISS[1])))
+        self.assertFalse(os.path.exists(self.archive.index_file))
+
+    def test_nearest_and_span(self):
+        entries = [fixtures.with_epoch(ISS, epoch) for epoch in
+                   ('24001.00000000', '24003.00000000', '24007.00000000')]
+        self.assertEqual(self.archive.append(entries), 3)
+        jd = st.tle_epoch(entries[1][1])
+        entry, low, high = self.archive.nearest(25544, jd + 0.9)
+        self.assertEqual(entry, entries[1])
+        # it stays the nearest halfway to its neighbours on either side
+        self.assertAlmostEqual(low, jd - 1.0)
+        self.assertAlmostEqual(high, jd + 2.0)
+        entry, low, high = self.archive.nearest('25544', jd + 10)
+        self.assertEqual(entry, entries[2])
+        self.assertEqual(high, float('inf'))
+        self.assertIsNone(self.archive.nearest(99999, jd))
+
+    def test_merge_keeps_order_and_skips_duplicates(self):
+        self.archive.append([fixtures.with_epoch(OBJECT, '24005.00000000'),
+                             fixtures.with_epoch(ISS, '24002.00000000')])
+        added = self.archive.append([
+            fixtures.with_epoch(ISS, '24001.00000000'),
+            fixtures.with_epoch(ISS, '24002.00000000'),
+            fixtures.with_epoch(OBJECT, '24004.00000000'),
+            ('BROKEN', '1 garbage', '2 garbage')])
+        self.assertEqual(added, 2)
+        self.assertEqual(len(self.archive), 4)
+        self.assertEqual(self.archive.epochs(25544), [
+            st.tle_epoch(fixtures.with_epoch(ISS, epoch)[1])
+            for epoch in ('24001.00000000', '24002.00000000')])
+        epochs = self.archive.epochs(30001)
+        self.assertEqual(epochs, sorted(epochs))
+        self.assertEqual(len(epochs), 2)
+
+    def test_index_rebuilt_from_data(self):
+        self.archive.append([fixtures.with_epoch(ISS, '24001.00000000'),
+                             fixtures.with_epoch(ISS, '24002.00000000')])
+        self.archive.close()
+        os.remove(self.archive.index_file)
+        # and a torn record from an interrupted append is dropped
+        with open(self.archive.data_file, 'ab') as fname:
+            fname.write(b'ISS (ZA')
+        self.archive.open()
+        self.assertEqual(len(self.archive), 2)
+        self.assertEqual(self.archive.append(
+            [fixtures.with_epoch(ISS, '24003.00000000')]), 1)
+        self.assertEqual(os.path.getsize(self.archive.data_file),
+                         3 * st.ARCHIVE_RECORD)
+
+    def test_lookups_never_archive(self):
+        # install_fixtures() archived the TLE file, as an update does
+        archive = st.get_archive()
+        before = len(archive)
+        with open(st.TLE_FILE, 'a') as fname:
+            fname.write('\n'.join(fixtures.with_epoch(ISS, '24009.00000000')) +
+                        '\n')
+        jd = st.tle_epoch(fixtures.with_epoch(ISS, '24009.00000000')[1])
+        self.assertNotEqual(archive.nearest(25544, jd)[0][1][18:32],
+                            '24009.00000000')
+        self.assertEqual(len(st.get_archive()), before)
+        st.archive_tles()
+        self.assertEqual(len(st.get_archive()), before + 1)
+
+if __name__ == '__main__':
+    unittest.main()
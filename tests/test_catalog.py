@@ -0,0 +1,63 @@
+"""Catalog lookups and the binary catalog index"""
+
+import os
+import unittest
+
+import sattrack as st
+from tests import fixtures
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+        entries = fixtures.make_catalog(3)
+        with open(st.TLE_FILE, 'a', encoding='utf-8') as fname:
+            # a name that isn't ASCII, and one a prefix of another
+            for name, entry in (('ÉTOILE 1', entries[1]),
+                                ('ISS', entries[2])):
+                fname.write('\n'.join((name,) + entry[1:]) + '\n')
+        self.catalog = st.build_catalog()
+
+    def tearDown(self):
+        fixtures.remove(self.dir)
+
+    def test_lookups(self):
+        cat = self.catalog
+        self.assertEqual(len(cat), 32)
+        self.assertEqual(cat.name(30), 'ÉTOILE 1')
+        self.assertEqual(cat.exact('25544'), 0)
+        self.assertEqual(cat.exact('ISS'), 31)
+        # the exact name beats a longer one it prefixes
+        self.assertEqual(cat.find('ISS'), 31)
+        # names which prefix the query, found through the hash table
+        self.assertEqual(cat.search('ISS (ZARYA) MODULE'), [31, 0])
+        self.assertEqual(cat.find('étoile'), 30)
+        self.assertIsNone(cat.find('NOTHING'))
+
+    def test_index_round_trip(self):
+        loaded = st.Catalog.load(st.CATALOG_FILE, st.TLE_FILE)
+        self.assertEqual(loaded.names(), self.catalog.names())
+        for attr, _typecode in st.CATALOG_ARRAYS:
+            self.assertEqual(getattr(loaded, attr),
+                             getattr(self.catalog, attr), attr)
+        self.assertEqual(loaded.norad_text, self.catalog.norad_text)
+        self.assertEqual(loaded.find('ÉTOILE'), 30)
+        self.assertEqual(loaded.tle(0), self.catalog.tle(0))
+
+    def test_stale_or_broken_index(self):
+        with open(st.TLE_FILE, 'a', encoding='utf-8') as fname:
+            fname.write('\n')
+        with self.assertRaises(ValueError):
+            st.Catalog.load(st.CATALOG_FILE, st.TLE_FILE)
+        # get_catalog() indexes the changed file again
+        self.assertEqual(len(st.get_catalog()), 32)
+        with open(st.CATALOG_FILE, 'r+b') as fname:
+            fname.truncate(os.path.getsize(st.CATALOG_FILE) - 1)
+        with self.assertRaises(ValueError):
+            st.Catalog.load(st.CATALOG_FILE, st.TLE_FILE)
+        with open(st.CATALOG_FILE, 'wb') as fname:
+            fname.write(b'{"version": 1}')
+        with self.assertRaises(ValueError):
+            st.Catalog.load(st.CATALOG_FILE, st.TLE_FILE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Cron job parsing, the cron file and the satellites pass jobs target"""
+
+import contextlib
+import io
+import unittest
+
+import sattrack as st
+from tests import fixtures
+
+class JobTest(unittest.TestCase):
+    def test_every(self):
+        job = st.Job(1, 'every  1h   update')
+        self.assertEqual((job.kind, job.interval, job.action),
+                         ('every', 3600, 'update'))
+        self.assertEqual(str(job), '1 every 1h update')
+        with self.assertRaises(ValueError):
+            st.Job(2, 'every 30s record')
+
+    def test_pass(self):
+        job = st.Job(3, 'pass night 5m notify ISS (ZARYA)')
+        self.assertEqual((job.kind, job.night, job.visible, job.lead,
+                          job.action, job.query),
+                         ('pass', True, False, 300, 'notify', 'ISS (ZARYA)'))
+        job = st.Job(4, 'pass visible log STARLINK*')
+        self.assertEqual((job.night, job.visible, job.lead, job.query),
+                         (True, True, 0, 'STARLINK*'))
+        self.assertEqual(st.Job(5, 'pass log all').query, 'all')
+
+    def test_malformed(self):
+        for spec in ('', 'every 0s update', 'every 1h reboot', 'every update',
+                     'pass', 'pass notify', 'pass 5m ISS', 'pass 5m notify',
+                     'pass soon notify ISS', 'fly me to the moon'):
+            with self.assertRaises(ValueError, msg=spec):
+                st.Job(1, spec)
+
+class CronTableTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+
+    def tearDown(self):
+        fixtures.remove(self.dir)
+
+    def test_load_skips_malformed_lines(self):
+        with open(st.CRON_FILE, 'w') as fname:
+            fname.write('# comment\n\n1 every 1d update\nx pass log ISS\n'
+                        '3 pass sometimes log ISS\n4 pass 10m log ISS*\n')
+        table = st.CronTable(st.CRON_FILE)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            table.load()
+        self.assertEqual(sorted(table.jobs), [1, 4])
+        self.assertEqual(out.getvalue().count('Ignoring malformed'), 2)
+        table.save()
+        with open(st.CRON_FILE) as fname:
+            self.assertEqual(fname.read(), '1 every 1d update\n'
+                                           '4 pass 10m log ISS*\n')
+        self.assertEqual(table.add('every 1h update').id, 5)
+
+    def test_targets(self):
+        table = st.CronTable(st.CRON_FILE)
+        self.assertEqual(table.targets(st.Job(1, 'pass log ISS')),
+                         ['ISS (ZARYA)'])
+        objects = table.targets(st.Job(2, 'pass log OBJECT 0000*'))
+        self.assertEqual(len(objects), 9)
+        self.assertEqual(len(table.targets(st.Job(3, 'pass log all'))), 30)
+        self.assertEqual(table.targets(st.Job(4, 'pass log NOTHING')), [])
+
+if __name__ == '__main__':
+    unittest.main()
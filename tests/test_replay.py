@@ -0,0 +1,134 @@
+"""Replays on the virtual SimClock and `time warp`"""
+
+import contextlib
+import datetime
+import io
+import os
+import unittest
+from unittest import mock
+
+import sattrack as st
+from tests import fixtures
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+        self.start = st.ephem.Date(fixtures.FROZEN_TIME)
+
+    def tearDown(self):
+        fixtures.remove(self.dir)
+
+    def run_replay(self, days, *specs):
+        """
+        Replays the jobs in specs from the fixtures' frozen time. Returns
+        each fired event's (name, virtual time) and the pass log's lines.
+        """
+        st.crontab = None
+        table = st.get_crontab()
+        table.jobs = dict((k + 1, st.Job(k + 1, spec))
+                          for k, spec in enumerate(specs))
+        if os.path.exists(st.PASS_LOG_FILE):
+            os.remove(st.PASS_LOG_FILE)
+        fired = list()
+        with contextlib.redirect_stdout(io.StringIO()):
+            st.replay(self.start, self.start + days,
+                      trace=lambda event: fired.append((event.name,
+                                                        st.clock_time())))
+        with open(st.PASS_LOG_FILE) as fname:
+            return fired, fname.readlines()
+
+    def test_replay_is_deterministic(self):
+        specs = ('pass 10m log ISS (ZARYA)', 'pass night log OBJECT 0000*')
+        first = self.run_replay(2, *specs)
+        self.assertGreater(len(first[1]), 2)
+        self.assertEqual(self.run_replay(2, *specs), first)
+        # the wall clock never moved the virtual one
+        with mock.patch.object(st.time, 'time', return_value=0.0):
+            self.assertEqual(self.run_replay(2, *specs), first)
+        self.assertIsNone(st.sim_clock)
+
+    def test_replay_logs_each_pass_once(self):
+        end = st.ephem.Date(self.start + 1)
+        fired, logged = self.run_replay(1, 'pass 10m log ISS (ZARYA)')
+        # every pass rising within the replay, found the slow way
+        body = st.ephem.readtle(*fixtures.make_catalog(1)[0])
+        observer = st.grnd.observer.copy()
+        observer.date = self.start
+        expected = list()
+        while True:
+            window = observer.next_pass(body)
+            if window[0] > end:
+                break
+            if window[0] > self.start:
+                expected.append(window)
+            observer.date = window[4] + st.ephem.second
+        self.assertGreater(len(expected), 2)
+        jobs = [k for k in fired if k[0] == 'log ISS (ZARYA)']
+        self.assertEqual(len(jobs), len(expected))
+        for (_name, when), window in zip(jobs, expected):
+            # fired the lead time before the rise, on the virtual clock
+            self.assertAlmostEqual(when, st.wall_time(window[0]) - 600,
+                                   delta=1)
+        self.assertEqual(len(logged), len(expected))
+        self.assertLessEqual(len(st.get_crontab().done), 1)
+
+class TimeWarpTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+        # live from the frozen time, with warps on a wall clock the test
+        # moves by hand
+        st.sim_clock = None
+        st.displacement = (fixtures.FROZEN_TIME -
+                           datetime.datetime.now(datetime.UTC))
+        self.wall = fixtures.FROZEN_TIME.timestamp()
+        patcher = mock.patch.object(st.time, 'time', lambda: self.wall)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        fixtures.remove(self.dir)
+
+    def time(self, *words):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            st.handle_time(('time',) + words)
+        return out.getvalue()
+
+    def tracked(self):
+        return st.sync_time().timestamp() - fixtures.FROZEN_TIME.timestamp()
+
+    def test_warp(self):
+        self.time('warp', '60')
+        self.assertEqual(st.sim_clock.rate, 60)
+        self.wall = self.wall + 10
+        self.assertAlmostEqual(self.tracked(), 600, delta=1)
+        # the scheduler still sleeps in wall clock seconds
+        tracked = fixtures.FROZEN_TIME.timestamp() + 1200
+        self.assertAlmostEqual(st.wall_time(st.ephem.Date(
+            datetime.datetime.fromtimestamp(tracked, datetime.UTC))),
+            self.wall + 10, delta=0.1)
+        # moving the time shifts the warped clock
+        self.time('minute', '5')
+        self.assertAlmostEqual(self.tracked(), 900, delta=1)
+        # off keeps the tracked time where the warp left it
+        self.time('warp', 'off')
+        self.assertIsNone(st.sim_clock)
+        self.assertAlmostEqual(self.tracked(), 900, delta=1)
+
+    def test_warp_while_frozen(self):
+        self.time('warp', '100')
+        self.wall = self.wall + 1
+        self.time('freeze')
+        self.wall = self.wall + 50
+        self.assertAlmostEqual(self.tracked(), 100, delta=1)
+        # warps on from where the time stood still
+        self.time('unfreeze')
+        self.wall = self.wall + 1
+        self.assertAlmostEqual(self.tracked(), 200, delta=1)
+
+    def test_bad_factor(self):
+        for factor in ('0', '-2', 'fast', str(st.TIME_WARP_MAX + 1)):
+            self.assertIn('must be between', self.time('warp', factor))
+            self.assertIsNone(st.sim_clock)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""SatelliteBatch and GroundGrid against pyephem"""
+
+import datetime
+import math
+import unittest
+
+import sattrack as st
+from tests import fixtures
+
+np = st.load_numpy()
+
+def observer(pressure):
+    obs = st.ephem.Observer()
+    obs.lat = '40'
+    obs.long = '-75'
+    obs.elev = 100
+    obs.pressure = pressure
+    return obs
+
+@unittest.skipIf(np is None, 'requires numpy')
+class SatelliteBatchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tles = fixtures.make_catalog(300)
+        cls.batch = st.SatelliteBatch(cls.tles)
+        cls.times = [fixtures.FROZEN_TIME + datetime.timedelta(minutes=37 * k)
+                     for k in range(4)]
+
+    def pyephem(self, obs, when):
+        """Returns pyephem's (alt, az, range) of every satellite at when"""
+        obs.date = st.ephem.Date(when)
+        found = list()
+        for tle in self.tles:
+            body = st.ephem.readtle(*tle)
+            body.compute(obs)
+            found.append((body.alt, body.az, body.range))
+        return np.array(found)
+
+    def check(self, pressure):
+        obs = observer(pressure)
+        for when in self.times:
+            state = self.batch.observe(obs, when)
+            alt, az, rng = self.pyephem(obs, when).T
+            # near the horizon too, where refraction is largest
+            np.testing.assert_allclose(state['alt'], alt,
+                                       atol=math.radians(0.01))
+            up = alt > math.radians(1)
+            turn = (state['az'][up] - az[up] + math.pi) % (2 * math.pi)
+            np.testing.assert_allclose(turn - math.pi, 0,
+                                       atol=math.radians(0.02))
+            np.testing.assert_allclose(state['range'], rng, atol=200)
+
+    def test_refracted_like_pyephem(self):
+        self.check(1010)
+
+    def test_airless_like_pyephem(self):
+        self.check(0)
+
+    def test_refract_inverts_unrefract(self):
+        alt = np.radians(np.linspace(-2, 90, 500))
+        apparent = st.refract(alt, 1010, 15)
+        self.assertGreater(apparent[1] - alt[1], math.radians(0.5))
+        np.testing.assert_allclose(st.unrefract(apparent, 1010, 15), alt,
+                                   atol=st.REFRACTION_TOLERANCE)
+
+    def test_grid_visible_matches_pyephem(self):
+        obs = observer(1010)
+        grid = st.GroundGrid([obs.lat], [obs.long], [obs.elev],
+                             float(obs.horizon), obs.pressure, obs.temp)
+        for when in self.times:
+            state = grid.observe(self.batch, when)
+            alt = self.pyephem(obs, when)[:, 0]
+            # the grid leaves deep-space orbits out of its propagation
+            clear = (np.abs(alt) > math.radians(0.01)) & ~self.batch.deep
+            np.testing.assert_array_equal(state['visible'][clear, 0],
+                                          alt[clear] > 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""QueryServer answers and error responses over a real socket"""
+
+import asyncio
+import json
+import unittest
+
+import sattrack as st
+from tests import fixtures
+
+# every request names its second, so nothing depends on the wall clock
+SECOND = int(fixtures.FROZEN_TIME.timestamp())
+
+class QueryServerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+
+    def tearDown(self):
+        fixtures.remove(self.dir)
+
+    def exchange(self, *requests):
+        """
+        Sends the raw requests down one connection and returns a
+        (status, Connection header, decoded JSON body) for each answer
+        """
+        async def run():
+            server = st.QueryServer()
+            host, port = (await server.start('127.0.0.1', 0))[:2]
+            reader, writer = await asyncio.open_connection(host, port)
+            answers = list()
+            try:
+                for request in requests:
+                    writer.write(request)
+                    await writer.drain()
+                    head = await reader.readuntil(b'\r\n\r\n')
+                    lines = head.decode('latin-1').split('\r\n')
+                    headers = dict((name.lower(), value.strip()) for
+                                   name, _sep, value in
+                                   (k.partition(':') for k in lines[1:] if k))
+                    body = await reader.readexactly(
+                        int(headers['content-length']))
+                    answers.append((int(lines[0].split(' ')[1]),
+                                    headers['connection'],
+                                    json.loads(body.decode('utf-8'))))
+            finally:
+                writer.close()
+                await writer.wait_closed()
+                # let the server see the close before the loop goes
+                for _k in range(100):
+                    if server.connections == 0:
+                        break
+                    await asyncio.sleep(0.01)
+                await server.close()
+            return answers
+        return asyncio.run(run())
+
+    @staticmethod
+    def get(target):
+        return b'GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % target.encode()
+
+    def test_answers(self):
+        (status, connection, doc), = self.exchange(
+            self.get('/passes?sat=ISS&count=2&time=%d' % SECOND))
+        self.assertEqual((status, connection), (200, 'keep-alive'))
+        self.assertEqual(doc['name'], 'ISS (ZARYA)')
+        self.assertEqual(len(doc['passes']), 2)
+
+    def test_not_found(self):
+        answers = self.exchange(self.get('/nowhere'),
+                                self.get('/now?sat=NO+SUCH&time=%d' % SECOND))
+        self.assertEqual([k[:2] for k in answers],
+                         [(404, 'keep-alive')] * 2)
+        self.assertIn('/nowhere', answers[0][2]['error'])
+        self.assertIn('NO SUCH', answers[1][2]['error'])
+
+    def test_bad_parameters(self):
+        answers = self.exchange(
+            self.get('/now?sat=ISS&time=inf'),
+            self.get('/now?sat=ISS&time=nan'),
+            self.get('/now?sat=ISS&time=1e400'),
+            self.get('/passes?sat=ISS&count=abc&time=%d' % SECOND),
+            self.get('/catalog?limit=lots'))
+        self.assertEqual([k[0] for k in answers], [400] * 5)
+        self.assertEqual(answers[3][2]['error'], 'count must be a number')
+
+    def test_body_is_skipped_on_a_kept_connection(self):
+        post = (b'POST /now HTTP/1.1\r\nHost: localhost\r\n'
+                b'Content-Length: 11\r\n\r\nGET /stats ')
+        answers = self.exchange(post, self.get('/catalog?q=ISS&limit=1'))
+        self.assertEqual(answers[0][:2], (405, 'keep-alive'))
+        self.assertEqual(answers[1][:2], (200, 'keep-alive'))
+        self.assertEqual(answers[1][2], [{'name': 'ISS (ZARYA)',
+                                          'norad': '25544'}])
+
+    def test_unknown_body_length_closes(self):
+        post = (b'POST /now HTTP/1.1\r\nHost: localhost\r\n'
+                b'Transfer-Encoding: chunked\r\n\r\n')
+        (status, connection, _doc), = self.exchange(post)
+        self.assertEqual((status, connection), (405, 'close'))
+
+    def test_malformed_request_line(self):
+        (status, connection, doc), = self.exchange(
+            b'GET /now\r\nHost: localhost\r\n\r\n')
+        self.assertEqual((status, connection), (400, 'close'))
+        self.assertEqual(doc['error'], 'Malformed request')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""StateTable and StateReader: the seqlock and retired tables"""
+
+import os
+import unittest
+
+import sattrack as st
+from tests import fixtures
+
+class StateTableTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+        self.path = os.path.join(self.dir, 'state.bin')
+        self.table = st.StateTable(self.path, [(25544, 'ISS (ZARYA)'),
+                                               (30001, 'OBJECT 00001')])
+
+    def tearDown(self):
+        self.table.close()
+        fixtures.remove(self.dir)
+
+    def values(self, alt):
+        now = st.sim_clock.time()
+        return [now, now, 51.0, -75.0, 180.0, alt, 800.0, now + 60,
+                float('nan')]
+
+    def test_round_trip(self):
+        reader = st.StateReader(self.path)
+        self.assertIsNone(reader.read('ISS (ZARYA)'))
+        self.table.write(0, self.values(12.5))
+        state = reader.read('ISS (ZARYA)')
+        self.assertEqual(state['norad'], 25544)
+        self.assertEqual(state['time'], st.sim_clock.time())
+        self.assertEqual(state['alt'], 12.5)
+        self.assertIsNone(state['los'])
+        self.assertEqual(reader.read(25544), state)
+        self.assertIsNone(reader.read('NO SUCH THING'))
+        # every write moves the slot on by a whole (even) version
+        self.table.write(0, self.values(13.0))
+        version, _record = reader.read_slot(0)
+        self.assertEqual(version, 4)
+        self.assertEqual([k['name'] for k in reader.read_all()],
+                         ['ISS (ZARYA)'])
+        reader.close()
+
+    def test_write_many(self):
+        if st.load_numpy() is None:
+            self.skipTest('requires numpy')
+        columns = [[k, k + 1] for k in range(len(st.STATE_FIELDS))]
+        self.table.write_many(0, columns)
+        states = st.StateReader(self.path).read_all()
+        self.assertEqual([k['alt'] for k in states], [5.0, 6.0])
+        self.assertEqual([k['norad'] for k in states], [25544, 30001])
+
+    def test_reader_waits_out_a_write(self):
+        reader = st.StateReader(self.path)
+        self.table.write(1, self.values(1.0))
+        offset = st.StateTable.offset(1)
+        # a writer stopped midway leaves the version odd
+        st.STATE_SEQ.pack_into(self.table.map, offset, 3)
+        with self.assertRaises(TimeoutError):
+            reader.read('OBJECT 00001')
+        self.assertEqual(reader.retries, st.STATE_RETRIES)
+        st.STATE_SEQ.pack_into(self.table.map, offset, 4)
+        self.assertEqual(reader.read('OBJECT 00001')['alt'], 1.0)
+
+    def test_retired_table_is_reopened(self):
+        self.table.write(0, self.values(1.0))
+        reader = st.StateReader(self.path)
+        self.assertFalse(reader.retired())
+        replacement = st.StateTable(self.path, [(30002, 'OBJECT 00002')])
+        try:
+            self.assertTrue(reader.retired())
+            replacement.write(0, self.values(2.0))
+            self.assertIsNone(reader.read('ISS (ZARYA)'))
+            self.assertFalse(reader.retired())
+            self.assertEqual(reader.read('OBJECT 00002')['alt'], 2.0)
+        finally:
+            replacement.close()
+            reader.close()
+
+    def test_not_a_state_table(self):
+        with open(self.path + '.txt', 'wb') as fname:
+            fname.write(b'\0' * 256)
+        with self.assertRaises(ValueError):
+            st.StateReader(self.path + '.txt')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+TelemetryLog: ring wrap-around, queries across it and downsampling, and
+the scheduler's samples
+"""
+
+import datetime
+import os
+import unittest
+from unittest import mock
+
+import sattrack as st
+from tests import fixtures
+
+# 20 samples a second apart, and 10 of 10 s
+TIERS = [(1, 20 / 86400.0), (10, 100 / 86400.0)]
+
+@unittest.skipIf(st.load_numpy() is None, 'requires numpy')
+class TelemetryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+        self.path = os.path.join(self.dir, 'telemetry.bin')
+        with mock.patch.object(st, 'TELEMETRY_TIERS', TIERS):
+            self.log = st.TelemetryLog(self.path)
+        self.start = st.sim_clock.time()
+
+    def tearDown(self):
+        self.log.close()
+        fixtures.remove(self.dir)
+
+    def record(self, seconds, norad=25544):
+        """Appends a sample a second for seconds on the virtual clock"""
+        for _k in range(seconds):
+            when = st.sim_clock.time()
+            self.log.append(when, norad, (when - self.start, 0.0, 420.0,
+                                          0.0, 0.0, 1000.0))
+            st.sim_clock.advance(when + 1)
+
+    def test_layout(self):
+        self.assertEqual(self.log.capacities, [20, 10])
+        self.assertEqual(self.log.steps, [1.0, 10.0])
+
+    def test_query_before_wrap(self):
+        self.record(5)
+        found = self.log.query(self.start + 1, self.start + 3)
+        self.assertEqual(found['step'], 1.0)
+        self.assertEqual(found['lat'].tolist(), [1.0, 2.0, 3.0])
+
+    def test_wrap_and_query_across_segments(self):
+        self.record(47)
+        # the finest ring wrapped twice and keeps the last 20 seconds
+        first, second = self.log.segments(0)
+        self.assertEqual(first, (7, 20))
+        self.assertEqual(second, (0, 7))
+        self.assertEqual(self.log.oldest(0), self.start + 27)
+        found = self.log.query(self.start + 30, self.start + 44)
+        self.assertEqual(found['step'], 1.0)
+        self.assertEqual(found['lat'].tolist(),
+                         [float(k) for k in range(30, 45)])
+        self.assertTrue((found['norad'] == 25544).all())
+
+    def test_older_spans_come_from_coarser_tiers(self):
+        self.record(47)
+        found = self.log.query(self.start, self.start + 46)
+        self.assertEqual(found['step'], 10.0)
+        self.assertEqual(found['lat'].tolist(), [0.0, 10.0, 20.0, 30.0,
+                                                 40.0])
+        # unless a finer one is asked for and still holds the start
+        found = self.log.query(self.start + 40, self.start + 46, step=1)
+        self.assertEqual(len(found['time']), 7)
+
+    def test_filter_by_norad(self):
+        self.record(3, norad=25544)
+        self.record(3, norad=30001)
+        found = self.log.query(self.start, self.start + 10, norad=30001)
+        self.assertEqual(found['lat'].tolist(), [3.0, 4.0, 5.0])
+
+    def test_out_of_order_samples_are_counted(self):
+        self.record(30)
+        dropped = self.log.append(self.start + 5, 25544, (0.0,) * 6)
+        self.assertEqual(dropped, 2)
+        # a second sample in the same bucket is downsampled, not dropped
+        self.assertEqual(self.log.append(self.start + 29.5, 25544,
+                                         (0.0,) * 6), 0)
+        self.assertEqual([k[4] for k in self.log.spans()], [1, 1])
+
+    def test_reopened_from_its_header(self):
+        self.record(25)
+        self.log.close()
+        self.log = st.TelemetryLog(self.path)
+        self.assertEqual(self.log.capacities, [20, 10])
+        self.assertEqual(self.log.spans()[0][1:4],
+                         (20, self.start + 5, self.start + 24))
+
+@unittest.skipIf(st.load_numpy() is None, 'requires numpy')
+class TelemetryEventsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = fixtures.install()
+        # live, with the scheduler on a wall clock the test moves by hand
+        st.sim_clock = None
+        st.displacement = datetime.timedelta()
+        self.wall = 1000.5
+        # elements fitted today, as an update would leave them
+        now = datetime.datetime.now(datetime.UTC)
+        day = now.timetuple().tm_yday + (now.hour + now.minute / 60.0) / 24.0
+        epoch = '%02d%012.8f' % (now.year % 100, day)
+        st.sat = st.ephem.readtle(*fixtures.with_epoch(
+            fixtures.make_catalog(1)[0], epoch))
+        st.sat_span = (float('-inf'), float('inf'))
+        patcher = mock.patch.object(st.time, 'time', lambda: self.wall)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sched = st.Scheduler()
+
+    def tearDown(self):
+        fixtures.remove(self.dir)
+
+    def events(self):
+        return [k for k in self.sched.pending() if k.tag == 'telemetry']
+
+    def test_a_sample_a_second(self):
+        st.plan_telemetry_events(self.sched)
+        event, = self.events()
+        self.assertEqual((event.when, event.interval), (1001, 1))
+        self.wall = 1001
+        self.sched.run_pending()
+        self.assertEqual(self.events()[0].when, 1002)
+        found = st.get_telemetry().query(0, 2e9)
+        self.assertEqual(found['norad'].tolist(), [25544])
+        self.assertAlmostEqual(found['time'][0],
+                               datetime.datetime.now().timestamp(), delta=60)
+
+    def test_none_away_from_the_present(self):
+        st.displacement = datetime.timedelta(hours=1)
+        st.plan_telemetry_events(self.sched)
+        self.assertEqual(self.events(), [])
+        st.displacement = datetime.timedelta()
+        st.is_frozen = True
+        st.plan_telemetry_events(self.sched)
+        self.assertEqual(self.events(), [])
+
+if __name__ == '__main__':
+    unittest.main()
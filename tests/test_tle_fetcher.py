@@ -0,0 +1,139 @@
+"""TleFetcher against a local stand-in for CelesTrak"""
+
+import http.server
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import sattrack as st
+from tests import fixtures
+
+GROUPS = {'stations': fixtures.make_catalog(3),
+          'weather': fixtures.make_catalog(5)[3:]}
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """
+    Serves GROUPS at /<group>, with an ETag per group. Answers 304 to a
+    matching If-None-Match, running the server's before_304 hook first.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        group = self.path.strip('/')
+        server.seen.append((group, self.headers.get('If-None-Match')))
+        if group not in GROUPS:
+            self.answer(404, b'')
+            return
+        etag = '"%s-1"' % group
+        if self.headers.get('If-None-Match') == etag or server.always_304:
+            if server.before_304 is not None:
+                server.before_304(group)
+            self.answer(304, b'', etag)
+            return
+        body = ''.join('\n'.join(entry) + '\n' for entry in GROUPS[group])
+        self.answer(200, body.encode('utf-8'), etag)
+
+    def answer(self, status, body, etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TleFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='satTracker-test-')
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      StandIn)
+        self.server.seen = list()
+        self.server.always_304 = False
+        self.server.before_304 = None
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.tle_file = os.path.join(self.dir, 'tles.txt')
+        self.fetcher = self.make_fetcher(
+            'http://127.0.0.1:%d/{}' % self.server.server_address[1])
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def make_fetcher(self, url_format):
+        return st.TleFetcher(url_format,
+                             cache_dir=os.path.join(self.dir, 'groups'),
+                             meta_file=os.path.join(self.dir, 'meta.json'))
+
+    def merged(self):
+        with open(self.tle_file) as fname:
+            return list(st.parse_tle_stream(fname))
+
+    def test_200_merges_groups(self):
+        statuses = self.fetcher.update(['stations', 'weather'],
+                                       self.tle_file)
+        self.assertEqual(statuses, {'stations': 200, 'weather': 200})
+        self.assertEqual(self.merged(),
+                         GROUPS['stations'] + GROUPS['weather'])
+        # fetched concurrently, so in either order
+        self.assertEqual(sorted(self.server.seen), [('stations', None),
+                                                    ('weather', None)])
+
+    def test_304_uses_saved_copy(self):
+        self.fetcher.update(['stations'], self.tle_file)
+        os.remove(self.tle_file)
+        # validators survive a restart through the meta file
+        fetcher = self.make_fetcher(self.fetcher.url_format)
+        try:
+            statuses = fetcher.update(['stations'], self.tle_file)
+        finally:
+            fetcher.close()
+        self.assertEqual(statuses, {'stations': 304})
+        self.assertEqual(self.server.seen[-1], ('stations', '"stations-1"'))
+        self.assertEqual(self.merged(), GROUPS['stations'])
+
+    def test_304_with_missing_saved_copy_refetches(self):
+        self.fetcher.update(['stations'], self.tle_file)
+
+        def lose_copy(group):
+            # e.g. the cache directory was cleaned up mid-request
+            os.remove(self.fetcher.group_file(group))
+            self.server.before_304 = None
+        self.server.before_304 = lose_copy
+        statuses = self.fetcher.update(['stations'], self.tle_file)
+        self.assertEqual(statuses, {'stations': 200})
+        self.assertEqual(self.server.seen[-2:],
+                         [('stations', '"stations-1"'), ('stations', None)])
+        self.assertEqual(self.merged(), GROUPS['stations'])
+
+    def test_304_without_any_copy_fails(self):
+        self.server.always_304 = True
+        with self.assertRaises(ValueError):
+            self.fetcher.update(['stations'], self.tle_file)
+        self.assertFalse(os.path.exists(self.tle_file))
+
+    def test_network_failure(self):
+        self.fetcher.update(['stations'], self.tle_file)
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        fetcher = self.make_fetcher('http://127.0.0.1:%d/{}' % port)
+        try:
+            with self.assertRaises(IOError):
+                fetcher.update(['stations'], self.tle_file)
+        finally:
+            fetcher.close()
+        # the last good merge is left alone
+        self.assertEqual(self.merged(), GROUPS['stations'])
+
+if __name__ == '__main__':
+    unittest.main()